@@ -0,0 +1,49 @@
+"""
+Test suite for the benchmarks package
+Checks the synthetic panel generator and a tiny end-to-end suite run
+"""
+import json
+import pandas as pd
+from src.factors_doc import FACTOR_DOCS
+from src.market_object import load_data
+from benchmarks.synthetic import synthetic_panel
+from benchmarks.suite import compare, main
+
+
+class TestSyntheticPanel:
+    """Synthetic panels"""
+
+    def test_deterministic_and_complete(self):
+        panel = synthetic_panel(50, 4, seed=1)
+        pd.testing.assert_frame_equal(panel, synthetic_panel(50, 4, seed=1))
+        assert set(FACTOR_DOCS) <= set(panel.columns)
+        assert sorted(panel['Year'].unique()) == [2002, 2003, 2004, 2005]
+        assert 150 < len(panel) <= 200
+        assert (panel['Ending Price'] > 0).all()
+
+    def test_loads_from_parquet(self, tmp_path):
+        panel = synthetic_panel(30, 3)
+        path = tmp_path / 'panel.parquet'
+        panel.to_parquet(path, index=False)
+        loaded = load_data(use_supabase=False, data_path=str(path), show_loading_progress=False,
+                           factors=['ROE using 9/30 Data'], start_year=2003, end_year=2004)
+        assert sorted(loaded['Year'].unique()) == [2003, 2004]
+        assert 'ROE using 9/30 Data' in loaded.columns and '1-Mo Momentum %' not in loaded.columns
+
+
+class TestSuite:
+    """Suite run and comparison"""
+
+    def test_run_writes_json(self, tmp_path):
+        output = tmp_path / 'bench.json'
+        main(['--tickers', '40', '--years', '3', '--repeat', '1', '--output', str(output),
+              '--only', 'load_data', 'calculate_holdings', 'rebalance_portfolio_panel'])
+        document = json.loads(output.read_text())
+        assert document['meta']['repeat'] == 1
+        names = [r['benchmark'] for r in document['results']]
+        assert names.count('load_data') == 2 and names.count('calculate_holdings') == 4
+        assert all(r['min'] <= r['median'] for r in document['results'])
+
+        ratios = compare(document, document)
+        assert len(ratios) == len(document['results'])
+        assert (ratios['ratio'] == 1.0).all()
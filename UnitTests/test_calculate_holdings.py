@@ -6,11 +6,19 @@ import pytest
 import pandas as pd
 import numpy as np
 from src.calculate_holdings import (
-    calculate_holdings, calculate_growth, rebalance_portfolio,
+    calculate_holdings, calculate_cohort_holdings, calculate_growth, rebalance_portfolio, rebalance_cohorts,
+    rebalance_quantiles, BACKTEST_CHECKPOINTS, CheckpointStore, stop_on_drawdown,
     get_benchmark_return, calculate_information_ratio
 )
+import src.calculate_holdings as calculate_holdings_module
+from src.factor_utils import (
+    select_ranked, quantile_buckets, normalize_series, normalize_panel, ScoreCache, NORMALIZATION_CACHE
+)
+from src.factors_doc import FACTOR_DOCS
 from src.factor_function import Momentum6m, ROE, ROA
 from src.market_object import MarketObject, load_data
+from src.result_cache import RESULT_CACHE
+from src.panel_engine import rebalance_portfolio_panel
 
 
 class TestCalculateHoldings:
@@ -121,6 +129,144 @@ class TestCalculateHoldings:
         assert len(selected_tickers) > 0, "Should have selected some companies"
 
 
+    def test_calculate_holdings_does_not_modify_market(self):
+        """Markets are shared between backtests, so the fossil screen must not mutate them"""
+        data = pd.DataFrame({
+            'Ticker-Region': ['AAPL-US', 'XOM-US', 'MSFT-US'],
+            'Ending Price': [150.0, 100.0, 300.0],
+            '6-Mo Momentum %': [0.20, 0.35, 0.15],
+            'FactSet Industry': ['Technology', 'Oil & Gas', 'Technology'],
+            'Year': [2022, 2022, 2022]
+        })
+        market = MarketObject(data, 2022)
+
+        calculate_holdings(Momentum6m(), 10000.0, market, restrict_fossil_fuels=True)
+
+        assert len(market.stocks) == 3
+
+
+class TestSelection:
+    """Partial (argpartition) selection"""
+
+    @pytest.mark.parametrize('seed', range(5))
+    @pytest.mark.parametrize('n_select', [1, 3, 10, 40])
+    def test_select_ranked_matches_stable_sort(self, seed, n_select):
+        rng = np.random.default_rng(seed)
+        scores = rng.integers(0, 6, size=40).astype(float)  # many ties
+        ranked = [i for i, _ in sorted(enumerate(scores), key=lambda x: x[1], reverse=True)]
+
+        top, bottom = select_ranked(scores, n_select, which='both')
+
+        assert top.tolist() == ranked[:n_select]
+        assert bottom.tolist() == ranked[-n_select:]
+        assert select_ranked(scores, n_select, which='top').tolist() == ranked[:n_select]
+        assert select_ranked(scores, n_select, which='bottom').tolist() == ranked[-n_select:]
+
+    def test_select_ranked_edge_cases(self):
+        assert select_ranked(np.array([]), 3).tolist() == []
+        assert select_ranked(np.array([1.0, 2.0]), 0).tolist() == []
+        assert select_ranked(np.array([1.0, 2.0]), 5).tolist() == [1, 0]
+        with pytest.raises(ValueError):
+            select_ranked(np.array([1.0]), 1, which='middle')
+
+    def test_quantile_buckets(self):
+        scores = np.array([0.5, 3.0, 1.0, 3.0, -2.0, 0.0, 2.0])
+        bucket, order = quantile_buckets(scores, 3)
+
+        assert order.tolist() == [1, 3, 6, 2, 0, 5, 4]
+        assert bucket[order].tolist() == [0, 0, 0, 1, 1, 2, 2]
+        assert np.bincount(quantile_buckets(np.arange(103.0), 10)[0]).tolist() == [11, 10, 10, 11, 10, 10, 11, 10, 10, 10]
+        with pytest.raises(ValueError):
+            quantile_buckets(scores, 0)
+
+    def test_cohort_holdings_match_single_calls(self):
+        data = pd.DataFrame({
+            'Ticker-Region': [f'T{i}-US' for i in range(20)] + ['T3-US'],
+            'Ending Price': np.linspace(10, 200, 21),
+            '6-Mo Momentum %': np.round(np.sin(np.arange(21)), 1),
+            'Market Capitalization': np.linspace(100, 900, 21),
+            'Year': [2022] * 21
+        })
+        market = MarketObject(data, 2022)
+        for cap in (False, True):
+            top, bottom = calculate_cohort_holdings(Momentum6m(), 1000.0, market, top_pct=20, use_market_cap_weight=cap)
+            expected_top = calculate_holdings(Momentum6m(), 1000.0, market, top_pct=20, which='top', use_market_cap_weight=cap)
+            expected_bottom = calculate_holdings(Momentum6m(), 1000.0, market, top_pct=20, which='bottom', use_market_cap_weight=cap)
+            assert top.investments == expected_top.investments
+            assert bottom.investments == expected_bottom.investments
+
+
+class TestNormalizationCache:
+    """Whole-panel normalization and its cache"""
+
+    @pytest.fixture
+    def data(self):
+        rng = np.random.default_rng(3)
+        return pd.DataFrame({
+            'Ticker-Region': [f'T{i}-US' for i in range(30)] * 3,
+            'Ending Price': rng.uniform(5, 100, 90),
+            '6-Mo Momentum %': rng.normal(size=90),
+            'ROE using 9/30 Data': rng.normal(size=90),
+            'Market Capitalization': rng.uniform(10, 1000, 90),
+            'FactSet Industry': ['Software', 'Coal', 'Banks'] * 30,
+            'Year': np.repeat([2020, 2021, 2022], 30),
+        })
+
+    def test_reruns_skip_normalization(self, data):
+        NORMALIZATION_CACHE.clear()
+        factors = [Momentum6m(), ROE()]
+        first = rebalance_portfolio(data, factors, 2020, 2022, 100.0, top_pct=10)
+        misses = NORMALIZATION_CACHE.info()['misses']
+        assert misses == 1  # every factor and year normalized in one pass
+
+        # AUM, weighting, percentage and cohort changes reuse every score; so does a reloaded copy
+        rebalance_portfolio(data, factors, 2020, 2022, 5.0, top_pct=30, which='bottom', use_market_cap_weight=True)
+        rebalance_cohorts(data, factors, 2020, 2022, 100.0, cohorts=['top', ('bottom', 20)])
+        again = rebalance_portfolio(data.copy(), factors, 2020, 2022, 100.0, top_pct=10)
+        assert NORMALIZATION_CACHE.info()['misses'] == misses
+        assert again['portfolio_values'] == first['portfolio_values']
+
+        # A different universe screen is a different key
+        rebalance_portfolio(data, factors, 2020, 2022, 100.0, restrict_fossil_fuels=True)
+        assert NORMALIZATION_CACHE.info()['misses'] == misses + 1
+
+    def test_changed_data_is_not_reused(self, data):
+        NORMALIZATION_CACHE.clear()
+        rebalance_portfolio(data, [Momentum6m()], 2020, 2022, 100.0)
+        changed = data.assign(**{'6-Mo Momentum %': -data['6-Mo Momentum %']})
+        expected_misses = NORMALIZATION_CACHE.info()['misses'] + 1
+        rebalance_portfolio(changed, [Momentum6m()], 2020, 2022, 100.0)
+        assert NORMALIZATION_CACHE.info()['misses'] == expected_misses
+
+    def test_normalize_panel_matches_normalize_series(self):
+        rng = np.random.default_rng(11)
+        columns = ['6-Mo Momentum %', 'Price to Book Using 9/30 Data', '1-Yr Price Vol %']
+        data = pd.DataFrame({col: rng.normal(size=400) for col in columns})
+        data['Year'] = rng.integers(2010, 2015, 400)
+        data.loc[data['Year'] == 2011, '1-Yr Price Vol %'] = rng.uniform(1, 5, (data['Year'] == 2011).sum())  # reciprocal branch
+        data.loc[rng.random(400) < 0.1, '1-Yr Price Vol %'] = 0.0
+        data.loc[rng.random(400) < 0.2, '6-Mo Momentum %'] = np.nan
+        data.loc[data['Year'] == 2012, 'Price to Book Using 9/30 Data'] = 2.0  # constant year
+        mask = rng.random(400) < 0.8
+
+        result = normalize_panel(data, columns=columns, mask=mask)
+
+        assert result[~mask].isna().all().all()
+        for col in columns:
+            higher_is_better = FACTOR_DOCS[col]['higher_is_better']
+            for _, group in data[mask].groupby('Year'):
+                expected = normalize_series(group[col], higher_is_better=higher_is_better)
+                pd.testing.assert_series_equal(result.loc[group.index, col], expected, check_names=False, rtol=1e-12)
+
+    def test_lru_bound(self):
+        cache = ScoreCache(maxsize=2)
+        for key in 'abc':
+            value = cache.get_or_compute(key, lambda: np.zeros(3))
+        assert not value.flags.writeable
+        assert cache.get_or_compute('a', lambda: 'recomputed') == 'recomputed'
+        assert cache.info() == {'hits': 0, 'misses': 4, 'size': 2, 'maxsize': 2}
+
+
 class TestCalculateGrowth:
     """Test calculate_growth function"""
     
@@ -287,6 +433,150 @@ class TestRebalancePortfolio:
         assert len(results['portfolio_values']) == 3
 
 
+    @pytest.mark.parametrize('cap', [False, True])
+    @pytest.mark.parametrize('restrict', [False, True])
+    def test_rebalance_cohorts_match_single_backtests(self, sample_data, cap, restrict):
+        """One shared pass gives the same per-cohort results as separate backtests"""
+        sample_data = sample_data.assign(**{'Market Capitalization': np.linspace(100, 900, len(sample_data))})
+        sample_data.loc[::7, 'FactSet Industry'] = 'Oil & Gas Production'
+        factors = [Momentum6m(), ROE()]
+        kwargs = dict(start_year=2020, end_year=2022, initial_aum=1000.0,
+                      restrict_fossil_fuels=restrict, use_market_cap_weight=cap)
+
+        results = rebalance_cohorts(sample_data, factors, top_pct=20, cohorts=['top', 'bottom', ('top', 50)], **kwargs)
+
+        assert list(results) == ['top', 'bottom', ('top', 50)]
+        for cohort, (which, pct) in {'top': ('top', 20), 'bottom': ('bottom', 20), ('top', 50): ('top', 50)}.items():
+            expected = rebalance_portfolio_panel(sample_data, factors, top_pct=pct, which=which, **kwargs)
+            np.testing.assert_allclose(results[cohort]['portfolio_values'], expected['portfolio_values'], rtol=1e-10)
+            assert results[cohort]['years'] == expected['years']
+
+    def test_rebalance_cohorts_unknown_cohort(self, sample_data):
+        with pytest.raises(ValueError):
+            rebalance_cohorts(sample_data, [Momentum6m()], 2020, 2022, 1.0, cohorts=['middle'])
+
+
+    def test_rebalance_quantiles_match_top_and_bottom(self, sample_data):
+        """Outer buckets equal the top/bottom backtests at the same percentage"""
+        factors = [Momentum6m(), ROE()]
+        results = rebalance_quantiles(sample_data, factors, 2020, 2022, 1000.0, n_quantiles=5)
+        top = rebalance_portfolio(sample_data, factors, 2020, 2022, 1000.0, top_pct=20, which='top')
+        bottom = rebalance_portfolio(sample_data, factors, 2020, 2022, 1000.0, top_pct=20, which='bottom')
+
+        assert sorted(results['quantiles']) == [1, 2, 3, 4, 5]
+        np.testing.assert_allclose(results['quantiles'][1]['portfolio_values'], top['portfolio_values'])
+        np.testing.assert_allclose(results['quantiles'][5]['portfolio_values'], bottom['portfolio_values'])
+        expected_spread = np.array(top['yearly_returns']) - np.array(bottom['yearly_returns'])
+        np.testing.assert_allclose(results['spread_returns'], expected_spread)
+        np.testing.assert_allclose(results['spread_values'][1:], 1000.0 * np.cumprod(1 + expected_spread))
+        assert results['years'] == [2020, 2021, 2022]
+
+    def test_rebalance_quantiles_empty_bucket_holds_cash(self, sample_data):
+        results = rebalance_quantiles(sample_data, [Momentum6m()], 2020, 2022, 1000.0, n_quantiles=20)
+        values = [results['quantiles'][b]['portfolio_values'] for b in range(1, 21)]
+        assert sum(v == [1000.0, 1000.0, 1000.0] for v in values) == 10
+
+    def test_rebalance_quantiles_factor_missing_from_bucket_holds_cash(self):
+        """A bucket one factor cannot fill keeps that factor's share as cash"""
+        rng = np.random.default_rng(4)
+        rows = []
+        for year in (2020, 2021):
+            for i in range(10):
+                rows.append({
+                    'Ticker-Region': f'T{i}-US',
+                    'Year': year,
+                    'Ending Price': rng.uniform(10, 100),
+                    '6-Mo Momentum %': rng.normal(),
+                    # ROE only covers three stocks, so buckets 3 and 5 are empty for it
+                    'ROE using 9/30 Data': rng.normal() if i < 3 else np.nan,
+                })
+        data = pd.DataFrame(rows)
+        both = rebalance_quantiles(data, [Momentum6m(), ROE()], 2020, 2021, 1000.0, n_quantiles=5)
+        momentum = rebalance_quantiles(data, [Momentum6m()], 2020, 2021, 1000.0, n_quantiles=5)
+        for b in (3, 5):
+            momentum_growth = momentum['quantiles'][b]['yearly_returns'][0]
+            assert both['quantiles'][b]['portfolio_values'][-1] == pytest.approx(500.0 * (1 + momentum_growth) + 500.0)
+            assert both['quantiles'][b]['yearly_returns'][0] == pytest.approx(momentum_growth / 2)
+
+    def test_rebalance_quantiles_requires_two_buckets(self, sample_data):
+        with pytest.raises(ValueError):
+            rebalance_quantiles(sample_data, [Momentum6m()], 2020, 2022, 1000.0, n_quantiles=1)
+
+    def test_checkpoint_store_keeps_longest_path(self):
+        store = CheckpointStore(maxsize=2)
+        store.save('a', [(2020, 0.1, 1.0, 1.1, 3), (2021, 0.2, 1.1, 1.32, 3)])
+        store.save('a', [(2020, 0.5, 1.0, 1.5, 3)])
+        assert store.load('a', 1) == [(2020, 0.1, 1.0, 1.1, 3)]
+        store.save('b', [(2020, 0.0, 1.0, 1.0, 0)])
+        store.save('c', [(2020, 0.0, 1.0, 1.0, 0)])
+        assert store.load('a', 5) == [] and len(store.load('c', 5)) == 1
+        assert store.info()['size'] == 2
+
+    def test_extending_end_year_resumes_from_checkpoint(self, sample_data, monkeypatch):
+        factors = [Momentum6m(), ROE()]
+        BACKTEST_CHECKPOINTS.clear()
+        RESULT_CACHE.clear()
+        expected = rebalance_cohorts(sample_data, factors, 2020, 2022, 1000.0, top_pct=20)
+        BACKTEST_CHECKPOINTS.clear()
+        RESULT_CACHE.clear()
+        rebalance_portfolio(sample_data, factors, 2020, 2021, 1000.0, top_pct=20)
+
+        scored_years = []
+        real_factor_scores = calculate_holdings_module._factor_scores
+        monkeypatch.setattr(calculate_holdings_module, '_factor_scores',
+                            lambda factor, market: scored_years.append(market.t) or real_factor_scores(factor, market))
+
+        # Only the 'top' path is checkpointed, so both cohorts recompute; afterwards neither does
+        extended = rebalance_cohorts(sample_data, factors, 2020, 2022, 1000.0, top_pct=20)
+        assert set(scored_years) == {2020, 2021}
+        scored_years.clear()
+        top = rebalance_portfolio(sample_data, factors, 2020, 2022, 1000.0, top_pct=20)
+        shorter = rebalance_portfolio(sample_data, factors, 2020, 2021, 1000.0, top_pct=20, which='bottom')
+        assert scored_years == []
+
+        for cohort in ('top', 'bottom'):
+            assert extended[cohort]['portfolio_values'] == expected[cohort]['portfolio_values']
+        assert top['portfolio_values'] == expected['top']['portfolio_values']
+        assert shorter['portfolio_values'] == expected['bottom']['portfolio_values'][:2]
+        assert shorter['years'] == [2020, 2021]
+
+    def test_on_year_reports_each_year(self, sample_data):
+        updates = []
+        results = rebalance_cohorts(sample_data, [Momentum6m(), ROE()], 2020, 2022, 1000.0, top_pct=20,
+                                    on_year=updates.append)
+        assert [(u['cohort'], u['year']) for u in updates] == [('top', 2020), ('bottom', 2020),
+                                                                ('top', 2021), ('bottom', 2021)]
+        # Two factor sleeves of two names each
+        assert all(u['holdings'] == 4 for u in updates)
+        assert [u['end_value'] for u in updates if u['cohort'] == 'top'] == results['top']['portfolio_values'][1:]
+        assert updates[0]['benchmark_return'] == get_benchmark_return(2020)
+
+    def test_on_year_early_stop(self, sample_data, monkeypatch):
+        factors = [Momentum6m()]
+        full = rebalance_portfolio(sample_data, factors, 2020, 2022, 1000.0)
+        BACKTEST_CHECKPOINTS.clear()
+        RESULT_CACHE.clear()
+
+        scored_years = []
+        real_factor_scores = calculate_holdings_module._factor_scores
+        monkeypatch.setattr(calculate_holdings_module, '_factor_scores',
+                            lambda factor, market: scored_years.append(market.t) or real_factor_scores(factor, market))
+
+        stopped = rebalance_portfolio(sample_data, factors, 2020, 2022, 1000.0, on_year=lambda update: True)
+        assert scored_years == [2020]
+        assert stopped['years'] == [2020, 2021]
+        assert stopped['portfolio_values'] == full['portfolio_values'][:2]
+        # The partial run is not memoized as the full one
+        assert rebalance_portfolio(sample_data, factors, 2020, 2022, 1000.0)['years'] == [2020, 2021, 2022]
+
+    def test_stop_on_drawdown(self):
+        on_year = stop_on_drawdown(0.25)
+        update = lambda start, end: {'cohort': 'top', 'start_value': start, 'end_value': end}
+        assert not on_year(update(100.0, 120.0))
+        assert not on_year(update(120.0, 95.0))
+        assert on_year(update(95.0, 89.0))
+
+
 class TestBenchmarkReturn:
     """Test benchmark return function"""
     
@@ -0,0 +1,150 @@
+"""
+Test suite for data_cache.py module
+Tests the local Parquet cache and incremental Supabase refresh (network is faked)
+"""
+import pytest
+import pandas as pd
+import src.data_cache as data_cache
+from src.data_cache import TableCache, load_supabase_data_cached, schema_fingerprint
+
+
+def _rows(ids):
+    return pd.DataFrame({
+        'ID': ids,
+        'Ticker-Region': [f'T{i}-US' for i in ids],
+        'Ending_Price': [float(i) for i in ids],
+        'Date': ['2020-09-30'] * len(ids),
+    })
+
+
+class FakeSupabase:
+    """Records calls and serves rows from an in-memory 'table'"""
+
+    def __init__(self, table):
+        self.table = table
+        self.calls = []
+
+    def __call__(self, table_name, show_progress=True, sectors=None, min_id=None, columns=None,
+                 start_date=None, end_date=None):
+        self.calls.append({'table_name': table_name, 'sectors': sectors, 'min_id': min_id, 'columns': columns,
+                           'start_date': start_date, 'end_date': end_date})
+        table = self.table if columns is None else self.table[columns]
+        if min_id is None:
+            return table.copy()
+        return table[table['ID'] > min_id].reset_index(drop=True)
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    fake = FakeSupabase(_rows([1, 2, 3]))
+    monkeypatch.setattr(data_cache, 'load_supabase_data', fake)
+    return fake
+
+
+class TestTableCache:
+    """Cache entry read/write"""
+
+    def test_roundtrip(self, tmp_path):
+        cache = TableCache('Full Precision Test', sectors=['Technology'], cache_dir=str(tmp_path))
+        meta = cache.write(_rows([5, 9]))
+
+        df, read_meta = cache.read()
+        assert list(df['ID']) == [5, 9]
+        assert meta['max_id'] == 9
+        assert read_meta['schema'] == schema_fingerprint(df.columns)
+
+    def test_key_ignores_sector_order(self, tmp_path):
+        a = TableCache('T', sectors=['Consumer', 'Technology'], cache_dir=str(tmp_path))
+        b = TableCache('T', sectors=['Technology', 'Consumer'], cache_dir=str(tmp_path))
+        c = TableCache('T', sectors=None, cache_dir=str(tmp_path))
+        assert a.data_path == b.data_path
+        assert a.data_path != c.data_path
+
+    def test_key_includes_column_projection(self, tmp_path):
+        a = TableCache('T', columns=['ID', 'Date'], cache_dir=str(tmp_path))
+        b = TableCache('T', columns=['Date', 'ID'], cache_dir=str(tmp_path))
+        c = TableCache('T', cache_dir=str(tmp_path))
+        assert a.data_path == b.data_path
+        assert a.data_path != c.data_path
+
+    def test_key_includes_date_range(self, tmp_path):
+        a = TableCache('T', start_date='2010-01-01', end_date='2012-12-31', cache_dir=str(tmp_path))
+        b = TableCache('T', start_date='2010-01-01', cache_dir=str(tmp_path))
+        c = TableCache('T', cache_dir=str(tmp_path))
+        assert len({a.data_path, b.data_path, c.data_path}) == 3
+
+    def test_missing_entry(self, tmp_path):
+        assert TableCache('Nope', cache_dir=str(tmp_path)).read() == (None, None)
+
+
+class TestCachedLoad:
+    """load_supabase_data_cached behavior"""
+
+    def test_cold_then_incremental(self, fake, tmp_path):
+        first = load_supabase_data_cached('T', show_progress=False, cache_dir=str(tmp_path))
+        assert len(first) == 3
+        assert fake.calls[-1]['min_id'] is None
+
+        fake.table = _rows([1, 2, 3, 4, 5])
+        second = load_supabase_data_cached('T', show_progress=False, cache_dir=str(tmp_path))
+        assert fake.calls[-1]['min_id'] == 3
+        assert list(second['ID']) == [1, 2, 3, 4, 5]
+
+        # Refreshed rows were persisted
+        df, meta = TableCache('T', cache_dir=str(tmp_path)).read()
+        assert meta['max_id'] == 5 and len(df) == 5
+
+    def test_projection_passed_through(self, fake, tmp_path):
+        df = load_supabase_data_cached('T', show_progress=False, cache_dir=str(tmp_path), columns=['ID', 'Date'])
+        assert fake.calls[-1]['columns'] == ['ID', 'Date']
+        assert list(df.columns) == ['ID', 'Date']
+
+        fake.table = _rows([1, 2, 3, 4])
+        load_supabase_data_cached('T', show_progress=False, cache_dir=str(tmp_path), columns=['ID', 'Date'])
+        assert fake.calls[-1]['min_id'] == 3
+        assert fake.calls[-1]['columns'] == ['ID', 'Date']
+
+    def test_date_range_passed_through(self, fake, tmp_path):
+        load_supabase_data_cached('T', show_progress=False, cache_dir=str(tmp_path),
+                                  start_date='2010-01-01', end_date='2012-12-31')
+        assert fake.calls[-1]['start_date'] == '2010-01-01'
+        assert fake.calls[-1]['end_date'] == '2012-12-31'
+
+    def test_refresh_none_skips_network(self, fake, tmp_path):
+        load_supabase_data_cached('T', show_progress=False, cache_dir=str(tmp_path))
+        n_calls = len(fake.calls)
+        df = load_supabase_data_cached('T', show_progress=False, cache_dir=str(tmp_path), refresh='none')
+        assert len(fake.calls) == n_calls
+        assert len(df) == 3
+
+    def test_schema_change_forces_full_reload(self, fake, tmp_path):
+        load_supabase_data_cached('T', show_progress=False, cache_dir=str(tmp_path))
+        table = _rows([1, 2, 3, 4])
+        table['New_Column'] = 1.0
+        fake.table = table
+
+        df = load_supabase_data_cached('T', show_progress=False, cache_dir=str(tmp_path))
+        assert fake.calls[-1]['min_id'] is None
+        assert 'New_Column' in df.columns
+
+    def test_offline_falls_back_to_cache(self, fake, tmp_path, monkeypatch):
+        load_supabase_data_cached('T', show_progress=False, cache_dir=str(tmp_path))
+
+        def offline(*args, **kwargs):
+            raise RuntimeError('Supabase credentials not set.')
+        monkeypatch.setattr(data_cache, 'load_supabase_data', offline)
+
+        df = load_supabase_data_cached('T', show_progress=False, cache_dir=str(tmp_path))
+        assert len(df) == 3
+
+    def test_offline_without_cache_raises(self, tmp_path, monkeypatch):
+        def offline(*args, **kwargs):
+            raise RuntimeError('Supabase credentials not set.')
+        monkeypatch.setattr(data_cache, 'load_supabase_data', offline)
+
+        with pytest.raises(RuntimeError):
+            load_supabase_data_cached('T', show_progress=False, cache_dir=str(tmp_path))
+
+    def test_invalid_refresh_mode(self, tmp_path):
+        with pytest.raises(ValueError):
+            load_supabase_data_cached('T', cache_dir=str(tmp_path), refresh='sometimes')
@@ -0,0 +1,122 @@
+"""
+Test suite for dataset_registry.py module
+Checks sharing, single loads under concurrency, eviction and invalidation
+"""
+import threading
+import time
+
+import numpy as np
+import pytest
+import pandas as pd
+from src.dataset_registry import DatasetRegistry, dataset_key, read_only_frame
+from src.factor_function import ROE
+
+
+def _frame(n_rows, value=0.0):
+    return pd.DataFrame({'Year': np.full(n_rows, 2010), 'ROE using 9/30 Data': np.full(n_rows, value)})
+
+
+class TestDatasetRegistry:
+    """Process-wide shared frames"""
+
+    def test_callers_share_one_frame(self):
+        registry = DatasetRegistry()
+        loads = []
+        load = lambda: loads.append(1) or _frame(10)
+        first = registry.get_or_load('a', load)
+        assert registry.get_or_load('a', load) is first
+        assert len(loads) == 1
+        assert registry.info()['hits'] == 1 and registry.info()['misses'] == 1
+
+    def test_concurrent_callers_load_once(self):
+        registry = DatasetRegistry()
+        loads = []
+
+        def slow_load():
+            loads.append(1)
+            time.sleep(0.05)
+            return _frame(10)
+
+        frames = []
+        threads = [threading.Thread(target=lambda: frames.append(registry.get_or_load('a', slow_load)))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(loads) == 1
+        assert all(frame is frames[0] for frame in frames)
+
+    def test_failed_load_releases_the_key(self):
+        registry = DatasetRegistry()
+
+        def failing_load():
+            raise RuntimeError("Failed to load data from Supabase")
+
+        with pytest.raises(RuntimeError):
+            registry.get_or_load('a', failing_load)
+        assert registry._loading == {}
+        assert registry.info()['entries'] == 0
+        # The next caller loads normally
+        assert len(registry.get_or_load('a', lambda: _frame(3))) == 3
+
+    def test_returned_frames_are_read_only(self):
+        registry = DatasetRegistry()
+        source = _frame(4)
+        source['Ticker'] = pd.Categorical(['A', 'B', 'C', 'D'])
+        frame = registry.get_or_load('a', lambda: source)
+        with pytest.raises(ValueError):
+            frame.loc[0, 'ROE using 9/30 Data'] = 1.0
+        with pytest.raises(ValueError):
+            frame.iloc[1, 0] = 2011
+        with pytest.raises(ValueError):
+            frame.loc[0, 'Ticker'] = 'B'
+        with pytest.raises(ValueError):
+            frame['ROE using 9/30 Data'].to_numpy()[0] = 1.0
+        assert (frame['ROE using 9/30 Data'] == 0.0).all() and frame['Ticker'].tolist() == ['A', 'B', 'C', 'D']
+        # Copies and selections stay writable
+        copy = frame.copy()
+        copy.loc[0, 'ROE using 9/30 Data'] = 1.0
+        assert frame.loc[0, 'ROE using 9/30 Data'] == 0.0
+
+    def test_read_only_frame_keeps_values_and_dtypes(self):
+        source = _frame(3).astype({'Year': 'int16'})
+        source['Date'] = pd.to_datetime(['2010-09-30'] * 3)
+        pd.testing.assert_frame_equal(read_only_frame(source), source)
+
+    def test_evicts_least_recently_used(self):
+        registry = DatasetRegistry(max_entries=2)
+        registry.get_or_load('a', lambda: _frame(5))
+        registry.get_or_load('b', lambda: _frame(5))
+        registry.get_or_load('a', lambda: _frame(5))
+        registry.get_or_load('c', lambda: _frame(5))
+        reloaded = []
+        registry.get_or_load('b', lambda: reloaded.append('b') or _frame(5))
+        registry.get_or_load('c', lambda: reloaded.append('c') or _frame(5))
+        assert reloaded == ['b']
+
+    def test_byte_budget_keeps_newest(self):
+        small = _frame(100)
+        budget = int(small.memory_usage(deep=True).sum()) * 2
+        registry = DatasetRegistry(max_entries=10, max_bytes=budget)
+        registry.get_or_load('a', lambda: _frame(100))
+        registry.get_or_load('b', lambda: _frame(100))
+        assert registry.info()['entries'] == 2
+        registry.get_or_load('big', lambda: _frame(10_000))
+        assert registry.info()['entries'] == 1
+        assert registry.info()['bytes'] > budget
+
+    def test_invalidate(self):
+        registry = DatasetRegistry()
+        registry.get_or_load('a', lambda: _frame(5, 1.0))
+        registry.get_or_load('b', lambda: _frame(5))
+        registry.invalidate('a')
+        assert registry.get_or_load('a', lambda: _frame(5, 2.0))['ROE using 9/30 Data'].iloc[0] == 2.0
+        registry.invalidate()
+        assert registry.info()['entries'] == 0
+
+    def test_dataset_key_normalizes_arguments(self):
+        assert dataset_key(sectors=['b', 'a'], factors=[ROE()]) == dataset_key(sectors=['a', 'b'],
+                                                                                factors=['ROE using 9/30 Data'])
+        assert dataset_key(restrict_fossil_fuels=True) != dataset_key(restrict_fossil_fuels=False)
+        assert dataset_key(start_year=2002, show_loading_progress=True) == dataset_key(start_year=2002)
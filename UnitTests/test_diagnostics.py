@@ -0,0 +1,138 @@
+"""
+Test suite for diagnostics.py module
+Checks lazy message formatting, counters and counting scopes, and the counters reported by the backtests
+"""
+import logging
+
+import pytest
+import numpy as np
+import pandas as pd
+from src import diagnostics
+from src.calculate_holdings import rebalance_portfolio, BACKTEST_CHECKPOINTS
+from src.panel_engine import rebalance_portfolio_panel
+from src.factor_function import Momentum6m, ROE
+from src.market_object import _drop_fossil_rows
+from src.result_cache import RESULT_CACHE
+from src.diagnostics import DEBUG, INFO, WARNING, count, counting, enabled, event
+
+
+@pytest.fixture
+def log_level():
+    saved = diagnostics.LOGGER.level
+
+    def set_level(level):
+        diagnostics.LOGGER.setLevel(level)
+    yield set_level
+    diagnostics.LOGGER.setLevel(saved)
+
+
+@pytest.fixture
+def vanishing_data():
+    """Tickers T20-T24 are delisted after 2011, so their exits are missing."""
+    rng = np.random.default_rng(3)
+    rows = []
+    for year in range(2010, 2014):
+        for i in range(25 if year <= 2011 else 20):
+            rows.append({
+                'Ticker-Region': f'T{i}-US',
+                'Year': year,
+                'Ending Price': rng.uniform(5, 100),
+                '6-Mo Momentum %': rng.normal() + (3.0 if i >= 20 else 0.0),
+                'ROE using 9/30 Data': rng.normal(),
+            })
+    return pd.DataFrame(rows)
+
+
+class _Formatted:
+    """Argument that records whether the message was formatted."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __str__(self):
+        self.calls += 1
+        return 'value'
+
+
+class TestEvents:
+    """Messages are only built when their level is enabled"""
+
+    def test_info_goes_to_stdout(self, capsys, log_level):
+        log_level(INFO)
+        event(INFO, 'test', "loaded %s rows", 5)
+        event(DEBUG, 'test', "hidden")
+        assert capsys.readouterr().out == "loaded 5 rows\n"
+
+    def test_disabled_level_skips_formatting(self, capsys, log_level):
+        log_level(WARNING)
+        arg = _Formatted()
+        event(INFO, 'test', "value=%s", arg)
+        assert arg.calls == 0 and not enabled(INFO)
+        event(WARNING, 'test', "value=%s", arg)
+        assert arg.calls >= 1
+        assert capsys.readouterr().out == "value=value\n"
+
+    def test_structured_fields_on_record(self, log_level):
+        log_level(INFO)
+        records = []
+        handler = logging.Handler()
+        handler.emit = records.append
+        diagnostics.LOGGER.addHandler(handler)
+        try:
+            event(WARNING, 'empty_portfolio', "no prices in %s", 2011, year=2011)
+        finally:
+            diagnostics.LOGGER.removeHandler(handler)
+        assert (records[0].event, records[0].fields, records[0].getMessage()) == \
+            ('empty_portfolio', {'year': 2011}, "no prices in 2011")
+
+
+class TestCounters:
+    """Process-wide counters and counting() scopes"""
+
+    def test_nested_scopes_forward_to_parent(self):
+        before = diagnostics.counters().get('test_counter', 0)
+        with counting() as outer:
+            count('test_counter')
+            with counting() as inner:
+                count('test_counter', 2)
+                count('test_zero', 0)
+        assert inner == {'test_counter': 2}
+        assert outer == {'test_counter': 3}
+        assert diagnostics.counters()['test_counter'] == before + 3
+
+    def test_count_outside_a_scope(self):
+        count('test_unscoped', 4)
+        assert diagnostics.counters()['test_unscoped'] >= 4
+
+
+class TestBacktestCounters:
+    """Both engines tally the same events"""
+
+    def test_missing_exits_counted_by_both_engines(self, vanishing_data, capsys, log_level):
+        log_level(WARNING)
+        factors = [Momentum6m(), ROE()]
+        counts = []
+        for engine in (rebalance_portfolio, rebalance_portfolio_panel):
+            RESULT_CACHE.clear()
+            BACKTEST_CHECKPOINTS.clear()
+            result = engine(vanishing_data, factors, 2010, 2013, 1000.0, top_pct=20, profile=True)
+            counts.append(result['counters'])
+        assert counts[0]['exit_missing'] > 0
+        assert counts[0].get('exit_missing') == counts[1].get('exit_missing')
+        assert capsys.readouterr().out == ""
+
+    def test_fossil_rows_counted_without_listing_tickers(self, capsys, log_level):
+        log_level(WARNING)
+        rdata = pd.DataFrame({
+            'Ticker': ['AAA', 'BBB', 'CCC'],
+            'FactSet Industry': ['Oil & Gas Production', 'Software', 'Coal'],
+        })
+        with counting() as counts:
+            kept = _drop_fossil_rows(rdata, context_label='test')
+        assert list(kept['Ticker']) == ['BBB']
+        assert counts == {'fossil_rows_removed': 2}
+        assert capsys.readouterr().out == ""
+
+        log_level(INFO)
+        _drop_fossil_rows(rdata, context_label='test')
+        assert capsys.readouterr().out == "Fossil filter removed 2 tickers (test): AAA, CCC\n"
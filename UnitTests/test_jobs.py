@@ -0,0 +1,127 @@
+"""
+Test suite for jobs.py module
+Checks background submission, progress, results, failures and cancellation
+"""
+import threading
+
+import pytest
+import numpy as np
+import pandas as pd
+import src.calculate_holdings as calculate_holdings_module
+from src.calculate_holdings import rebalance_cohorts, BACKTEST_CHECKPOINTS
+from src.factor_function import Momentum6m, ROE
+from src.jobs import JobRunner, JobCancelled, report_progress
+from src.result_cache import RESULT_CACHE
+
+
+@pytest.fixture
+def runner():
+    runner = JobRunner(max_workers=1)
+    yield runner
+    runner.shutdown()
+
+
+@pytest.fixture
+def job_data():
+    rng = np.random.default_rng(5)
+    rows = []
+    for year in range(2010, 2015):
+        for i in range(20):
+            rows.append({
+                'Ticker-Region': f'T{i}-US',
+                'Year': year,
+                'Ending Price': rng.uniform(1, 100),
+                '6-Mo Momentum %': rng.normal(),
+                'ROE using 9/30 Data': rng.normal(),
+                'Market Capitalization': rng.uniform(50, 5000),
+            })
+    return pd.DataFrame(rows)
+
+
+class TestJobRunner:
+    """Job table behaviour"""
+
+    def test_result_and_progress(self, runner):
+        def work(n):
+            for i in range(n):
+                report_progress(i + 1, n)
+            return n * 2
+
+        job_id = runner.submit(work, 3, description='double')
+        assert runner.result(job_id, timeout=5) == 6
+        status = runner.status(job_id)
+        assert (status['state'], status['done'], status['total'], status['description']) == ('done', 3, 3, 'double')
+
+    def test_failure_is_reported(self, runner):
+        job_id = runner.submit(lambda: 1 / 0)
+        with pytest.raises(ZeroDivisionError):
+            runner.result(job_id, timeout=5)
+        assert runner.status(job_id)['state'] == 'failed'
+
+    def test_cancel_running_and_queued_jobs(self, runner):
+        started, release = threading.Event(), threading.Event()
+
+        def work():
+            started.set()
+            release.wait(5)
+            report_progress(1, 2)
+            return 'finished'
+
+        running = runner.submit(work)
+        queued = runner.submit(lambda: 'never')
+        started.wait(5)
+        assert runner.cancel(queued)
+        assert runner.cancel(running)
+        release.set()
+        for job_id in (running, queued):
+            with pytest.raises(JobCancelled):
+                runner.result(job_id, timeout=5)
+            assert runner.status(job_id)['state'] == 'cancelled'
+        assert not runner.cancel(running)
+
+    def test_progress_outside_a_job_is_a_no_op(self):
+        report_progress(1, 2)
+
+    def test_finished_jobs_are_pruned(self):
+        runner = JobRunner(max_workers=1, max_finished=2)
+        ids = [runner.submit(lambda i=i: i) for i in range(4)]
+        runner.result(ids[-1], timeout=5)
+        runner.submit(lambda: None)
+        assert ids[0] not in [job['id'] for job in runner.jobs()]
+        runner.shutdown()
+
+
+class TestBackgroundBacktests:
+    """Backtests report yearly progress and stop when cancelled"""
+
+    def test_backtest_matches_direct_call(self, runner, job_data):
+        RESULT_CACHE.clear()
+        BACKTEST_CHECKPOINTS.clear()
+        factors = [Momentum6m(), ROE()]
+        job_id = runner.submit(rebalance_cohorts, job_data, factors, 2010, 2014, 1000.0, top_pct=20)
+        result = runner.result(job_id, timeout=30)
+        status = runner.status(job_id)
+        assert (status['done'], status['total']) == (4, 4)
+        assert result == rebalance_cohorts(job_data, factors, 2010, 2014, 1000.0, top_pct=20)
+
+    def test_cancelled_backtest_stops_at_a_year_boundary(self, runner, job_data, monkeypatch):
+        RESULT_CACHE.clear()
+        BACKTEST_CHECKPOINTS.clear()
+
+        # Cancel from inside the first year, once the job is known to be running
+        job_ids = []
+        real_growth = calculate_holdings_module.calculate_growth
+
+        def growth_then_cancel(*args, **kwargs):
+            runner.cancel(job_ids[0])
+            return real_growth(*args, **kwargs)
+        monkeypatch.setattr(calculate_holdings_module, 'calculate_growth', growth_then_cancel)
+
+        gate = threading.Event()
+        job_ids.append(runner.submit(lambda: gate.wait(5) and rebalance_cohorts(
+            job_data, [Momentum6m()], 2010, 2014, 1000.0, cohorts=['top'])))
+        gate.set()
+        with pytest.raises(JobCancelled):
+            runner.result(job_ids[0], timeout=30)
+        # The first year completed; the cancel took effect at its boundary
+        assert runner.status(job_ids[0])['done'] == 1
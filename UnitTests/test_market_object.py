@@ -5,7 +5,10 @@ Tests data loading, market object creation, and price retrieval
 import pytest
 import pandas as pd
 import numpy as np
-from src.market_object import MarketObject, load_data, _standardize_column_names
+from src.market_object import (MarketObject, MarketUniverse, load_data, _standardize_column_names,
+                               _projection_columns, _to_supabase_columns, _enforce_schema,
+                               fossil_fuel_flags, FOSSIL_FLAG_COLUMN)
+from src.factor_function import Momentum6m, ROE
 
 
 class TestDataLoading:
@@ -81,6 +84,147 @@ class TestColumnStandardization:
         assert 'Next FY Earns/P' in standardized.columns
 
 
+class TestColumnProjection:
+    """Test column projection for Supabase/file loads"""
+
+    def test_no_projection_by_default(self):
+        assert _projection_columns() is None
+
+    def test_projection_from_factors(self):
+        cols = _projection_columns(factors=[Momentum6m(), 'ROE using 9/30 Data'], restrict_fossil_fuels=True)
+
+        assert cols[:5] == ['ID', 'Ticker-Region', 'Date', 'Ending Price', 'Market Capitalization']
+        assert 'FactSet Industry' in cols
+        assert '6-Mo Momentum %' in cols and 'ROE using 9/30 Data' in cols
+        assert "Scott's Sector (5)" not in cols
+
+    def test_projection_skips_derived_and_duplicates(self):
+        cols = _projection_columns(columns=['Ticker', 'Year', 'Ending Price'], sectors=['Technology'])
+        assert 'Ticker' not in cols and 'Year' not in cols
+        assert cols.count('Ending Price') == 1
+        assert "Scott's Sector (5)" in cols
+
+    def test_reverse_mapping(self):
+        assert _to_supabase_columns(['Ending Price', '6-Mo Momentum %', 'ID', 'Not Mapped']) == \
+            ['Ending_Price', '6-Mo_Momentum', 'ID', 'Not Mapped']
+
+    def test_csv_load_reads_only_projected_columns(self, tmp_path):
+        path = tmp_path / 'data.csv'
+        pd.DataFrame({
+            'Ticker-Region': ['AAPL-US', 'MSFT-US'],
+            'Date': ['2020-09-30', '2020-09-30'],
+            'Ending_Price': [100.0, 200.0],
+            'Market Capitalization': [1e3, 2e3],
+            '6-Mo_Momentum': [0.1, 0.2],
+            'ROE using 9/30 Data': [0.3, 0.4],
+            'Book-Price': [0.5, 0.6],
+        }).to_csv(path, index=False)
+
+        data = load_data(use_supabase=False, data_path=str(path), factors=[Momentum6m()])
+
+        assert '6-Mo Momentum %' in data.columns and 'Ending Price' in data.columns
+        assert 'ROE using 9/30 Data' not in data.columns
+        assert 'Book/Price' not in data.columns
+        assert set(data['Ticker']) == {'AAPL', 'MSFT'}
+
+    def test_csv_load_year_range(self, tmp_path, monkeypatch):
+        import src.market_object as market_object
+        monkeypatch.setattr(market_object, 'CSV_CHUNK_ROWS', 2)
+        path = tmp_path / 'data.csv'
+        pd.DataFrame({
+            'Ticker-Region': ['A-US', 'B-US', 'A-US', 'B-US', 'A-US'],
+            'Date': ['2010-09-30', '2010-09-30', '2011-09-30', '2011-09-30', '2012-09-30'],
+            'Ending_Price': [1.0, 2.0, 3.0, 4.0, 5.0],
+        }).to_csv(path, index=False)
+
+        data = load_data(use_supabase=False, data_path=str(path), start_year=2011, end_year=2012)
+
+        assert sorted(data['Year'].unique()) == [2011, 2012]
+        assert list(data['Ending Price']) == [3.0, 4.0, 5.0]
+
+
+    @pytest.mark.parametrize('year_column', ['Year', 'Date'])
+    def test_parquet_load_year_range(self, tmp_path, year_column):
+        import pyarrow.parquet as pq
+        from src.market_object import _parquet_year_filters
+        path = tmp_path / 'data.parquet'
+        frame = pd.DataFrame({
+            'Ticker-Region': ['A-US', 'B-US', 'A-US', 'B-US', 'A-US'],
+            'Ending_Price': [1.0, 2.0, 3.0, 4.0, 5.0],
+        })
+        years = [2010, 2010, 2011, 2011, 2012]
+        if year_column == 'Year':
+            frame['Year'] = years
+        else:
+            frame['Date'] = pd.to_datetime([f'{y}-09-30' for y in years])
+        # One row group per year, so the filter can skip whole groups
+        frame.to_parquet(path, index=False, row_group_size=2)
+
+        filters = _parquet_year_filters(pq.read_schema(path), 2011, 2012)
+        assert [f[:2] for f in filters] == [(year_column, '>='), (year_column, '<=' if year_column == 'Year' else '<')]
+
+        data = load_data(use_supabase=False, data_path=str(path), start_year=2011, end_year=2012)
+        assert sorted(data['Year'].unique()) == [2011, 2012]
+        assert list(data['Ending Price']) == [3.0, 4.0, 5.0]
+
+
+class TestSchema:
+    """Test compact dtype enforcement at load time"""
+
+    @pytest.fixture
+    def raw(self):
+        return pd.DataFrame({
+            'ID': [1, 2, 3],
+            'Ticker-Region': ['AAPL-US', 'MSFT-US', 'AAPL-US'],
+            'Ticker': ['AAPL', 'MSFT', 'AAPL'],
+            'Date': ['2020-09-30', '2020-09-30', '2021-09-30'],
+            'Year': [2020, 2020, 2021],
+            'FactSet Industry': ['Software', 'Software', 'Software'],
+            'Ending Price': [100.0, 200.0, 110.0],
+            '6-Mo Momentum %': ['0.1', '--', '0.3'],
+        })
+
+    @pytest.mark.parametrize('float_dtype', ['float64', 'float32'])
+    def test_dtypes(self, raw, float_dtype):
+        typed = _enforce_schema(raw, float_dtype=float_dtype)
+
+        for col in ['Ticker-Region', 'Ticker', 'Date', 'FactSet Industry']:
+            assert isinstance(typed[col].dtype, pd.CategoricalDtype)
+        assert typed['Year'].dtype == np.int16
+        assert typed['Ending Price'].dtype == float_dtype
+        assert typed['6-Mo Momentum %'].dtype == float_dtype
+        assert np.isnan(typed['6-Mo Momentum %'].iloc[1])
+        # input frame is left untouched
+        assert raw['Ticker'].dtype != typed['Ticker'].dtype
+
+    def test_typed_frame_in_market_object(self, raw):
+        typed = _enforce_schema(raw, float_dtype='float32')
+        market = MarketObject(typed[typed['Year'] == 2020], 2020, verbosity=0)
+
+        assert market.get_price('MSFT') == 200.0
+        assert type(market.get_price('MSFT')) is float
+        assert market.get_price('GOOG') is None
+
+    def test_load_adds_fossil_flag(self, tmp_path):
+        path = tmp_path / 'data.csv'
+        pd.DataFrame({
+            'Ticker-Region': ['AAPL-US', 'XOM-US', 'BTU-US'],
+            'Date': ['2020-09-30'] * 3,
+            'Ending_Price': [100.0, 50.0, 5.0],
+            'FactSet_Industry': ['Software', 'Integrated Oil', 'Coal'],
+        }).to_csv(path, index=False)
+
+        data = load_data(use_supabase=False, data_path=str(path))
+
+        assert data[FOSSIL_FLAG_COLUMN].tolist() == [False, True, True]
+        market = MarketObject(data, 2020)
+        assert list(market.without_fossil_fuels().stocks.index) == ['AAPL']
+
+    def test_invalid_float_dtype(self):
+        with pytest.raises(ValueError):
+            load_data(use_supabase=False, data_path='unused.csv', float_dtype='float16')
+
+
 class TestMarketObject:
     """Test MarketObject class functionality"""
     
@@ -141,6 +285,89 @@ class TestMarketObject:
         price = market.get_price('MSFT')
         assert price is None or pd.isna(price)
 
+    def test_get_prices_batch(self):
+        """Batch lookup resolves duplicates like get_price and marks invalid prices NaN"""
+        data = pd.DataFrame({
+            'Ticker-Region': ['AAPL-US', 'MSFT-US', 'MSFT-US', 'XOM-US', 'BAD-US'],
+            'Ending Price': [150.0, np.nan, 310.0, -5.0, 0.0],
+            'Market Capitalization': [np.nan, 2000.0, 2100.0, 500.0, 10.0],
+            'Year': [2022] * 5
+        })
+        market = MarketObject(data, 2022)
+        tickers = ['MSFT', 'AAPL', 'NOPE', 'XOM', 'BAD', 'MSFT']
+
+        prices = market.get_prices(tickers)
+
+        np.testing.assert_array_equal(prices, [310.0, 150.0, np.nan, np.nan, np.nan, 310.0])
+        assert [market.get_price(t) for t in tickers] == [310.0, 150.0, None, None, None, 310.0]
+        # market caps come from the first row, even when it is missing
+        np.testing.assert_array_equal(market.get_market_caps(['AAPL', 'MSFT', 'NOPE']), [np.nan, 2000.0, np.nan])
+        assert market.get_prices([]).shape == (0,)
+
+    def test_get_prices_rebuilds_when_stocks_replaced(self):
+        data = pd.DataFrame({'Ticker': ['A', 'B'], 'Ending Price': [1.0, 2.0], 'Year': [2022, 2022]})
+        market = MarketObject(data, 2022)
+        assert list(market.get_prices(['B', 'A'])) == [2.0, 1.0]
+
+        # Replacing stocks invalidates the lookup
+        market.stocks = market.stocks.loc[['A']]
+        assert np.isnan(market.get_prices(['B'])[0])
+
+
+class TestMarketUniverse:
+    """Test cached per-year MarketObjects"""
+
+    @pytest.fixture
+    def data(self):
+        return pd.DataFrame({
+            'Ticker-Region': ['AAPL-US', 'XOM-US', 'MSFT-US', 'AAPL-US', 'XOM-US'],
+            'Ending Price': [150.0, '--', 300.0, 160.0, 90.0],
+            '6-Mo Momentum %': [0.2, 0.3, 0.1, 0.25, 0.05],
+            'FactSet Industry': ['Software', 'Oil & Gas', 'Software', 'Software', 'Oil & Gas'],
+            'Year': [2021, 2021, 2021, 2022, 2022],
+        })
+
+    def test_matches_market_object(self, data):
+        universe = MarketUniverse(data)
+
+        assert universe.years == [2021, 2022]
+        for year in (2021, 2022):
+            expected = MarketObject(data.loc[data['Year'] == year], year)
+            pd.testing.assert_frame_equal(universe.market(year).stocks, expected.stocks)
+        assert universe.market(2030).stocks.empty
+
+    def test_markets_are_cached(self, data):
+        universe = MarketUniverse(data)
+        assert universe.market(2021) is universe.market(2021)
+        assert universe.market(2021, restrict_fossil_fuels=True) is universe.market(2021, restrict_fossil_fuels=True)
+
+    def test_fossil_view_leaves_base_market_unchanged(self, data):
+        universe = MarketUniverse(data)
+        screened = universe.market(2021, restrict_fossil_fuels=True)
+
+        assert 'XOM' not in screened.stocks.index
+        assert 'XOM' in universe.market(2021).stocks.index
+        assert screened.fossil_free
+
+    def test_fossil_flags(self):
+        industry = pd.Series(['Software', 'Oil & Gas Production', None, 'COAL', 'Alternative Energy', 'Banks'])
+        expected = [False, True, False, True, True, False]
+        assert fossil_fuel_flags(industry).tolist() == expected
+        assert fossil_fuel_flags(industry.astype('category')).tolist() == expected
+
+    def test_fossil_view_uses_flag_column_once(self, data):
+        # The load-time flag wins over the industry text and the view is built once
+        flagged = data.assign(**{FOSSIL_FLAG_COLUMN: [False, False, True, False, False]})
+        market = MarketObject(flagged.loc[flagged['Year'] == 2021], 2021)
+
+        screened = market.without_fossil_fuels()
+        assert list(screened.stocks.index) == ['AAPL', 'XOM']
+        assert market.without_fossil_fuels() is screened
+
+    def test_shared_per_frame(self, data):
+        assert MarketUniverse.of(data) is MarketUniverse.of(data)
+        assert MarketUniverse.of(data.copy()) is not MarketUniverse.of(data)
+
 
 class TestMarketObjectIntegration:
     """Integration tests using real data"""
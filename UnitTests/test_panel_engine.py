@@ -0,0 +1,170 @@
+"""
+Test suite for panel_engine.py module
+Checks that the vectorized panel backtest matches rebalance_portfolio
+"""
+import pytest
+import pandas as pd
+import numpy as np
+from src.calculate_holdings import rebalance_portfolio
+from src.panel_engine import build_panel, rebalance_portfolio_panel, select_mask
+from src.factor_function import Momentum6m, ROE, P2B
+from src.market_object import _enforce_schema
+from src.factor_utils import NORMALIZATION_CACHE
+from src.calculate_holdings import BACKTEST_CHECKPOINTS
+from src.result_cache import RESULT_CACHE
+import src.panel_engine as panel_engine
+
+
+@pytest.fixture
+def panel_data():
+    """Multi-year data with duplicates, missing prices, missing caps and fossil industries"""
+    rng = np.random.default_rng(42)
+    tickers = [f"T{i}" for i in range(40)]
+    industries = ['Software', 'Oil & Gas Production', 'Banks', None, 'Coal']
+    rows = []
+    for year in range(2010, 2015):
+        for t in rng.choice(tickers, 30, replace=False):
+            rows.append({
+                'Ticker-Region': f'{t}-US',
+                'Year': year,
+                'Ending Price': rng.choice([np.nan, *rng.uniform(5, 200, 9)]),
+                '6-Mo Momentum %': rng.choice([np.nan, *np.round(rng.normal(size=6), 1)]),
+                'ROE using 9/30 Data': rng.normal(),
+                'Price to Book Using 9/30 Data': rng.uniform(0.2, 6),
+                'Market Capitalization': rng.choice([np.nan, *rng.uniform(50, 5000, 6)]),
+                'FactSet Industry': industries[rng.integers(len(industries))],
+            })
+        # duplicate ticker row with a missing price
+        rows.append({
+            'Ticker-Region': 'T1-US', 'Year': year, 'Ending Price': np.nan,
+            '6-Mo Momentum %': 0.3, 'ROE using 9/30 Data': 1.0,
+            'Price to Book Using 9/30 Data': 1.0, 'Market Capitalization': np.nan,
+            'FactSet Industry': 'Software',
+        })
+    return pd.DataFrame(rows)
+
+
+class TestPanelParity:
+    """Panel engine should reproduce rebalance_portfolio"""
+
+    @pytest.mark.parametrize('which', ['top', 'bottom'])
+    @pytest.mark.parametrize('use_market_cap_weight', [False, True])
+    @pytest.mark.parametrize('restrict_fossil_fuels', [False, True])
+    def test_matches_rebalance_portfolio(self, panel_data, which, use_market_cap_weight, restrict_fossil_fuels):
+        factors = [Momentum6m(), ROE(), P2B()]
+        kwargs = dict(start_year=2010, end_year=2014, initial_aum=1000.0, verbosity=0,
+                      restrict_fossil_fuels=restrict_fossil_fuels, top_pct=20, which=which,
+                      use_market_cap_weight=use_market_cap_weight)
+
+        expected = rebalance_portfolio(panel_data, factors, **kwargs)
+        actual = rebalance_portfolio_panel(panel_data, factors, **kwargs)
+
+        assert set(actual.keys()) == set(expected.keys())
+        assert actual['years'] == expected['years']
+        assert actual['portfolio_values'] == pytest.approx(expected['portfolio_values'], rel=1e-10)
+        assert actual['yearly_returns'] == pytest.approx(expected['yearly_returns'], rel=1e-8, abs=1e-12)
+        assert actual['sharpe_portfolio'] == pytest.approx(expected['sharpe_portfolio'], rel=1e-6)
+        assert actual['max_drawdown_portfolio'] == pytest.approx(expected['max_drawdown_portfolio'], rel=1e-8, abs=1e-12)
+        assert [c['win'] for c in actual['yearly_comparisons']] == [c['win'] for c in expected['yearly_comparisons']]
+
+    @pytest.mark.parametrize('restrict_fossil_fuels', [False, True])
+    def test_typed_frame(self, panel_data, restrict_fossil_fuels):
+        """Categorical/float32 frames from load_data give the same backtest on both engines"""
+        typed = _enforce_schema(panel_data, float_dtype='float32')
+        factors = [Momentum6m(), ROE()]
+        kwargs = dict(start_year=2010, end_year=2014, initial_aum=1000.0, verbosity=0,
+                      restrict_fossil_fuels=restrict_fossil_fuels, top_pct=20)
+
+        expected = rebalance_portfolio(typed, factors, **kwargs)
+        actual = rebalance_portfolio_panel(typed, factors, **kwargs)
+        untyped = rebalance_portfolio_panel(panel_data, factors, **kwargs)
+
+        assert actual['portfolio_values'] == pytest.approx(expected['portfolio_values'], rel=1e-10)
+        assert actual['portfolio_values'] == pytest.approx(untyped['portfolio_values'], rel=1e-5)
+
+    @pytest.mark.parametrize('use_market_cap_weight', [False, True])
+    def test_on_year_updates_match(self, panel_data, use_market_cap_weight):
+        factors = [Momentum6m(), ROE(), P2B()]
+        kwargs = dict(start_year=2010, end_year=2014, initial_aum=1000.0, top_pct=20,
+                      use_market_cap_weight=use_market_cap_weight)
+        expected, actual = [], []
+        rebalance_portfolio(panel_data, factors, on_year=expected.append, **kwargs)
+        rebalance_portfolio_panel(panel_data, factors, on_year=actual.append, **kwargs)
+
+        assert [(u['cohort'], u['year'], u['holdings']) for u in actual] == \
+            [(u['cohort'], u['year'], u['holdings']) for u in expected]
+        assert [u['end_value'] for u in actual] == pytest.approx([u['end_value'] for u in expected], rel=1e-10)
+
+    def test_on_year_early_stop_truncates(self, panel_data):
+        factors = [Momentum6m(), ROE()]
+        kwargs = dict(start_year=2010, end_year=2014, initial_aum=1000.0, top_pct=20)
+        full = rebalance_portfolio_panel(panel_data, factors, **kwargs)
+        stopped = rebalance_portfolio_panel(panel_data, factors, on_year=lambda u: u['year'] == 2011, **kwargs)
+        assert stopped['years'] == [2010, 2011, 2012]
+        assert stopped['portfolio_values'] == full['portfolio_values'][:3]
+        assert rebalance_portfolio_panel(panel_data, factors, **kwargs) == full
+
+    def test_missing_year_liquidates_to_zero(self, panel_data):
+        """A year with no rows yields an empty portfolio, same as the MarketObject loop"""
+        data = panel_data[panel_data['Year'] != 2012]
+        kwargs = dict(start_year=2010, end_year=2014, initial_aum=1.0, verbosity=0)
+
+        expected = rebalance_portfolio(data, [Momentum6m()], **kwargs)
+        actual = rebalance_portfolio_panel(data, [Momentum6m()], **kwargs)
+
+        assert actual['portfolio_values'] == pytest.approx(expected['portfolio_values'])
+        assert actual['final_value'] == 0
+
+
+class TestPanelSelection:
+    """Selection mask semantics"""
+
+    def test_select_mask_ties_use_first_seen(self):
+        scores = np.array([[1.0, 2.0, 2.0, np.nan]])
+        first_seen = np.array([[0.0, 2.0, 1.0, np.inf]])
+
+        top = select_mask(scores, first_seen, top_pct=34, which='top')
+        bottom = select_mask(scores, first_seen, top_pct=34, which='bottom')
+
+        # 3 scored tickers -> 1 selected; tie at 2.0 broken by earliest row
+        assert top.tolist() == [[False, False, True, False]]
+        assert bottom.tolist() == [[True, False, False, False]]
+
+    def test_build_panel_shapes(self, panel_data):
+        panel = build_panel(panel_data, [Momentum6m(), ROE()], 2010, 2014)
+
+        assert list(panel.years) == [2010, 2011, 2012, 2013, 2014]
+        assert panel.prices.shape == (5, len(panel.tickers))
+        assert panel.scores.shape == (5, len(panel.tickers), 2)
+        assert 'T1' in panel.tickers
+
+    def test_build_panel_reuses_cached_scores(self, panel_data):
+        NORMALIZATION_CACHE.clear()
+        full = build_panel(panel_data, [Momentum6m(), ROE()], 2010, 2014)
+        misses = NORMALIZATION_CACHE.info()['misses']
+
+        window = build_panel(panel_data, [ROE()], 2011, 2013)
+        assert NORMALIZATION_CACHE.info()['misses'] == misses
+        np.testing.assert_array_equal(window.scores[:, :, 0], full.scores[1:4, :, 1][:, np.isin(full.tickers, window.tickers)])
+
+    def test_extending_end_year_builds_only_new_years(self, panel_data, monkeypatch):
+        factors = [Momentum6m(), ROE()]
+        kwargs = dict(initial_aum=1000.0, top_pct=20, use_market_cap_weight=True)
+        BACKTEST_CHECKPOINTS.clear()
+        RESULT_CACHE.clear()
+        expected = rebalance_portfolio_panel(panel_data, factors, 2010, 2014, **kwargs)
+        BACKTEST_CHECKPOINTS.clear()
+        RESULT_CACHE.clear()
+        rebalance_portfolio_panel(panel_data, factors, 2010, 2012, **kwargs)
+
+        windows = []
+        real_build_panel = panel_engine.build_panel
+        monkeypatch.setattr(panel_engine, 'build_panel',
+                            lambda data, factors, start, end, **kw: windows.append((start, end)) or real_build_panel(data, factors, start, end, **kw))
+
+        extended = rebalance_portfolio_panel(panel_data, factors, 2010, 2014, **kwargs)
+        shorter = rebalance_portfolio_panel(panel_data, factors, 2010, 2013, **kwargs)
+        assert windows == [(2012, 2014)]
+        assert extended['portfolio_values'] == expected['portfolio_values']
+        assert extended['yearly_returns'] == expected['yearly_returns']
+        assert shorter['portfolio_values'] == expected['portfolio_values'][:4]
@@ -4,6 +4,7 @@ Tests portfolio creation, management, and calculations
 """
 import pytest
 import pandas as pd
+import numpy as np
 from src.portfolio import Portfolio
 from src.market_object import MarketObject
 
@@ -99,6 +100,29 @@ class TestPortfolioManagement:
         
         assert len(portfolio.investments) == 0
 
+    def test_add_investments_bulk(self, portfolio):
+        """Bulk add keeps the parallel arrays and the dict view in sync"""
+        portfolio.add_investment('AAPL', 10)
+        portfolio.add_investments(['MSFT', 'GOOGL'], np.array([5.0, 2.5]))
+
+        assert len(portfolio) == 3
+        assert portfolio.tickers.tolist() == ['AAPL', 'MSFT', 'GOOGL']
+        assert portfolio.shares.dtype == np.float64
+        assert portfolio.investments[2] == {'ticker': 'GOOGL', 'number_of_shares': 2.5}
+
+    def test_add_investments_length_mismatch(self, portfolio):
+        with pytest.raises(ValueError):
+            portfolio.add_investments(['AAPL', 'MSFT'], [1.0])
+
+    def test_investments_view_is_a_copy(self, portfolio):
+        portfolio.add_investment('AAPL', 10)
+        portfolio.investments.append({'ticker': 'MSFT', 'number_of_shares': 1})
+        assert len(portfolio) == 1
+
+    def test_slots(self, portfolio):
+        with pytest.raises(AttributeError):
+            portfolio.extra = 1
+
 
 class TestPortfolioValuation:
     """Test portfolio value calculations"""
@@ -152,6 +176,21 @@ class TestPortfolioValuation:
         # Should only count AAPL
         assert value == 1500.0
     
+    def test_present_value_with_get_price_only_market(self):
+        """Markets without get_prices are priced one ticker at a time"""
+        class SingleTickerMarket:
+            prices = {'AAPL': 150.0, 'MSFT': 300.0}
+
+            def get_price(self, ticker):
+                return self.prices.get(ticker)
+
+        portfolio = Portfolio(name="Test Portfolio")
+        portfolio.add_investment('AAPL', 10)
+        portfolio.add_investment('INVALID', 5)
+        portfolio.add_investment('MSFT', 5)
+
+        assert portfolio.present_value(SingleTickerMarket()) == 3000.0
+
     def test_present_value_with_fractional_shares(self, market):
         """Test present value with fractional shares"""
         portfolio = Portfolio(name="Test Portfolio")
@@ -0,0 +1,93 @@
+"""
+Test suite for profiling.py module
+Checks stage timers, summaries, Chrome traces and the `profile` backtest option
+"""
+import json
+import pytest
+import pandas as pd
+import numpy as np
+from src.calculate_holdings import rebalance_portfolio, BACKTEST_CHECKPOINTS
+from src.panel_engine import rebalance_portfolio_panel
+from src.factor_function import Momentum6m, ROE
+from src.profiling import Profiler, profile, stage, timed, active_profiler
+
+
+@pytest.fixture
+def backtest_data():
+    rng = np.random.default_rng(11)
+    rows = []
+    for year in range(2010, 2014):
+        for i in range(25):
+            rows.append({
+                'Ticker-Region': f'T{i}-US',
+                'Year': year,
+                'Ending Price': rng.uniform(5, 100),
+                '6-Mo Momentum %': rng.normal(),
+                'ROE using 9/30 Data': rng.normal(),
+            })
+    return pd.DataFrame(rows)
+
+
+@timed('double')
+def _double(values):
+    return values * 2
+
+
+class TestProfiler:
+    """Stage timers and reports"""
+
+    def test_off_by_default(self):
+        assert active_profiler() is None
+        with stage('noop') as span:
+            span.rows = 5
+        assert _double(np.arange(3)).tolist() == [0, 2, 4]
+
+    def test_summary_counts_calls_and_rows(self):
+        with profile() as profiler:
+            _double(np.arange(3))
+            _double(np.arange(4))
+            with stage('block') as span:
+                span.rows = 7
+        summary = profiler.summary()
+        assert list(summary) == ['double', 'block']
+        assert summary['double']['calls'] == 2
+        assert summary['double']['rows'] == 7
+        assert summary['block'] == {'seconds': pytest.approx(summary['block']['seconds']), 'calls': 1, 'rows': 7}
+        assert active_profiler() is None
+
+    def test_nested_profiles_forward_to_parent(self):
+        with profile() as outer:
+            _double(np.arange(2))
+            with profile() as inner:
+                _double(np.arange(2))
+        assert inner.summary()['double']['calls'] == 1
+        assert outer.summary()['double']['calls'] == 2
+
+    def test_chrome_trace(self, tmp_path):
+        with profile() as profiler:
+            _double(np.arange(3))
+        path = tmp_path / 'trace.json'
+        profiler.write_chrome_trace(str(path))
+        (event,) = json.loads(path.read_text())['traceEvents']
+        assert event['name'] == 'double' and event['ph'] == 'X'
+        assert event['dur'] >= 0 and event['args'] == {'rows': 3}
+
+
+class TestProfiledBacktests:
+    """`profile=` on the rebalance entry points"""
+
+    @pytest.mark.parametrize('engine', [rebalance_portfolio, rebalance_portfolio_panel])
+    def test_timings_in_result(self, backtest_data, tmp_path, engine):
+        factors = [Momentum6m(), ROE()]
+        BACKTEST_CHECKPOINTS.clear()
+        trace = tmp_path / 'trace.json'
+        profiled = engine(backtest_data, factors, 2010, 2013, 1000.0, profile=str(trace))
+        BACKTEST_CHECKPOINTS.clear()
+        plain = engine(backtest_data, factors, 2010, 2013, 1000.0)
+
+        assert 'timings' not in plain
+        timings = profiled.pop('timings')
+        assert profiled['portfolio_values'] == plain['portfolio_values']
+        assert {'rebalance', 'normalize', 'select', 'growth', 'metrics'} <= set(timings)
+        assert timings['rebalance']['calls'] == 1
+        assert json.loads(trace.read_text())['traceEvents']
@@ -0,0 +1,124 @@
+"""
+Test suite for result_cache.py module
+Checks memoized backtest results in memory and on disk
+"""
+import json
+
+import pytest
+import numpy as np
+import pandas as pd
+import src.calculate_holdings as calculate_holdings_module
+import src.panel_engine as panel_engine
+from src.calculate_holdings import rebalance_cohorts, rebalance_portfolio, BACKTEST_CHECKPOINTS
+from src.panel_engine import rebalance_portfolio_panel
+from src.factor_function import Momentum6m, ROE
+from src.result_cache import ResultCache, RESULT_CACHE
+
+
+@pytest.fixture
+def result_data():
+    rng = np.random.default_rng(11)
+    rows = []
+    for year in range(2010, 2014):
+        for i in range(25):
+            rows.append({
+                'Ticker-Region': f'T{i}-US',
+                'Year': year,
+                'Ending Price': rng.uniform(1, 100),
+                '6-Mo Momentum %': rng.normal(),
+                'ROE using 9/30 Data': rng.normal(),
+                'Market Capitalization': rng.uniform(50, 5000),
+            })
+    return pd.DataFrame(rows)
+
+
+@pytest.fixture(autouse=True)
+def cold_caches():
+    RESULT_CACHE.clear()
+    BACKTEST_CHECKPOINTS.clear()
+    yield
+    RESULT_CACHE.clear()
+
+
+class TestResultCache:
+    """The cache itself"""
+
+    def test_returns_independent_copies(self):
+        cache = ResultCache()
+        value = {'portfolio_values': [1.0, 2.0]}
+        cache.put('a', value)
+        value['portfolio_values'].append(3.0)
+        first = cache.get('a')
+        first['portfolio_values'].clear()
+        assert cache.get('a') == {'portfolio_values': [1.0, 2.0]}
+        assert cache.get('b') is None
+        assert cache.info()['hits'] == 2 and cache.info()['misses'] == 1
+
+    def test_evicts_least_recently_used(self):
+        cache = ResultCache(maxsize=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+        assert cache.get('b') is None and cache.get('a') == 1
+
+    def test_disk_store_survives_a_new_cache(self, tmp_path):
+        ResultCache(directory=str(tmp_path)).put(('k', 1.0), {'final_value': 5.0})
+        restarted = ResultCache(directory=str(tmp_path))
+        assert restarted.get(('k', 1.0)) == {'final_value': 5.0}
+        assert restarted.info()['disk_hits'] == 1
+        restarted.clear(disk=True)
+        assert ResultCache(directory=str(tmp_path)).get(('k', 1.0)) is None
+
+    def test_disk_store_is_plain_json(self, tmp_path, result_data):
+        key = ('cohorts', 'abc123', ('top', 'bottom'), 1000.0, None)
+        cache = ResultCache(directory=str(tmp_path))
+        results = rebalance_cohorts(result_data, [Momentum6m()], 2010, 2013, 1000.0, cohorts=['top', ('bottom', 20)])
+        cache.put(key, results)
+        (path,) = tmp_path.iterdir()
+        stored = json.loads(path.read_text())
+        assert set(stored) == {'key', 'value'}
+        assert ResultCache(directory=str(tmp_path)).get(key) == results
+
+    def test_unreadable_file_is_a_miss(self, tmp_path):
+        cache = ResultCache(directory=str(tmp_path))
+        cache.put('k', {'final_value': 1.0})
+        (path,) = tmp_path.iterdir()
+        path.write_bytes(b'\x80\x04 not json')
+        assert ResultCache(directory=str(tmp_path)).get('k') is None
+
+
+class TestMemoizedBacktests:
+    """Identical reruns skip the backtest"""
+
+    def test_identical_cohort_rerun_is_memoized(self, result_data, monkeypatch):
+        factors = [Momentum6m(), ROE()]
+        first = rebalance_cohorts(result_data, factors, 2010, 2013, 1000.0, top_pct=20)
+
+        def fail(*args, **kwargs):
+            raise AssertionError("backtest recomputed")
+        monkeypatch.setattr(calculate_holdings_module, 'MarketUniverse', type('Universe', (), {'of': fail}))
+
+        # A fresh copy of the same data shares the fingerprint, so the Streamlit rerun case hits
+        again = rebalance_cohorts(result_data.copy(), factors, 2010, 2013, 1000.0, top_pct=20)
+        assert again == first
+        assert again['top'] is not first['top']
+
+    def test_configuration_changes_miss(self, result_data):
+        factors = [Momentum6m(), ROE()]
+        base = rebalance_portfolio(result_data, factors, 2010, 2013, 1000.0, top_pct=20)
+        for kwargs in (dict(top_pct=30), dict(use_market_cap_weight=True), dict(restrict_fossil_fuels=True),
+                       dict(which='bottom')):
+            misses = RESULT_CACHE.info()['misses']
+            rebalance_portfolio(result_data, factors, 2010, 2013, 1000.0, **{'top_pct': 20, **kwargs})
+            assert RESULT_CACHE.info()['misses'] == misses + 1
+        misses = RESULT_CACHE.info()['misses']
+        assert rebalance_portfolio(result_data, factors, 2010, 2013, 1000.0, top_pct=20) == base
+        assert RESULT_CACHE.info()['misses'] == misses
+
+    def test_identical_panel_rerun_is_memoized(self, result_data, monkeypatch):
+        factors = [Momentum6m(), ROE()]
+        first = rebalance_portfolio_panel(result_data, factors, 2010, 2013, 1000.0, top_pct=20)
+        BACKTEST_CHECKPOINTS.clear()
+        monkeypatch.setattr(panel_engine, 'build_panel', lambda *args, **kwargs: pytest.fail("panel rebuilt"))
+        assert rebalance_portfolio_panel(result_data, factors, 2010, 2013, 1000.0, top_pct=20) == first
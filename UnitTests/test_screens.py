@@ -0,0 +1,117 @@
+"""
+Test suite for screens.py module
+Checks screen evaluation, bitmask combination and screened backtests
+"""
+import pytest
+import pandas as pd
+import numpy as np
+from src.calculate_holdings import rebalance_portfolio, rebalance_cohorts
+from src.panel_engine import rebalance_portfolio_panel
+from src.factor_function import Momentum6m, ROE
+from src.screens import (
+    Screen, ScreenMasks, SectorScreen, IndustryExclusionScreen, MinimumScreen, FOSSIL_SCREEN,
+    min_market_cap, min_price, min_volume
+)
+
+
+@pytest.fixture
+def screen_data():
+    rng = np.random.default_rng(3)
+    rows = []
+    for year in range(2010, 2014):
+        for i in range(30):
+            rows.append({
+                'Ticker-Region': f'T{i}-US',
+                'Year': year,
+                'Ending Price': rng.uniform(1, 100),
+                '6-Mo Momentum %': rng.normal(),
+                'ROE using 9/30 Data': rng.normal(),
+                'Market Capitalization': rng.uniform(50, 5000),
+                'Avg Daily 3-Mo Volume Mills $': rng.choice([np.nan, *rng.uniform(0, 10, 5)]),
+                "Scott's Sector (5)": ['Technology', 'Financials', 'Health Care'][i % 3],
+                'FactSet Industry': ['Software', 'Coal', 'Banks'][i % 3],
+            })
+    return pd.DataFrame(rows)
+
+
+class TestScreens:
+    """Individual screens and their masks"""
+
+    def test_screen_results(self, screen_data):
+        assert SectorScreen(['Technology']).keep(screen_data).tolist() == (screen_data["Scott's Sector (5)"] == 'Technology').tolist()
+        assert (~IndustryExclusionScreen(['coal']).keep(screen_data)).sum() == 40
+        volume = screen_data['Avg Daily 3-Mo Volume Mills $']
+        # Missing values fail a minimum
+        assert min_volume(2).keep(screen_data).tolist() == (volume >= 2).tolist()
+        assert min_price(50).keep(screen_data).tolist() == (screen_data['Ending Price'] >= 50).tolist()
+
+    def test_missing_column_keeps_all_rows(self, screen_data, capsys):
+        assert MinimumScreen('Not A Column', 1).keep(screen_data).all()
+        assert "'Not A Column' column not found" in capsys.readouterr().out
+
+    def test_base_screen_is_abstract(self):
+        with pytest.raises(TypeError):
+            Screen()
+
+    def test_equal_screens_share_a_key(self):
+        assert SectorScreen(['b', 'a']) == SectorScreen(['a', 'b', 'a'])
+        assert len({min_price(5), min_price(5.0), min_market_cap(5)}) == 2
+
+    def test_masks_and_screens_once(self, screen_data, monkeypatch):
+        calls = []
+        real_keep = MinimumScreen.keep
+        monkeypatch.setattr(MinimumScreen, 'keep', lambda self, frame: calls.append(self.key) or real_keep(self, frame))
+
+        masks = ScreenMasks(screen_data)
+        screens = [min_price(20), min_market_cap(1000), SectorScreen(['Technology', 'Financials']), FOSSIL_SCREEN]
+        expected = np.ones(len(screen_data), dtype=bool)
+        for screen in screens:
+            expected &= screen.keep(screen_data)
+        price_only = min_price(20).keep(screen_data)
+        calls.clear()
+
+        np.testing.assert_array_equal(masks.mask(screens), expected)
+        np.testing.assert_array_equal(masks.mask(screens[:1]), price_only)
+        np.testing.assert_array_equal(masks.mask(list(reversed(screens))), expected)
+        assert masks.mask([]).all()
+        assert sorted(calls) == sorted([min_price(20).key, min_market_cap(1000).key])
+        assert masks.info()['screens'] == 4
+
+    def test_more_than_64_screens(self, screen_data):
+        masks = ScreenMasks(screen_data)
+        prices = screen_data['Ending Price'].to_numpy()
+        for minimum in range(70):
+            masks.mask([min_price(minimum)])
+        np.testing.assert_array_equal(masks.mask([min_price(3), min_price(68)]), prices >= 68)
+        np.testing.assert_array_equal(masks.mask([min_price(66)]), prices >= 66)
+
+
+class TestScreenedBacktests:
+    """Screens restrict the ranked market only"""
+
+    def test_one_step_matches_filtered_data(self, screen_data):
+        factors = [Momentum6m(), ROE()]
+        screens = [min_volume(2), SectorScreen(['Technology', 'Health Care'])]
+        kwargs = dict(start_year=2010, end_year=2011, initial_aum=1000.0, top_pct=20)
+
+        # Removing the failing start-year rows is the same universe (the exit market is unscreened)
+        failing = (screen_data['Year'] == 2010) & ~(
+            (screen_data['Avg Daily 3-Mo Volume Mills $'] >= 2)
+            & screen_data["Scott's Sector (5)"].isin(['Technology', 'Health Care'])
+        )
+        expected = rebalance_portfolio(screen_data[~failing].reset_index(drop=True), factors, **kwargs)
+        actual = rebalance_portfolio(screen_data, factors, screens=screens, **kwargs)
+        assert actual['final_value'] == pytest.approx(expected['final_value'], rel=1e-12)
+        assert actual['final_value'] != pytest.approx(rebalance_portfolio(screen_data, factors, **kwargs)['final_value'])
+
+    @pytest.mark.parametrize('restrict_fossil_fuels', [False, True])
+    def test_panel_matches_cohorts(self, screen_data, restrict_fossil_fuels):
+        factors = [Momentum6m(), ROE()]
+        screens = [min_price(10), min_market_cap(500)]
+        kwargs = dict(start_year=2010, end_year=2013, initial_aum=1000.0, top_pct=20,
+                      restrict_fossil_fuels=restrict_fossil_fuels)
+
+        cohorts = rebalance_cohorts(screen_data, factors, screens=screens, **kwargs)
+        for which in ('top', 'bottom'):
+            panel = rebalance_portfolio_panel(screen_data, factors, which=which, screens=screens, **kwargs)
+            assert panel['portfolio_values'] == pytest.approx(cohorts[which]['portfolio_values'], rel=1e-12)
@@ -0,0 +1,201 @@
+"""
+Test suite for supabase_client.py pagination
+Uses an in-memory fake of the Supabase query builder (no network)
+"""
+import threading
+import pytest
+import pandas as pd
+import src.supabase_client as supabase_client
+from src.supabase_client import load_supabase_data, load_market_data, year_date_range, PAGE_SIZE
+from src.diagnostics import counting
+
+
+class FakeResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class FakeQuery:
+    """Minimal chainable stand-in for the postgrest select builder"""
+
+    def __init__(self, client, rows):
+        self.client = client
+        self.rows = rows
+        self.count = None
+        self.head = False
+        self.ordered = None
+        self.bounds = None
+
+    def select(self, *columns, count=None, head=None):
+        if not head:
+            self.client.selects.append(columns)
+        self.count = count
+        self.head = bool(head)
+        return self
+
+    def in_(self, column, values):
+        self.rows = [r for r in self.rows if r.get(column) in values]
+        return self
+
+    def gt(self, column, value):
+        self.rows = [r for r in self.rows if r[column] > value]
+        return self
+
+    def gte(self, column, value):
+        self.rows = [r for r in self.rows if r[column] >= value]
+        return self
+
+    def lte(self, column, value):
+        self.rows = [r for r in self.rows if r[column] <= value]
+        return self
+
+    def order(self, column, desc=False):
+        self.ordered = column
+        return self
+
+    def range(self, start, end):
+        self.bounds = (start, end)
+        return self
+
+    def execute(self):
+        rows = sorted(self.rows, key=lambda r: r[self.ordered]) if self.ordered else list(self.rows)
+        if self.head:
+            return FakeResponse([], count=len(rows) if self.count else None)
+        with self.client.lock:
+            self.client.page_requests.append(self.bounds)
+            if self.bounds in self.client.fail_once:
+                self.client.fail_once.remove(self.bounds)
+                raise ConnectionError('transient failure')
+        start, end = self.bounds
+        return FakeResponse(rows[start:end + 1])
+
+
+class FakeClient:
+    def __init__(self, rows):
+        # Store rows shuffled so ordering has to come from order()
+        self.rows = list(reversed(rows))
+        self.page_requests = []
+        self.fail_once = set()
+        self.selects = []
+        self.lock = threading.Lock()
+
+    def table(self, name):
+        return FakeQuery(self, list(self.rows))
+
+
+def _table(n):
+    sectors = ['Technology', 'Consumer']
+    return [{'ID': i, 'Ticker-Region': f'T{i}-US', 'Scotts_Sector_5': sectors[i % 2],
+             'Date': f'{2002 + i % 10}-09-30'} for i in range(1, n + 1)]
+
+
+@pytest.fixture
+def fake_client(monkeypatch):
+    client = FakeClient(_table(2 * PAGE_SIZE + 500))
+    monkeypatch.setenv('SUPABASE_URL', 'https://example.supabase.co')
+    monkeypatch.setenv('SUPABASE_KEY', 'test-key')
+    monkeypatch.setattr(supabase_client, 'create_client', lambda url, key: client)
+    monkeypatch.setattr(supabase_client.time, 'sleep', lambda s: None)
+    return client
+
+
+class TestPagination:
+    """Sequential and concurrent pagination"""
+
+    def test_parallel_fetch_in_id_order(self, fake_client):
+        df = load_supabase_data('T', show_progress=False)
+
+        assert len(df) == 2 * PAGE_SIZE + 500
+        assert list(df['ID']) == sorted(df['ID'])
+        assert sorted(fake_client.page_requests) == [(0, 999), (1000, 1999), (2000, 2999)]
+
+    def test_sequential_matches_parallel(self, fake_client):
+        parallel = load_supabase_data('T', show_progress=False)
+        sequential = load_supabase_data('T', show_progress=False, parallel=False)
+        pd.testing.assert_frame_equal(parallel, sequential)
+
+    def test_page_retry(self, fake_client):
+        fake_client.fail_once.add((1000, 1999))
+        df = load_supabase_data('T', show_progress=False)
+
+        assert len(df) == 2 * PAGE_SIZE + 500
+        assert fake_client.page_requests.count((1000, 1999)) == 2
+
+    def test_page_failure_after_retries(self, fake_client):
+        fake_client.fail_once.add((0, 999))
+        with pytest.raises(ConnectionError):
+            load_supabase_data('T', show_progress=False, max_retries=0)
+
+    def test_filters_apply_to_count_and_pages(self, fake_client):
+        df = load_supabase_data('T', show_progress=False, sectors=['Technology'], min_id=1000)
+
+        expected = [r['ID'] for r in _table(2 * PAGE_SIZE + 500) if r['ID'] > 1000 and r['ID'] % 2 == 0]
+        assert list(df['ID']) == expected
+
+    def test_exact_multiple_of_page_size(self, monkeypatch, fake_client):
+        fake_client.rows = fake_client.rows[:PAGE_SIZE]
+        df = load_supabase_data('T', show_progress=False)
+
+        assert len(df) == PAGE_SIZE
+        # one extra probe past the counted rows in case rows were inserted meanwhile
+        assert (PAGE_SIZE, 2 * PAGE_SIZE - 1) in fake_client.page_requests
+
+    def test_column_projection_quotes_special_names(self, fake_client):
+        load_supabase_data('T', show_progress=False, columns=['ID', 'Ticker-Region', 'Ending_Price'])
+
+        assert set(fake_client.selects) == {('ID', '"Ticker-Region"', 'Ending_Price')}
+
+    def test_no_projection_selects_all(self, fake_client):
+        load_supabase_data('T', show_progress=False)
+        assert set(fake_client.selects) == {('*',)}
+
+    def test_missing_credentials(self, monkeypatch):
+        monkeypatch.delenv('SUPABASE_URL', raising=False)
+        monkeypatch.delenv('SUPABASE_KEY', raising=False)
+        with pytest.raises(RuntimeError, match='credentials'):
+            load_supabase_data('T', show_progress=False)
+
+
+class TestDateRange:
+    """Year-range predicate pushdown and load_market_data"""
+
+    def test_year_date_range(self):
+        assert year_date_range(2005, 2007) == ('2005-01-01', '2007-12-31')
+        assert year_date_range(None, 2007) == (None, '2007-12-31')
+        assert year_date_range() == (None, None)
+
+    def test_date_filter_applies_to_count_and_pages(self, fake_client):
+        df = load_supabase_data('T', show_progress=False, start_date='2005-01-01', end_date='2006-12-31')
+
+        expected = [r['ID'] for r in _table(2 * PAGE_SIZE + 500) if r['Date'][:4] in ('2005', '2006')]
+        assert list(df['ID']) == expected
+        # the count honours the filter too, so only the needed pages are requested
+        assert (PAGE_SIZE, 2 * PAGE_SIZE - 1) not in fake_client.page_requests
+
+    def test_load_market_data_year_range(self, fake_client):
+        df = load_market_data('T', start_year=2010, end_year=2011, show_progress=False)
+
+        assert set(df['Year']) == {2010, 2011}
+        assert df['Ticker'].iloc[0] == f"T{df['ID'].iloc[0]}"
+
+    def test_load_market_data_single_year(self, fake_client):
+        df = load_market_data('T', start_year=2002, year_filter=2004, show_progress=False)
+        assert set(df['Year']) == {2004}
+
+    def test_load_market_data_cleans_rows(self, fake_client):
+        fake_client.rows = [
+            {'ID': 1, 'Ticker-Region': 'AAA-US', 'Date': '2010-09-30', 'Ending_Price': 10.0, 'FactSet_Industry': 'Software'},
+            {'ID': 2, 'Ticker-Region': 'BBB-US', 'Date': '2010-09-30', 'Ending_Price': '--', 'FactSet_Industry': 'Software'},
+            {'ID': 3, 'Ticker-Region': 'CCC-US', 'Date': '2010-09-30', 'Ending_Price': 5.0, 'FactSet_Industry': 'Oil & Gas Production'},
+            {'ID': 4, 'Ticker-Region': 'DDD-US', 'Date': '2010-09-30', 'Ending_Price': -1.0, 'FactSet_Industry': 'Banks'},
+            {'ID': 5, 'Ticker-Region': 'EEE-US', 'Date': '2011-09-30', 'Ending_Price': 7.0, 'FactSet_Industry': 'Banks'},
+        ]
+        with counting() as counts:
+            df = load_market_data('T', year_filter=2010, restrict_fossil_fuels=True, show_progress=False)
+        assert list(df['Ticker']) == ['AAA']
+        assert counts == {'fossil_rows_removed': 1, 'rows_missing_essential': 2}
+
+    def test_load_market_data_empty(self, fake_client):
+        df = load_market_data('T', start_year=1990, end_year=1991, show_progress=False)
+        assert df.empty
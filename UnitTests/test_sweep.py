@@ -0,0 +1,95 @@
+"""
+Test suite for sweep.py module
+Checks grid construction, shared-frame round trips and that sweep rows match single backtests
+"""
+import pytest
+import pandas as pd
+import numpy as np
+from src.panel_engine import rebalance_portfolio_panel
+from src.market_object import _enforce_schema
+import src.sweep as sweep
+from src.sweep import (
+    factor_combinations, make_grid, run_sweep, read_shared_frame, write_shared_frame, RESULT_SCHEMA
+)
+
+
+@pytest.fixture
+def sweep_data():
+    rng = np.random.default_rng(7)
+    rows = []
+    for year in range(2010, 2015):
+        for i in range(40):
+            rows.append({
+                'Ticker-Region': f'T{i}-US',
+                'Year': year,
+                'Ending Price': rng.uniform(5, 200),
+                '6-Mo Momentum %': rng.normal(),
+                'ROE using 9/30 Data': rng.normal(),
+                'Price to Book Using 9/30 Data': rng.uniform(0.2, 6),
+                'Market Capitalization': rng.uniform(50, 5000),
+                'FactSet Industry': ['Software', 'Coal', 'Banks'][i % 3],
+            })
+    return pd.DataFrame(rows)
+
+
+FACTORS = ['6-Mo Momentum %', 'ROE using 9/30 Data', 'Price to Book Using 9/30 Data']
+
+
+class TestGrid:
+    """Config grid construction"""
+
+    def test_factor_combinations(self):
+        assert len(factor_combinations([f'F{i}' for i in range(13)], 2)) == 78
+
+    def test_make_grid(self):
+        grid = make_grid(factor_combinations(FACTORS, 2), top_pcts=[5, 10], use_market_cap_weight=[False, True],
+                         year_windows=[(2010, 2012), (2011, 2014)])
+        assert len(grid) == 3 * 2 * 2 * 2
+        assert grid[0] == {'factors': (FACTORS[0], FACTORS[1]), 'start_year': 2010, 'end_year': 2012,
+                           'restrict_fossil_fuels': False, 'top_pct': 5, 'which': 'top',
+                           'use_market_cap_weight': False}
+
+
+class TestSweep:
+    """run_sweep results"""
+
+    def test_shared_frame_roundtrip(self, sweep_data, tmp_path):
+        typed = _enforce_schema(sweep_data.copy(), 'float32')
+        path = str(tmp_path / 'rdata.arrow')
+        write_shared_frame(typed, path)
+        pd.testing.assert_frame_equal(read_shared_frame(path), typed)
+
+    @pytest.mark.parametrize('max_workers', [1, 2])
+    def test_rows_match_single_backtests(self, sweep_data, tmp_path, max_workers):
+        configs = make_grid(factor_combinations(FACTORS, 2), top_pcts=[10, 25], which=['top', 'bottom'],
+                            restrict_fossil_fuels=[False, True], year_windows=[(2010, 2014)])
+        output = tmp_path / 'sweep.parquet'
+
+        results = run_sweep(sweep_data, configs, initial_aum=100.0, max_workers=max_workers,
+                            output_path=str(output), show_progress=False)
+
+        assert list(results['run_id']) == list(range(len(configs)))
+        assert results['error'].isna().all()
+        for config, row in zip(configs, results.itertuples()):
+            kwargs = {k: v for k, v in config.items() if k != 'factors'}
+            expected = rebalance_portfolio_panel(sweep_data, list(config['factors']), initial_aum=100.0, **kwargs)
+            assert row.final_value == pytest.approx(expected['final_value'], rel=1e-12)
+            assert row.factors == ', '.join(config['factors'])
+
+        written = pd.read_parquet(output)
+        assert written.columns.tolist() == RESULT_SCHEMA.names
+        pd.testing.assert_frame_equal(written.sort_values('run_id', ignore_index=True), results)
+
+    def test_failed_run_is_recorded(self, sweep_data, monkeypatch):
+        def build_panel(data, factors, *args, **kwargs):
+            if factors == ['ROE using 9/30 Data']:
+                raise KeyError('ROE using 9/30 Data')
+            return real_build_panel(data, factors, *args, **kwargs)
+        real_build_panel = sweep.build_panel
+        monkeypatch.setattr(sweep, 'build_panel', build_panel)
+
+        configs = make_grid([('6-Mo Momentum %',), ('ROE using 9/30 Data',)], year_windows=[(2010, 2014)])
+        results = run_sweep(sweep_data, configs, max_workers=1, show_progress=False)
+        assert results['error'].isna().tolist() == [True, False]
+        assert results.loc[1, 'error'].startswith('KeyError')
+        assert np.isnan(results.loc[1, 'final_value'])
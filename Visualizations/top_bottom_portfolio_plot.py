@@ -1,6 +1,6 @@
 import matplotlib.pyplot as plt
 from matplotlib.ticker import FuncFormatter
-from src.market_object import MarketObject
+from src.market_object import MarketUniverse
 import math
 import pandas as pd
 
@@ -10,11 +10,11 @@ from src.factor_utils import normalize_series
 # Respect per-factor direction (higher_is_better) from the docs
 from src.factors_doc import FACTOR_DOCS
 
-# Optionally compute baseline portfolio values using calculate_holdings.rebalance_portfolio
+# Optionally compute cohort and baseline portfolio values using calculate_holdings.rebalance_cohorts
 try:
-    from src.calculate_holdings import rebalance_portfolio
+    from src.calculate_holdings import rebalance_cohorts
 except Exception:
-    rebalance_portfolio = None
+    rebalance_cohorts = None
 
 
 def plot_top_bottom_percent(rdata,
@@ -35,7 +35,9 @@ def plot_top_bottom_percent(rdata,
                             show_percent_guides=True,
                             baseline_portfolio_values=None,
                             baseline_pct=10,
-                            use_rebalance_for_selection=True):
+                            use_rebalance_for_selection=True,
+                            cohort_results=None,
+                            screens=None):
     """
     Plot dollar-invested growth for the top-N% and optionally bottom-N% portfolios
     constructed from a list of factors each year, alongside a benchmark.
@@ -56,6 +58,12 @@ def plot_top_bottom_percent(rdata,
                 below will reallocate the factor's dollars equally among the remaining
                 valid tickers so the portfolio is always fully invested (subject to
                 available valid tickers).
+            - `cohort_results` accepts a `rebalance_cohorts` result computed by the
+                caller (keys 'top' / 'bottom' at `percent`, optionally
+                ('top', baseline_pct)); only missing cohorts are backtested, all of
+                them in a single `rebalance_cohorts` pass.
+            - `screens` (see `src/screens.py`) is passed to `rebalance_cohorts` for
+                the cohorts computed here.
     """
 
     percent = int(percent)
@@ -76,7 +84,7 @@ def plot_top_bottom_percent(rdata,
 
     # Inline selection only supports 'by_factor' mode now. The canonical
     # rebalance-driven selection (use_rebalance_for_selection=True) is the
-    # default and will call `calculate_holdings.rebalance_portfolio` which
+    # default and will call `calculate_holdings.rebalance_cohorts` which
     # applies normalize_series(...) and the factor direction consistently.
 
     # compute_raw_combined_scores removed: inline selection uses by_factor only
@@ -90,17 +98,23 @@ def plot_top_bottom_percent(rdata,
 
     # Optionally compute top/bottom series using the full rebalance backtest logic
     skip_inline_selection = False
-    if use_rebalance_for_selection and rebalance_portfolio is not None:
+    cohort_results = dict(cohort_results or {})
+    # The baseline shares the top cohort when it uses the same percentage
+    baseline_key = 'top' if baseline_pct == percent else ('top', baseline_pct)
+    if use_rebalance_for_selection and (rebalance_cohorts is not None or cohort_results):
         try:
             start_year = years[0]
             end_year = years[-1]
-            # Top series using rebalance logic with user-selected percent
-            res_top = rebalance_portfolio(rdata, factors, start_year, end_year, initial_investment, verbosity=0, restrict_fossil_fuels=restrict_fossil_fuels, top_pct=percent, which='top')
-            top_values = res_top.get('portfolio_values', [initial_investment])
-            # Bottom series using rebalance logic with user-selected percent
+            # Top / bottom (and baseline) series from one rebalance pass with user-selected percent
+            needed = ['top'] + (['bottom'] if show_bottom else [])
+            if baseline_portfolio_values is None:
+                needed.append(baseline_key)
+            missing = [c for c in dict.fromkeys(needed) if c not in cohort_results]
+            if missing:
+                cohort_results.update(rebalance_cohorts(rdata, factors, start_year, end_year, initial_investment, verbosity=0, restrict_fossil_fuels=restrict_fossil_fuels, top_pct=percent, cohorts=missing, screens=screens))
+            top_values = cohort_results['top'].get('portfolio_values', [initial_investment])
             if show_bottom:
-                res_bot = rebalance_portfolio(rdata, factors, start_year, end_year, initial_investment, verbosity=0, restrict_fossil_fuels=restrict_fossil_fuels, top_pct=percent, which='bottom')
-                bottom_values = res_bot.get('portfolio_values', [initial_investment])
+                bottom_values = cohort_results['bottom'].get('portfolio_values', [initial_investment])
             skip_inline_selection = True
         except Exception:
             # fallback to inline selection logic below
@@ -120,8 +134,9 @@ def plot_top_bottom_percent(rdata,
                     diag_year = years[0]
                     diag_next = years[0]
 
-                market = MarketObject(rdata.loc[rdata['Year'] == diag_year], diag_year)
-                next_market = MarketObject(rdata.loc[rdata['Year'] == diag_next], diag_next)
+                markets = MarketUniverse.of(rdata)
+                market = markets.market(diag_year)
+                next_market = markets.market(diag_next)
 
                 def compute_cohort_stats(is_top: bool):
                     universe = 0
@@ -246,12 +261,14 @@ def plot_top_bottom_percent(rdata,
     year = None
 
     if not skip_inline_selection:
+        # Per-year markets shared with rebalance_portfolio (cleaned once per dataset)
+        markets = MarketUniverse.of(rdata)
         for i in range(len(years) - 1):
             year = years[i]
             next_year = years[i + 1]
 
-            market = MarketObject(rdata.loc[rdata['Year'] == year], year)
-            next_market = MarketObject(rdata.loc[rdata['Year'] == next_year], next_year)
+            market = markets.market(year)
+            next_market = markets.market(next_year)
 
             # initialize per-year per-factor stats containers so verbose printing is safe
             top_factor_stats = []
@@ -486,12 +503,14 @@ def plot_top_bottom_percent(rdata,
         plt.plot(years, benchmark_values, marker='s', linestyle='--', color='r', label=benchmark_label, linewidth=1.2)
 
     # Optionally plot a baseline portfolio growth series (from portfolio_growth_plot)
-    if baseline_portfolio_values is None and rebalance_portfolio is not None:
+    if baseline_portfolio_values is None and (rebalance_cohorts is not None or baseline_key in cohort_results):
         try:
             # compute baseline portfolio values using the same factors and rdata
             start_year = years[0]
             end_year = years[-1]
-            res = rebalance_portfolio(rdata, factors, start_year, end_year, initial_investment, verbosity=0, restrict_fossil_fuels=restrict_fossil_fuels, top_pct=baseline_pct)
+            res = cohort_results.get(baseline_key)
+            if res is None:
+                res = rebalance_cohorts(rdata, factors, start_year, end_year, initial_investment, verbosity=0, restrict_fossil_fuels=restrict_fossil_fuels, top_pct=baseline_pct, cohorts=['top'])['top']
             candidate = res.get('portfolio_values') if isinstance(res, dict) else None
             if candidate:
                 baseline_portfolio_values = candidate
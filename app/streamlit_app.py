@@ -36,6 +36,7 @@ import streamlit as st
 import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
+import time
 from datetime import datetime
 
 def check_password():
@@ -75,7 +76,13 @@ def check_password():
 
 # Import project modules
 from src.market_object import load_data
-from src.calculate_holdings import rebalance_portfolio
+from src.dataset_registry import SHARED_DATASETS, dataset_key
+from src.data_cache import get_cache_dir
+from src.result_cache import RESULT_CACHE
+from src.jobs import JOB_RUNNER, JobCancelled
+from src.calculate_holdings import rebalance_cohorts
+from src.panel_engine import rebalance_portfolio_panel
+from src.screens import SECTOR_COLUMN, VOLUME_COLUMN, SectorScreen, min_market_cap, min_price, min_volume
 from src.factor_function import (
     Momentum6m, Momentum12m, Momentum1m, ROE, ROA, 
     P2B, NextFYrEarns, OneYrPriceVol,
@@ -85,6 +92,10 @@ from src.factor_function import (
 from Visualizations.portfolio_growth_plot import plot_portfolio_growth
 from Visualizations.top_bottom_portfolio_plot import plot_top_bottom_percent
 
+# Persist backtest results next to the data cache so identical runs stay free across app restarts
+if RESULT_CACHE.directory is None:
+    RESULT_CACHE.directory = os.path.join(get_cache_dir(), 'results')
+
 # Page configuration
 st.set_page_config(
     page_title="Factor-Lake Portfolio Analysis",
@@ -236,10 +247,105 @@ SECTOR_OPTIONS = [
     'Healthcare'
 ]
 
+def _timing_table(timings):
+    """Per-stage timings (see src/profiling.py) as a table, slowest stage first."""
+    table = pd.DataFrame.from_dict(timings, orient='index')
+    table.index.name = 'Stage'
+    table['ms'] = (table.pop('seconds') * 1000).round(1)
+    return table[['ms', 'calls', 'rows']].sort_values('ms', ascending=False)
+
+
+def _prepare_rdata(rdata, start_year, end_year):
+    """Analysis frame for the app: typed Ticker/Year, the selected years and only the columns the backtests use."""
+    # The registry's frame is shared and read-only: add columns to a shallow copy, never to it
+    rdata = rdata.copy(deep=False)
+    # load_data already derives typed Ticker/Year columns
+    if 'Ticker' not in rdata.columns:
+        rdata['Ticker'] = rdata['Ticker-Region'].dropna().apply(
+            lambda x: x.split('-')[0].strip()
+        )
+    if 'Year' not in rdata.columns:
+        rdata['Year'] = pd.to_datetime(rdata['Date']).dt.year
+
+    # If the user selected an analysis period, filter the loaded data to that range
+    try:
+        rdata = rdata[(rdata['Year'] >= int(start_year)) & (rdata['Year'] <= int(end_year))]
+    except Exception:
+        # If filtering fails, keep full dataset but warn the user
+        st.warning('Unable to filter loaded data by selected years; using full dataset instead.')
+
+    # Keep only relevant columns (include Market Capitalization for cap-weighted portfolios)
+    cols_to_keep = ['Ticker', 'Year']
+    if 'Ending Price' in rdata.columns:
+        cols_to_keep.append('Ending Price')
+    elif 'Ending_Price' in rdata.columns:
+        rdata['Ending Price'] = rdata['Ending_Price']
+        cols_to_keep.append('Ending Price')
+
+    # Add Market Capitalization if available (needed for cap-weighted portfolios)
+    if 'Market Capitalization' in rdata.columns:
+        cols_to_keep.append('Market Capitalization')
+    elif 'Market_Capitalization' in rdata.columns:
+        rdata['Market Capitalization'] = rdata['Market_Capitalization']
+        cols_to_keep.append('Market Capitalization')
+
+    for col in [SECTOR_COLUMN, VOLUME_COLUMN] + list(FACTOR_MAP.keys()):
+        if col in rdata.columns:
+            cols_to_keep.append(col)
+
+    return rdata[cols_to_keep]
+
+
+# Seconds between reruns while a background job (see src/jobs.py) is running
+JOB_POLL_SECONDS = 0.5
+
+
+def _poll_job(state_key, label):
+    """
+    Show progress (and a Cancel button) for the background job stored in st.session_state[state_key].
+
+    Returns None while the job is queued or running. Once it has finished the entry is removed from
+    the session and returned with 'state' plus 'result' (done) or 'error' (failed).
+    """
+    entry = st.session_state.get(state_key)
+    if entry is None:
+        return None
+    try:
+        status = JOB_RUNNER.status(entry['id'])
+    except KeyError:
+        # Dropped from the job table (e.g. the server restarted)
+        del st.session_state[state_key]
+        return None
+
+    if status['state'] in ('queued', 'running'):
+        total = status['total'] or 0
+        text = f"{label}: year {status['done']} of {total}" if total else f"{label} ({status['state']})..."
+        st.progress(status['done'] / total if total else 0.0, text=text)
+        # Years streamed so far through the backtest's on_year callback
+        if entry.get('updates'):
+            partial = pd.DataFrame(list(entry['updates']))
+            st.line_chart(partial.pivot_table(index='year', columns='cohort', values='end_value'))
+        if st.button("Cancel", key=f"{state_key}_cancel"):
+            JOB_RUNNER.cancel(entry['id'])
+        st.session_state.polling_jobs = True
+        return None
+
+    del st.session_state[state_key]
+    entry = dict(entry, state=status['state'], result=None, error=None)
+    try:
+        entry['result'] = JOB_RUNNER.result(entry['id'])
+    except JobCancelled:
+        pass
+    except Exception as e:
+        entry['error'] = e
+    return entry
+
+
 def main():
     # Check password first
     if not check_password():
         st.stop()  # Stop execution if password is incorrect
+    st.session_state.polling_jobs = False
     
     # Header
     st.markdown('<div class="main-header">Factor-Lake Portfolio Analysis</div>', unsafe_allow_html=True)
@@ -261,6 +367,9 @@ def main():
         use_supabase = True
         excel_file = None
         uploaded_file = None
+        if st.button("Clear shared data cache", help="Reload the table on the next 'Load Data' (for every session)"):
+            SHARED_DATASETS.invalidate()
+            st.info("Shared data cache cleared")
 
         st.write("---")
         # Fossil Fuel Restriction
@@ -297,6 +406,32 @@ def main():
                 help="Choose which sectors to include in the analysis"
             )
         st.write("---")
+        # Liquidity / size / price floors (0 = off)
+        st.subheader("Universe Screens")
+        with st.expander("Minimum liquidity, size and price"):
+            min_volume_value = st.number_input(
+                "Min Avg Daily 3-Mo Volume ($M)", min_value=0.0, value=0.0, step=0.5,
+                help="Exclude stocks trading less than this many $ millions per day"
+            )
+            min_cap_value = st.number_input(
+                "Min Market Capitalization", min_value=0.0, value=0.0, step=50.0,
+                help="Exclude stocks below this market capitalization"
+            )
+            min_price_value = st.number_input(
+                "Min Price ($)", min_value=0.0, value=0.0, step=1.0,
+                help="Exclude stocks priced below this at rebalance"
+            )
+        # Screens are applied at run time from precomputed masks, so changing them needs no reload
+        screens = []
+        if sector_filter_enabled:
+            screens.append(SectorScreen(selected_sectors))
+        if min_volume_value > 0:
+            screens.append(min_volume(min_volume_value))
+        if min_cap_value > 0:
+            screens.append(min_market_cap(min_cap_value))
+        if min_price_value > 0:
+            screens.append(min_price(min_price_value))
+        st.write("---")
         # Date Range
         st.subheader("Analysis Period")
         col1, col2 = st.columns(2)
@@ -354,6 +489,8 @@ def main():
             help="Control the amount of detail in output logs"
         )
         show_loading = st.checkbox("Show data loading progress", value=True)
+        show_timings = st.checkbox("Show timing breakdown", value=False,
+                                   help="Time each stage of the backtest (normalization, selection, pricing, ...)")
 
     # Main content area
     tab1, tab2, tab3 = st.tabs(["Analysis", "Results", "About"])
@@ -422,49 +559,23 @@ def main():
             if st.button("Load Data", use_container_width=True, type="primary"):
                 with st.spinner("Loading market data..."):
                     try:
-                        sectors_to_use = selected_sectors if sector_filter_enabled else None
-
-                        rdata = load_data(
+                        load_kwargs = dict(
                             restrict_fossil_fuels=restrict_fossil_fuels,
                             use_supabase=True,
                             data_path=None,
                             show_loading_progress=show_loading,
-                            sectors=sectors_to_use
+                            # Sector and volume columns feed the run-time universe screens
+                            columns=[SECTOR_COLUMN, VOLUME_COLUMN],
+                            factors=list(FACTOR_MAP.keys()),
+                            start_year=int(start_year),
+                            end_year=int(end_year),
+                            float_dtype='float32'
                         )
-
-                        # Data preprocessing
-                        rdata['Ticker'] = rdata['Ticker-Region'].dropna().apply(
-                            lambda x: x.split('-')[0].strip()
+                        # Sessions asking for the same table share one read-only frame (see src/dataset_registry.py)
+                        rdata = SHARED_DATASETS.get_or_load(
+                            dataset_key(**load_kwargs) + ('streamlit',),
+                            lambda: _prepare_rdata(load_data(**load_kwargs), start_year, end_year)
                         )
-                        rdata['Year'] = pd.to_datetime(rdata['Date']).dt.year
-
-                        # If the user selected an analysis period, filter the loaded data to that range
-                        try:
-                            rdata = rdata[(rdata['Year'] >= int(start_year)) & (rdata['Year'] <= int(end_year))]
-                        except Exception:
-                            # If filtering fails, keep full dataset but warn the user
-                            st.warning('Unable to filter loaded data by selected years; using full dataset instead.')
-
-                        # Keep only relevant columns (include Market Capitalization for cap-weighted portfolios)
-                        cols_to_keep = ['Ticker', 'Year']
-                        if 'Ending Price' in rdata.columns:
-                            cols_to_keep.append('Ending Price')
-                        elif 'Ending_Price' in rdata.columns:
-                            rdata['Ending Price'] = rdata['Ending_Price']
-                            cols_to_keep.append('Ending Price')
-                        
-                        # Add Market Capitalization if available (needed for cap-weighted portfolios)
-                        if 'Market Capitalization' in rdata.columns:
-                            cols_to_keep.append('Market Capitalization')
-                        elif 'Market_Capitalization' in rdata.columns:
-                            rdata['Market Capitalization'] = rdata['Market_Capitalization']
-                            cols_to_keep.append('Market Capitalization')
-
-                        for factor in FACTOR_MAP.keys():
-                            if factor in rdata.columns:
-                                cols_to_keep.append(factor)
-
-                        rdata = rdata[cols_to_keep]
 
                         st.session_state.rdata = rdata
                         st.session_state.data_loaded = True
@@ -491,34 +602,53 @@ def main():
                     if not selected_factor_names:
                         st.error("Please select at least one factor")
                     else:
-                        with st.spinner("Running portfolio backtest..."):
-                            try:
-                                # Create factor objects
-                                factor_objects = [FACTOR_MAP[name]() for name in selected_factor_names]
-                                
-                                # Run rebalancing
-                                results = rebalance_portfolio(
-                                    st.session_state.rdata,
-                                    factor_objects,
-                                    start_year=int(start_year),
-                                    end_year=int(end_year),
-                                    initial_aum=initial_aum,
-                                    verbosity=verbosity_level,
-                                    restrict_fossil_fuels=restrict_fossil_fuels,
-                                    use_market_cap_weight=use_market_cap_weight
-                                )
-                                
-                                st.session_state.results = results
-                                st.session_state.selected_factors = selected_factor_names
-                                st.session_state.restrict_ff = restrict_fossil_fuels
-                                st.session_state.initial_aum = initial_aum
-                                st.session_state.use_cap_weight = use_market_cap_weight
-                                
-                                st.success("Analysis complete! Check the Results tab.")
-                            
-                            except Exception as e:
-                                st.error(f"Error running analysis: {str(e)}")
-                                st.exception(e)
+                        # Create factor objects
+                        factor_objects = [FACTOR_MAP[name]() for name in selected_factor_names]
+
+                        # Run rebalancing (vectorized panel engine, same result dict as rebalance_portfolio)
+                        # on a background worker so the session stays responsive; progress is polled below
+                        job_id = JOB_RUNNER.submit(
+                            rebalance_portfolio_panel,
+                            st.session_state.rdata,
+                            factor_objects,
+                            start_year=int(start_year),
+                            end_year=int(end_year),
+                            initial_aum=initial_aum,
+                            verbosity=verbosity_level,
+                            restrict_fossil_fuels=restrict_fossil_fuels,
+                            use_market_cap_weight=use_market_cap_weight,
+                            screens=screens,
+                            profile=show_timings,
+                            description=f"Backtest: {', '.join(selected_factor_names)}"
+                        )
+                        st.session_state.analysis_job = {
+                            'id': job_id,
+                            'selected_factors': selected_factor_names,
+                            'restrict_ff': restrict_fossil_fuels,
+                            'screens': screens,
+                            'initial_aum': initial_aum,
+                            'use_cap_weight': use_market_cap_weight,
+                            'show_timings': show_timings,
+                        }
+
+                job = _poll_job('analysis_job', "Running portfolio backtest")
+                if job is not None:
+                    if job['state'] == 'done':
+                        results = job['result']
+                        if job['show_timings']:
+                            with st.sidebar.expander("Timing breakdown", expanded=True):
+                                st.dataframe(_timing_table(results.pop('timings')), use_container_width=True)
+
+                        st.session_state.results = results
+                        for name in ('selected_factors', 'restrict_ff', 'screens', 'initial_aum', 'use_cap_weight'):
+                            st.session_state[name] = job[name]
+
+                        st.success("Analysis complete! Check the Results tab.")
+                    elif job['state'] == 'cancelled':
+                        st.warning("Analysis cancelled.")
+                    else:
+                        st.error(f"Error running analysis: {str(job['error'])}")
+                        st.exception(job['error'])
     
     with tab2:
         st.header("Portfolio Performance Results")
@@ -619,14 +749,49 @@ def main():
                     show_bottom_cohort = st.checkbox("Show Bottom Cohort", value=True, help="Display the bottom-performing cohort")
                 
                 if st.button("Generate Top/Bottom Analysis", key="top_bottom_btn"):
+                    # One rebalance pass shared by the diagnostics, metrics and figure below, run in the
+                    # background (years from results: re-run the analysis after changing the period)
+                    analysis_years = results['years']
+                    # Years are charted as they complete (the panel run above is one vectorized pass, so it has none)
+                    updates = []
+                    st.session_state.cohort_job = {
+                        'id': JOB_RUNNER.submit(
+                            rebalance_cohorts,
+                            st.session_state.rdata,
+                            [FACTOR_MAP[name]() for name in st.session_state.selected_factors],
+                            start_year=analysis_years[0],
+                            end_year=analysis_years[-1],
+                            initial_aum=st.session_state.initial_aum,
+                            verbosity=0,
+                            restrict_fossil_fuels=st.session_state.restrict_ff,
+                            top_pct=cohort_pct,
+                            cohorts=['top', 'bottom'] if show_bottom_cohort else ['top'],
+                            screens=st.session_state.get('screens'),
+                            on_year=updates.append,
+                            description=f"Top/bottom {cohort_pct}% cohorts"
+                        ),
+                        'updates': updates,
+                        'cohort_pct': cohort_pct,
+                        'show_bottom': show_bottom_cohort,
+                    }
+
+                cohort_job = _poll_job('cohort_job', "Running cohort backtest")
+                if cohort_job is not None and cohort_job['state'] == 'cancelled':
+                    st.warning("Cohort analysis cancelled.")
+                elif cohort_job is not None:
+                    cohort_pct = cohort_job['cohort_pct']
+                    show_bottom_cohort = cohort_job['show_bottom']
                     with st.spinner("Generating cohort analysis..."):
                         try:
                             # Get factor objects (instantiate classes)
                             factor_objects = [FACTOR_MAP[name]() for name in st.session_state.selected_factors]
-
-                            # Get years from results (ensure user re-runs analysis after changing the period)
                             analysis_years = results['years']
 
+                            # A failed rebalance leaves the cohorts to plot_top_bottom_percent
+                            cohort_results = cohort_job['result'] or {}
+                            res_top = cohort_results.get('top')
+                            res_bot = cohort_results.get('bottom')
+
                             # First pass: get diagnostics to understand selection and dropped tickers
                             details = plot_top_bottom_percent(
                                 rdata=st.session_state.rdata,
@@ -641,7 +806,9 @@ def main():
                                 verbose=False,
                                 baseline_portfolio_values=results['portfolio_values'],
                                 use_rebalance_for_selection=True,
-                                return_details=True
+                                return_details=True,
+                                cohort_results=cohort_results,
+                                screens=st.session_state.get('screens')
                             )
 
                             # Instead of showing raw diagnostics JSON, present concise metrics:
@@ -657,79 +824,21 @@ def main():
                                 bot_start = bot.get('start') if bot else None
                                 bot_end = bot.get('end') if bot else None
                             else:
-                                # Fallback: call rebalance_portfolio directly to compute top/bottom series
-                                try:
-                                    res_top = rebalance_portfolio(
-                                        st.session_state.rdata,
-                                        factor_objects,
-                                        start_year=analysis_years[0],
-                                        end_year=analysis_years[-1],
-                                        initial_aum=st.session_state.initial_aum,
-                                        verbosity=0,
-                                        restrict_fossil_fuels=st.session_state.restrict_ff,
-                                        top_pct=cohort_pct,
-                                        which='top'
-                                    )
-                                    res_bot = rebalance_portfolio(
-                                        st.session_state.rdata,
-                                        factor_objects,
-                                        start_year=analysis_years[0],
-                                        end_year=analysis_years[-1],
-                                        initial_aum=st.session_state.initial_aum,
-                                        verbosity=0,
-                                        restrict_fossil_fuels=st.session_state.restrict_ff,
-                                        top_pct=cohort_pct,
-                                        which='bottom'
-                                    ) if show_bottom_cohort else None
-                                    if isinstance(res_top, dict) and 'portfolio_values' in res_top:
-                                        tv = list(res_top.get('portfolio_values', []))
-                                        if len(tv) >= 2:
-                                            top_start = tv[-2]
-                                            top_end = tv[-1]
-                                        elif len(tv) == 1:
-                                            top_start = top_end = tv[0]
-                                    if res_bot and isinstance(res_bot, dict) and 'portfolio_values' in res_bot:
-                                        bv = list(res_bot.get('portfolio_values', []))
-                                        if len(bv) >= 2:
-                                            bot_start = bv[-2]
-                                            bot_end = bv[-1]
-                                        elif len(bv) == 1:
-                                            bot_start = bot_end = bv[0]
-                                except Exception:
-                                    pass
-
-                            # Display overall growth metrics (start -> finish) for Top/Bottom using rebalance results
-                            try:
-                                # Compute top/bottom rebalance series to get full portfolio values
-                                res_top = rebalance_portfolio(
-                                    st.session_state.rdata,
-                                    factor_objects,
-                                    start_year=analysis_years[0],
-                                    end_year=analysis_years[-1],
-                                    initial_aum=st.session_state.initial_aum,
-                                    verbosity=0,
-                                    restrict_fossil_fuels=st.session_state.restrict_ff,
-                                    top_pct=cohort_pct,
-                                    which='top'
-                                )
-                            except Exception:
-                                res_top = None
-                            try:
-                                res_bot = None
-                                if show_bottom_cohort:
-                                    res_bot = rebalance_portfolio(
-                                        st.session_state.rdata,
-                                        factor_objects,
-                                        start_year=analysis_years[0],
-                                        end_year=analysis_years[-1],
-                                        initial_aum=st.session_state.initial_aum,
-                                        verbosity=0,
-                                        restrict_fossil_fuels=st.session_state.restrict_ff,
-                                        top_pct=cohort_pct,
-                                        which='bottom'
-                                    )
-                            except Exception:
-                                res_bot = None
+                                # Fallback: read the top/bottom series from the rebalance results
+                                if isinstance(res_top, dict) and 'portfolio_values' in res_top:
+                                    tv = list(res_top.get('portfolio_values', []))
+                                    if len(tv) >= 2:
+                                        top_start = tv[-2]
+                                        top_end = tv[-1]
+                                    elif len(tv) == 1:
+                                        top_start = top_end = tv[0]
+                                if res_bot and isinstance(res_bot, dict) and 'portfolio_values' in res_bot:
+                                    bv = list(res_bot.get('portfolio_values', []))
+                                    if len(bv) >= 2:
+                                        bot_start = bv[-2]
+                                        bot_end = bv[-1]
+                                    elif len(bv) == 1:
+                                        bot_start = bot_end = bv[0]
 
                             # helper to compute metrics from rebalance result
                             def cohort_metrics(res):
@@ -795,7 +904,9 @@ def main():
                                 verbose=False,
                                 baseline_portfolio_values=results['portfolio_values'],
                                 use_rebalance_for_selection=True,
-                                return_details=False
+                                return_details=False,
+                                cohort_results=cohort_results,
+                                screens=st.session_state.get('screens')
                             )
 
                             if fig_cohort is not None:
@@ -1014,5 +1125,10 @@ def main():
         **Last Updated:** November 2025
         """)
 
+    # Rerun shortly to refresh progress while background jobs are running
+    if st.session_state.polling_jobs:
+        time.sleep(JOB_POLL_SECONDS)
+        st.rerun()
+
 if __name__ == "__main__":
     main()
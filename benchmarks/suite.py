@@ -0,0 +1,272 @@
+"""
+Offline benchmark suite on synthetic panels.
+
+    python -m benchmarks.suite --tickers 2000 10000 50000 --years 20 40 --output bench.json
+    python -m benchmarks.suite --compare base.json --output head.json
+
+Every benchmark runs `--repeat` times per panel size against cold caches
+(fresh frame copy, normalization cache, backtest checkpoints and memoized
+results cleared in untimed setup; the `_rerun` case times an identical second
+run). Results (min / median / mean seconds per benchmark and size,
+plus commit and library versions) are written to JSON; `--compare` prints the
+ratio against an earlier run so commits can be compared without Supabase.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from src.calculate_holdings import BACKTEST_CHECKPOINTS, calculate_holdings, rebalance_portfolio
+from src.factor_function import Momentum6m, ROE, P2B
+from src.factor_utils import NORMALIZATION_CACHE
+from src.market_object import MarketObject, MarketUniverse, load_data
+from src.panel_engine import rebalance_portfolio_panel
+from src.result_cache import RESULT_CACHE
+
+from .synthetic import synthetic_panel
+
+BACKTEST_FACTORS = (Momentum6m, ROE, P2B)
+
+
+class Benchmark:
+    """
+    One timed case. `setup(ctx)` (untimed) returns the argument passed to
+    `run`; `params` labels variants of the same benchmark in the output.
+    """
+
+    def __init__(self, name, run, setup=None, params=None):
+        self.name = name
+        self.run = run
+        self.setup = setup or (lambda ctx: ctx)
+        self.params = params or {}
+
+
+def _cold(ctx):
+    """Fresh copy of the panel with process-wide caches cleared, so every repeat pays full cost."""
+    NORMALIZATION_CACHE.clear()
+    BACKTEST_CHECKPOINTS.clear()
+    RESULT_CACHE.clear()
+    return dict(ctx, data=ctx['data'].copy())
+
+
+def _year_frame(ctx):
+    year = ctx['years'][len(ctx['years']) // 2]
+    return dict(ctx, year=year, year_frame=ctx['data'][ctx['data']['Year'] == year])
+
+
+def _year_market(ctx):
+    ctx = _year_frame(ctx)
+    return dict(ctx, market=MarketObject(ctx['year_frame'], ctx['year'], verbosity=0))
+
+
+def _load_file(path):
+    return lambda ctx: load_data(use_supabase=False, data_path=ctx[path], show_loading_progress=False)
+
+
+def _backtest(engine, **kwargs):
+    def run(ctx):
+        factors = [cls() for cls in BACKTEST_FACTORS]
+        return engine(ctx['data'], factors, ctx['years'][0], ctx['years'][-1], 1000.0, verbosity=0, **kwargs)
+    return run
+
+
+def _warm(run):
+    """Setup running `run` once on a cold context, so the timed call is an identical rerun."""
+    def setup(ctx):
+        ctx = _cold(ctx)
+        run(ctx)
+        return ctx
+    return setup
+
+
+def _top_bottom_prep(ctx):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from Visualizations.top_bottom_portfolio_plot import plot_top_bottom_percent
+
+    details = plot_top_bottom_percent(ctx['data'], [cls() for cls in BACKTEST_FACTORS], ctx['years'], percent=10,
+                                      initial_investment=1000.0, verbose=False, return_details=True)
+    plt.close('all')
+    return details
+
+
+def default_benchmarks():
+    """The standard suite: loading, market construction, holdings, backtests (cold and memoized rerun) and plot data prep."""
+    benchmarks = [
+        Benchmark('load_data', _load_file('csv_path'), params={'format': 'csv'}),
+        Benchmark('load_data', _load_file('parquet_path'), params={'format': 'parquet'}),
+        Benchmark('market_object', lambda ctx: MarketObject(ctx['year_frame'], ctx['year'], verbosity=0),
+                  setup=_year_frame),
+        Benchmark('market_universe', lambda ctx: MarketUniverse(ctx['data'], verbosity=0), setup=_cold),
+    ]
+    for cap in (False, True):
+        for fossil in (False, True):
+            params = {'weighting': 'cap' if cap else 'equal', 'fossil_screen': fossil}
+            benchmarks.append(Benchmark(
+                'calculate_holdings',
+                lambda ctx, cap=cap, fossil=fossil: calculate_holdings(
+                    Momentum6m(), 1000.0, ctx['market'], restrict_fossil_fuels=fossil, use_market_cap_weight=cap),
+                setup=_year_market, params=params
+            ))
+            benchmarks.append(Benchmark(
+                'rebalance_portfolio',
+                _backtest(rebalance_portfolio, restrict_fossil_fuels=fossil, use_market_cap_weight=cap),
+                setup=_cold, params=params
+            ))
+            benchmarks.append(Benchmark(
+                'rebalance_portfolio_panel',
+                _backtest(rebalance_portfolio_panel, restrict_fossil_fuels=fossil, use_market_cap_weight=cap),
+                setup=_cold, params=params
+            ))
+    rerun = _backtest(rebalance_portfolio_panel)
+    benchmarks.append(Benchmark('rebalance_portfolio_panel_rerun', rerun, setup=_warm(rerun)))
+    benchmarks.append(Benchmark('plot_top_bottom_prep', _top_bottom_prep, setup=_cold))
+    return benchmarks
+
+
+def _time(benchmark, ctx, repeat):
+    times = []
+    for _ in range(repeat):
+        arg = benchmark.setup(ctx)
+        start = time.perf_counter()
+        benchmark.run(arg)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def run_suite(tickers=(2000,), years=(22,), repeat=3, benchmarks=None, only=None, seed=0, show_progress=True):
+    """
+    Time `benchmarks` (default: `default_benchmarks()`) on a synthetic panel of every tickers x years size.
+
+    Args:
+        only: benchmark names to run (default: all)
+
+    Returns:
+        list of result dicts (benchmark, params, tickers, years, rows, times, min, median, mean)
+    """
+    benchmarks = [b for b in (benchmarks or default_benchmarks()) if not only or b.name in only]
+    results = []
+    for n_tickers in tickers:
+        for n_years in years:
+            data = synthetic_panel(n_tickers, n_years, seed=seed)
+            with tempfile.TemporaryDirectory(prefix='factor_lake_bench_') as tmp:
+                ctx = {
+                    'data': data,
+                    'years': sorted(int(y) for y in data['Year'].unique()),
+                    'csv_path': os.path.join(tmp, 'panel.csv'),
+                    'parquet_path': os.path.join(tmp, 'panel.parquet'),
+                }
+                if any(b.name == 'load_data' for b in benchmarks):
+                    data.to_csv(ctx['csv_path'], index=False)
+                    data.to_parquet(ctx['parquet_path'], index=False)
+                for benchmark in benchmarks:
+                    # The pipeline prints progress; keep the report readable
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        times = _time(benchmark, ctx, repeat)
+                    results.append({
+                        'benchmark': benchmark.name,
+                        'params': benchmark.params,
+                        'tickers': n_tickers,
+                        'years': n_years,
+                        'rows': len(data),
+                        'times': times,
+                        'min': min(times),
+                        'median': statistics.median(times),
+                        'mean': statistics.fmean(times),
+                    })
+                    if show_progress:
+                        print(f"{_label(results[-1]):<70} {results[-1]['median'] * 1000:10.1f} ms")
+    return results
+
+
+def _label(result):
+    params = ', '.join(f"{k}={v}" for k, v in result['params'].items())
+    name = f"{result['benchmark']}[{params}]" if params else result['benchmark']
+    return f"{name} {result['tickers']}x{result['years']}"
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def write_results(results, path, repeat):
+    """Write results plus run metadata (commit, versions, machine) to a JSON file."""
+    document = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'commit': _commit(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'machine': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+    with open(path, 'w', encoding='utf-8') as fh:
+        json.dump(document, fh, indent=2)
+    return document
+
+
+def compare(base, head):
+    """
+    Median-time ratios head / base for cases present in both result documents.
+
+    Returns:
+        pandas.DataFrame: case, base_ms, head_ms, ratio (sorted slowest regression first)
+    """
+    def medians(document):
+        return {_label(r): r['median'] for r in document['results']}
+
+    base_times, head_times = medians(base), medians(head)
+    rows = [
+        {'case': case, 'base_ms': base_times[case] * 1000, 'head_ms': head_times[case] * 1000,
+         'ratio': head_times[case] / base_times[case] if base_times[case] else np.nan}
+        for case in head_times if case in base_times
+    ]
+    return pd.DataFrame(rows, columns=['case', 'base_ms', 'head_ms', 'ratio']).sort_values('ratio', ascending=False,
+                                                                                            ignore_index=True)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Factor-Lake benchmark suite on synthetic panels.")
+    parser.add_argument('--tickers', type=int, nargs='+', default=[2000], help="Tickers per panel (e.g. 2000 10000 50000)")
+    parser.add_argument('--years', type=int, nargs='+', default=[22], help="Years per panel (e.g. 20 40)")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed repetitions per benchmark")
+    parser.add_argument('--only', nargs='+', default=None, help="Benchmark names to run (default: all)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark_results.json', help="JSON output path")
+    parser.add_argument('--compare', default=None, help="Earlier JSON output to compare against")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run_suite(args.tickers, args.years, repeat=args.repeat, only=args.only, seed=args.seed)
+    document = write_results(results, args.output, args.repeat)
+    print(f"Wrote {len(results)} results to {args.output}")
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as fh:
+            base = json.load(fh)
+        print(compare(base, document).to_string(index=False, float_format=lambda v: f"{v:.2f}"))
+    return document
+
+
+if __name__ == "__main__":
+    main()
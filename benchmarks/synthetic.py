@@ -0,0 +1,64 @@
+"""
+Deterministic synthetic market panels for benchmarks.
+
+`synthetic_panel(n_tickers, n_years)` returns a frame shaped like a
+standardized Supabase load (one row per ticker-year, every FACTOR_DOCS
+column, industry / sector / volume columns for the screens) so every
+pipeline stage can be timed offline at Russell-2000 scale and beyond.
+The same arguments always produce the same frame.
+"""
+import numpy as np
+import pandas as pd
+
+from src.factors_doc import FACTOR_DOCS
+
+INDUSTRIES = ['Packaged Software', 'Regional Banks', 'Biotechnology', 'Oil & Gas Production', 'Coal',
+              'Electric Utilities', 'Semiconductors', 'Real Estate Investment Trusts', 'Specialty Stores',
+              'Industrial Machinery']
+SECTORS = ['Consumer', 'Technology', 'Financials', 'Industrials', 'Healthcare']
+
+
+def synthetic_panel(n_tickers, n_years, start_year=2002, seed=0, missing_rate=0.03):
+    """
+    Synthetic ticker x year panel.
+
+    Args:
+        n_tickers (int): tickers per year (before random drop-outs)
+        n_years (int): consecutive years starting at `start_year`
+        seed (int): random seed
+        missing_rate (float): share of ticker-years removed (listings / delistings) and of factor values set to NaN
+
+    Returns:
+        pandas.DataFrame: ID, Ticker-Region, Ticker, Date, Year, Ending Price, Market Capitalization,
+        FactSet Industry, Scott's Sector (5), Avg Daily 3-Mo Volume Mills $ and every FACTOR_DOCS column
+    """
+    rng = np.random.default_rng(seed)
+    n_rows = n_tickers * n_years
+    ticker_idx = np.tile(np.arange(n_tickers), n_years)
+    years = np.repeat(np.arange(start_year, start_year + n_years), n_tickers)
+
+    # Prices follow a per-ticker log random walk; market cap scales with price
+    log_returns = rng.normal(0.05, 0.35, size=(n_years, n_tickers))
+    prices = np.exp(np.log(rng.uniform(2, 200, n_tickers)) + np.cumsum(log_returns, axis=0)).ravel()
+    shares = rng.lognormal(3.5, 1.0, n_tickers)[ticker_idx]
+
+    tickers = np.array([f'T{i:05d}' for i in range(n_tickers)], dtype=object)
+    frame = pd.DataFrame({
+        'ID': np.arange(n_rows),
+        'Ticker-Region': tickers[ticker_idx] + '-US',
+        'Ticker': tickers[ticker_idx],
+        'Date': pd.to_datetime([f'{y}-09-30' for y in range(start_year, start_year + n_years)])[years - start_year],
+        'Year': years,
+        'Ending Price': prices,
+        'Market Capitalization': prices * shares,
+        'FactSet Industry': np.array(INDUSTRIES, dtype=object)[rng.integers(len(INDUSTRIES), size=n_tickers)][ticker_idx],
+        "Scott's Sector (5)": np.array(SECTORS, dtype=object)[rng.integers(len(SECTORS), size=n_tickers)][ticker_idx],
+        'Avg Daily 3-Mo Volume Mills $': rng.lognormal(0.0, 1.5, n_rows),
+    })
+    for col in FACTOR_DOCS:
+        values = rng.normal(0.0, 1.0, n_rows)
+        values[rng.random(n_rows) < missing_rate] = np.nan
+        frame[col] = values
+
+    keep = rng.random(n_rows) >= missing_rate
+    return frame.loc[keep].reset_index(drop=True)
@@ -3,19 +3,29 @@
 Exports primary modules for external use. After refactor, import as:
 
     from src.calculate_holdings import rebalance_portfolio
-    from src.market_object import MarketObject, load_data
+    from src.market_object import MarketObject, MarketUniverse, load_data
+    from src.panel_engine import rebalance_portfolio_panel
 
 """
 
 from . import calculate_holdings  # noqa: F401
+from . import data_cache          # noqa: F401
+from . import dataset_registry    # noqa: F401
+from . import diagnostics         # noqa: F401
 from . import market_object       # noqa: F401
 from . import factor_function     # noqa: F401
 from . import factors_doc         # noqa: F401
 from . import factor_utils        # noqa: F401
 from . import fossil_fuel_restriction  # noqa: F401
+from . import jobs                # noqa: F401
+from . import panel_engine        # noqa: F401
 from . import portfolio           # noqa: F401
+from . import profiling           # noqa: F401
+from . import result_cache        # noqa: F401
+from . import screens             # noqa: F401
 from . import sector_selection    # noqa: F401
 from . import supabase_client     # noqa: F401
 from . import supabase_input      # noqa: F401
+from . import sweep               # noqa: F401
 from . import user_input          # noqa: F401
 from . import verbosity_options   # noqa: F401
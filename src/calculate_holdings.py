@@ -1,140 +1,167 @@
-from .market_object import MarketObject
+from .market_object import MarketObject, MarketUniverse, _numeric, dataset_fingerprint
 from .portfolio import Portfolio
+import math
+import threading
+from collections import OrderedDict
 import numpy as np
 import pandas as pd
 from .factors_doc import FACTOR_DOCS
-from .factor_utils import normalize_series
+from .factor_utils import normalize_series, select_ranked, quantile_buckets
+from .result_cache import RESULT_CACHE
+from .jobs import report_progress
+from .screens import canonical_screens
+from . import profiling
+from .profiling import timed
+from . import diagnostics
+from .diagnostics import DEBUG, WARNING, count, enabled, event
 
-def calculate_holdings(factor, aum, market, restrict_fossil_fuels=False, top_pct=10, which='top', use_market_cap_weight=False):
-    # Apply sector restrictions if enabled
-    if restrict_fossil_fuels:
-        industry_col = 'FactSet Industry'
-        if industry_col in market.stocks.columns:
-            fossil_keywords = ['oil', 'gas', 'coal', 'energy', 'fossil']
-            series = market.stocks[industry_col].astype(str).str.lower()
-            mask = series.apply(
-                lambda x: not any(kw in x for kw in fossil_keywords) if pd.notna(x) else True)
-            # Report which tickers are being removed in this step
-            try:
-                removed_tickers = list(market.stocks.loc[~mask].index)
-                if removed_tickers:
-                    print(f"Fossil filter (holdings) removed {len(removed_tickers)} tickers: {', '.join(removed_tickers[:25])}{' ...' if len(removed_tickers) > 25 else ''}")
-            except Exception:
-                pass
-            market.stocks = market.stocks[mask].copy()
-
-    # Get eligible stocks for factor calculation
+@timed('score')
+def _factor_scores(factor, market):
+    """
+    (tickers, scores) for one factor: normalized so higher == better, NaNs dropped,
+    one entry per ticker in first-appearance order. A duplicated ticker keeps its
+    last score (the former dict-based behavior).
+
+    Markets handed out by a MarketUniverse index the universe's precomputed
+    all-years z-scores (`MarketUniverse.normalized_scores`), so reruns that only
+    change AUM, weighting or top_pct never re-normalize.
+    """
     # Prefer vectorized series from market.stocks when available so we can normalize
     factor_col = getattr(factor, 'column_name', str(factor))
-    factor_values = {}
+
+    if market.universe is not None:
+        columns, matrix = market.universe.normalized_scores(market.fossil_free, market.screens)
+        if factor_col in columns:
+            normed = pd.Series(matrix[market.rows, columns.index(factor_col)], index=market.stocks.index)
+            return _unique_scores(normed.dropna())
 
     if factor_col in market.stocks.columns:
-        raw_series = pd.to_numeric(market.stocks[factor_col], errors='coerce')
+        raw_series = _numeric(market.stocks[factor_col])
         # Determine direction from FACTOR_DOCS if available
         meta = FACTOR_DOCS.get(factor_col, {})
         higher_is_better = meta.get('higher_is_better', True)
         # Normalize series (winsorize + zscore) and invert if needed so higher == better
-        normed = normalize_series(raw_series, higher_is_better=higher_is_better)
-        factor_values = normed.dropna().to_dict()
-    else:
-        # Fallback to original per-ticker get() when column not present
-        factor_values = {
-            ticker: factor.get(ticker, market)
-            for ticker in market.stocks.index
-            if isinstance(factor.get(ticker, market), (int, float))
-        }
-    
-    # ...existing code...
-    
-    if len(factor_values) == 0:
+        normed = normalize_series(raw_series, higher_is_better=higher_is_better).dropna()
+        return _unique_scores(normed)
+
+    # Fallback to original per-ticker get() when column not present
+    factor_values = {}
+    for ticker in market.stocks.index:
+        value = factor.get(ticker, market)
+        if isinstance(value, (int, float)) and not pd.isna(value):
+            factor_values[ticker] = value
+    return np.array(list(factor_values), dtype=object), np.array(list(factor_values.values()), dtype=float)
+
+
+def _unique_scores(normed):
+    # dict(normed) semantics: a duplicated ticker keeps its last score at its first position
+    if normed.index.has_duplicates:
+        last = normed[~normed.index.duplicated(keep='last')]
+        normed = last.reindex(normed.index[~normed.index.duplicated(keep='first')])
+    return np.asarray(normed.index, dtype=object), normed.to_numpy(dtype=float)
+
+
+def _n_select(n_scored, top_pct):
+    # Select the top or bottom `top_pct`% of securities (default 10%), at least one
+    return max(1, math.floor(n_scored * (top_pct / 100.0))) if n_scored else 0
+
+
+@timed('holdings')
+def calculate_holdings(factor, aum, market, restrict_fossil_fuels=False, top_pct=10, which='top', use_market_cap_weight=False):
+    # Apply sector restrictions if enabled (on a new view; the caller's market is not modified)
+    if restrict_fossil_fuels:
+        market = market.without_fossil_fuels()
+
+    tickers, scores = _factor_scores(factor, market)
+    if len(scores) == 0:
         # Return empty portfolio instead of crashing
         return Portfolio(name=f"Portfolio_{market.t}")
-    
-    sorted_securities = sorted(factor_values.items(), key=lambda x: x[1], reverse=True)
 
-    # Select the top or bottom `top_pct`% of securities (default 10%)
-    import math
-    n_select = max(1, math.floor(len(sorted_securities) * (top_pct / 100.0))) if sorted_securities else 0
-    if n_select == 0:
-        selected = []
-    else:
-        if which == 'top':
-            selected = sorted_securities[:n_select]
-        else:
-            # bottom: take the weakest n_select securities
-            selected = sorted_securities[-n_select:]
+    # 'top' takes the strongest n_select securities, anything else the weakest
+    idx = select_ranked(scores, _n_select(len(scores), top_pct), which='top' if which == 'top' else 'bottom')
+    return _build_portfolio(tickers[idx].tolist(), aum, market, use_market_cap_weight)
+
+
+@timed('holdings')
+def calculate_cohort_holdings(factor, aum, market, restrict_fossil_fuels=False, top_pct=10, use_market_cap_weight=False):
+    """
+    Top and bottom `top_pct`% portfolios for one factor from a single scoring and
+    selection pass. Same as calling calculate_holdings with which='top' and 'bottom'.
+
+    Returns:
+        (Portfolio, Portfolio): top and bottom cohorts, each investing `aum`
+    """
+    if restrict_fossil_fuels:
+        market = market.without_fossil_fuels()
 
+    tickers, scores = _factor_scores(factor, market)
+    if len(scores) == 0:
+        return Portfolio(name=f"Portfolio_{market.t}"), Portfolio(name=f"Portfolio_{market.t}")
+
+    top_idx, bottom_idx = select_ranked(scores, _n_select(len(scores), top_pct), which='both')
+    return (_build_portfolio(tickers[top_idx].tolist(), aum, market, use_market_cap_weight),
+            _build_portfolio(tickers[bottom_idx].tolist(), aum, market, use_market_cap_weight))
+
+
+@timed('price')
+def _build_portfolio(selected_tickers, aum, market, use_market_cap_weight=False):
+    """Invest `aum` in `selected_tickers` (equal or market-cap weighted) at `market` prices."""
     # Calculate number of shares for each selected security
     portfolio_new = Portfolio(name=f"Portfolio_{market.t}")
+
+    # One batch lookup for all selected tickers (NaN = missing or invalid price)
+    entry_prices = market.get_prices(selected_tickers)
+    priced = [(t, float(p)) for t, p in zip(selected_tickers, entry_prices) if p > 0]
     
     if use_market_cap_weight:
         # Market capitalization-based weighting (similar to Russell 2000)
         # Collect market cap and price for each selected ticker, then allocate
-        market_caps = {}
-        prices = {}
-        for ticker, _ in selected:
-            # Try to get market cap from the data
-            if 'Market Capitalization' in market.stocks.columns:
-                try:
-                    market_cap = market.stocks.loc[ticker, 'Market Capitalization']
-                    if isinstance(market_cap, (pd.Series, np.ndarray)):
-                        market_cap = market_cap.iloc[0] if len(market_cap) > 0 else None
-                    if pd.notna(market_cap) and market_cap > 0:
-                        market_caps[ticker] = float(market_cap)
-                except (KeyError, IndexError):
-                    pass
-            # also capture entry price availability
-            price = market.get_price(ticker)
-            if price is not None and price > 0:
-                prices[ticker] = price
+        caps = market.get_market_caps(selected_tickers)
+        market_caps = {t: float(c) for t, c in zip(selected_tickers, caps) if c > 0}
+        prices = dict(priced)
 
         # If we have market caps and at least one valid price, use them for weighting
         valid_caps = {t: c for t, c in market_caps.items() if t in prices}
         if valid_caps:
             total_market_cap = sum(valid_caps.values())
+            cap_tickers, cap_shares = [], []
             for ticker, cap in valid_caps.items():
                 # Weight by market cap: (ticker_market_cap / total_market_cap) * AUM
                 weight = cap / total_market_cap if total_market_cap > 0 else 0
                 dollar_investment = weight * aum
-                price = prices.get(ticker)
-                if price is not None and price > 0 and dollar_investment > 0:
-                    shares = dollar_investment / price
-                    portfolio_new.add_investment(ticker, shares)
+                if dollar_investment > 0:
+                    cap_tickers.append(ticker)
+                    cap_shares.append(dollar_investment / prices[ticker])
+            portfolio_new.add_investments(cap_tickers, cap_shares)
             # If for some reason no shares were added (e.g., rounding), fallback to equal among priced tickers
-            if not portfolio_new.investments and prices:
-                valid_tickers = list(prices.keys())
-                equal_investment = aum / len(valid_tickers)
-                for t in valid_tickers:
-                    shares = equal_investment / prices[t]
-                    portfolio_new.add_investment(t, shares)
+            if not len(portfolio_new) and prices:
+                _add_equal_weight(portfolio_new, priced, aum)
         else:
             # Fallback to equal weighting among tickers that have valid prices
-            valid_tickers = [t for t, _ in selected if market.get_price(t) is not None and market.get_price(t) > 0]
-            if not valid_tickers:
-                print(f"Warning: No valid priced tickers for year {market.t}; returning empty portfolio.")
+            if not priced:
+                count('empty_portfolio')
+                event(WARNING, 'empty_portfolio', "Warning: No valid priced tickers for year %s; returning empty portfolio.", market.t)
             else:
-                equal_investment = aum / len(valid_tickers)
-                for ticker in valid_tickers:
-                    price = market.get_price(ticker)
-                    if price is not None and price > 0:
-                        shares = equal_investment / price
-                        portfolio_new.add_investment(ticker, shares)
+                _add_equal_weight(portfolio_new, priced, aum)
     else:
         # Equal dollar weighting (allocate only to tickers with valid entry prices)
-        valid_tickers = [t for t, _ in selected if market.get_price(t) is not None and market.get_price(t) > 0]
-        if not valid_tickers and selected:
+        if not priced and selected_tickers:
             # nothing priced; warn and return empty portfolio
-            print(f"Warning: No valid priced tickers for equal-weighting in year {market.t}; returning empty portfolio.")
-        else:
-            equal_investment = aum / len(valid_tickers) if valid_tickers else 0
-            for ticker in valid_tickers:
-                price = market.get_price(ticker)
-                if price is not None and price > 0:
-                    shares = equal_investment / price
-                    portfolio_new.add_investment(ticker, shares)
+            count('empty_portfolio')
+            event(WARNING, 'empty_portfolio', "Warning: No valid priced tickers for equal-weighting in year %s; returning empty portfolio.", market.t)
+        elif priced:
+            _add_equal_weight(portfolio_new, priced, aum)
 
     return portfolio_new
 
+def _add_equal_weight(portfolio, priced, aum):
+    """Invest `aum` equally across `priced` [(ticker, entry_price), ...] in one bulk add."""
+    tickers = [t for t, _ in priced]
+    prices = np.array([p for _, p in priced], dtype=float)
+    portfolio.add_investments(tickers, (aum / len(priced)) / prices)
+
+
+@timed('growth')
 def calculate_growth(portfolio, next_market, current_market, verbosity=0):
     # Calculate start value using the current market
     total_start_value = 0
@@ -144,33 +171,211 @@ def calculate_growth(portfolio, next_market, current_market, verbosity=0):
     # Calculate end value using next market, handling missing stocks
     total_end_value = 0
     for factor_portfolio in portfolio:
-        for inv in factor_portfolio.investments:
-            ticker = inv["ticker"]
-            end_price = next_market.get_price(ticker)
-            if end_price is not None:
-                total_end_value += inv["number_of_shares"] * end_price
-            else:
-                entry_price = current_market.get_price(ticker)
-                if entry_price is not None:
-                    total_end_value += inv["number_of_shares"] * entry_price
-                    if verbosity == 3:
-                        print(f"{ticker} - Missing in {next_market.t}, liquidating at entry price: {entry_price}")
+        if not len(factor_portfolio):
+            continue
+        tickers = factor_portfolio.tickers
+        end_prices = next_market.get_prices(tickers)
+        missing = np.isnan(end_prices)
+        if missing.any():
+            # Liquidate at the entry price when the ticker is gone next year
+            entry_prices = current_market.get_prices(tickers)
+            end_prices = np.where(missing, entry_prices, end_prices)
+            liquidated = missing & ~np.isnan(entry_prices)
+            count('exit_missing', int(np.count_nonzero(liquidated)))
+            if verbosity == 3 and enabled(DEBUG):
+                for i in np.flatnonzero(liquidated):
+                    event(DEBUG, 'exit_missing', "%s - Missing in %s, liquidating at entry price: %s",
+                          tickers[i], next_market.t, entry_prices[i])
+        total_end_value += float(factor_portfolio.shares @ np.nan_to_num(end_prices, nan=0.0))
 
     # Calculate growth
     growth = (total_end_value - total_start_value) / total_start_value if total_start_value else 0
     return growth, total_start_value, total_end_value
 
 
-def rebalance_portfolio(data, factors, start_year, end_year, initial_aum, verbosity=0, restrict_fossil_fuels=False, top_pct=10, which='top', use_market_cap_weight=False):
-    aum = initial_aum
+def rebalance_portfolio(data, factors, start_year, end_year, initial_aum, verbosity=0, restrict_fossil_fuels=False, top_pct=10, which='top', use_market_cap_weight=False, screens=None, profile=False, on_year=None):
+    cohort = 'top' if which == 'top' else 'bottom'
+    return rebalance_cohorts(
+        data, factors, start_year, end_year, initial_aum,
+        verbosity=verbosity,
+        restrict_fossil_fuels=restrict_fossil_fuels,
+        top_pct=top_pct,
+        cohorts=[cohort],
+        use_market_cap_weight=use_market_cap_weight,
+        screens=screens,
+        profile=profile,
+        on_year=on_year
+    )[cohort]
+
+
+class CheckpointStore:
+    """
+    Bounded, thread-safe LRU of per-year backtest records.
+
+    Keys come from `checkpoint_key` (everything but `end_year`); values are
+    tuples of (year, growth, start_value, end_value, holdings) records. A save
+    only replaces a shorter path, so the longest run seen for a key is kept.
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, key, n_years):
+        """The first `n_years` records stored for `key` (empty list if none)."""
+        with self._lock:
+            records = self._entries.get(key)
+            if records is None:
+                self.misses += 1
+                return []
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return list(records[:max(0, n_years)])
+
+    def save(self, key, records):
+        """Store `records` for `key` unless a path at least as long is already stored."""
+        with self._lock:
+            if len(records) <= len(self._entries.get(key, ())):
+                return
+            self._entries[key] = tuple(records)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def info(self):
+        """Hit/miss counters and current size."""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries), 'maxsize': self.maxsize}
+
+
+# Per-year backtest records keyed by everything but end_year (see `checkpoint_key`)
+BACKTEST_CHECKPOINTS = CheckpointStore()
+
+
+def checkpoint_key(engine, data_fingerprint, factors, start_year, initial_aum, restrict_fossil_fuels, screens,
+                   which, top_pct, use_market_cap_weight):
+    """
+    BACKTEST_CHECKPOINTS key for one backtest path. The yearly rebalance only
+    carries AUM from one year to the next, so runs that differ only in
+    `end_year` share a key and a longer run extends a shorter one.
+    """
+    return (
+        engine, data_fingerprint, tuple(getattr(f, 'column_name', str(f)) for f in factors), int(start_year),
+        float(initial_aum), bool(restrict_fossil_fuels), tuple(s.key for s in canonical_screens(screens)),
+        which, float(top_pct), bool(use_market_cap_weight)
+    )
+
+
+def load_checkpoint(key, n_years):
+    """Cached (year, growth, start_value, end_value, holdings) records for `key`, at most the first `n_years`."""
+    return BACKTEST_CHECKPOINTS.load(key, n_years)
+
+
+def save_checkpoint(key, records):
+    """Store `records` for `key` unless a checkpoint at least as long is already cached."""
+    BACKTEST_CHECKPOINTS.save(key, records)
+
+
+def stop_on_drawdown(max_drawdown):
+    """
+    `on_year` callback stopping a backtest once a cohort's value falls
+    `max_drawdown` (e.g. 0.3 for 30%) below its running peak.
+    """
+    peaks = {}
+
+    def on_year(update):
+        cohort = update['cohort']
+        peak = max(peaks.get(cohort, update['start_value']), update['end_value'])
+        peaks[cohort] = peak
+        return peak > 0 and 1 - update['end_value'] / peak >= max_drawdown
+    return on_year
+
+
+def _cohort_spec(cohort, top_pct):
+    """Normalize a cohort spec: 'top' / 'bottom' (uses top_pct) or ('top' | 'bottom', pct)."""
+    which, pct = (cohort, top_pct) if isinstance(cohort, str) else cohort
+    if which not in ('top', 'bottom'):
+        raise ValueError(f"Unknown cohort: {cohort!r}. Expected 'top', 'bottom' or a ('top'|'bottom', pct) tuple.")
+    return which, pct
+
+
+def rebalance_cohorts(data, factors, start_year, end_year, initial_aum, verbosity=0, restrict_fossil_fuels=False,
+                      top_pct=10, cohorts=('top', 'bottom'), use_market_cap_weight=False, screens=None, profile=False,
+                      on_year=None):
+    """
+    Backtest several cohorts in one pass over the years.
+
+    Markets, factor normalization and ranking are shared by all cohorts; each
+    cohort then builds its own holdings from its own AUM. Every per-cohort
+    result is identical to `rebalance_portfolio` with the matching `which` /
+    `top_pct`.
+
+    Each cohort's yearly (growth, start value, end value) records are kept in
+    BACKTEST_CHECKPOINTS, so a rerun that only moves `end_year` reuses the
+    cached years and computes just the years past the longest cached run.
+    Finished results are memoized in `result_cache.RESULT_CACHE`, so an
+    identical rerun returns copies of the stored dicts.
+
+    `on_year(update)` is called as soon as each cohort's year is computed with
+    a dict of 'cohort', 'year', 'growth', 'start_value', 'end_value' (AUM
+    after the year), 'holdings' (positions across factor sleeves) and
+    'benchmark_return'. Returning True stops the backtest after that year:
+    the results then end at the last computed year (see `stop_on_drawdown`).
+
+    Args:
+        cohorts: 'top' / 'bottom' (at `top_pct`) or ('top' | 'bottom', pct) tuples
+        screens: universe screens (see screens.py) applied to each year's ranked market
+        profile: True (or a Chrome-trace JSON path) to time every stage of the run and add
+            the per-stage summary to each result under 'timings' (see profiling.py) and the
+            run's diagnostics counters under 'counters' (see diagnostics.py)
+        on_year: per-year callback (see above)
+        (other arguments as for `rebalance_portfolio`)
+
+    Returns:
+        dict: cohort spec (as passed) -> result dict from `summarize_backtest`
+    """
+    if profile:
+        with profiling.profile() as profiler, diagnostics.counting() as counts, \
+                profiling.stage('rebalance', rows=len(data)):
+            results = rebalance_cohorts(data, factors, start_year, end_year, initial_aum, verbosity=verbosity,
+                                        restrict_fossil_fuels=restrict_fossil_fuels, top_pct=top_pct, cohorts=cohorts,
+                                        use_market_cap_weight=use_market_cap_weight, screens=screens,
+                                        on_year=on_year)
+        if isinstance(profile, str):
+            profiler.write_chrome_trace(profile)
+        for result in results.values():
+            result['timings'] = profiler.summary()
+            result['counters'] = dict(counts)
+        return results
+
+    specs = {cohort: _cohort_spec(cohort, top_pct) for cohort in cohorts}
+    result_key = checkpoint_key('cohorts', dataset_fingerprint(data), factors, start_year, initial_aum,
+                                restrict_fossil_fuels, screens, None, top_pct, use_market_cap_weight) + (
+        int(end_year), tuple((cohort, which, float(pct)) for cohort, (which, pct) in specs.items())
+    )
+    # Memoized results carry no per-year updates, so runs with a callback recompute (from checkpoints)
+    results = RESULT_CACHE.get(result_key) if on_year is None else None
+    if results is not None:
+        return results
+
+    state = {
+        cohort: {'aum': initial_aum, 'portfolio_returns': [], 'benchmark_returns': [], 'portfolio_values': [initial_aum],
+                 'records': []}
+        for cohort in specs
+    }
     years = [start_year] # Start with the initial year
-    portfolio_returns = []  # Store yearly returns for Information Ratio
-    benchmark_returns = []  # Store benchmark returns for comparison
-    portfolio_values = [aum]  # track total AUM over time
-    
+
     # Ensure verbosity is not None
     verbosity = 0 if verbosity is None else verbosity
-    
+
     # Risk-free rate lookup from FRED (October 1)
     risk_free_rate_lookup = {
         2002: 0.0156, 2003: 0.0102, 2004: 0.0182, 2005: 0.0349, 2006: 0.0473,
@@ -180,44 +385,206 @@ def rebalance_portfolio(data, factors, start_year, end_year, initial_aum, verbos
     }
     risk_free_rate_source = "FRED (Oct 1)"
 
-    for year in range(start_year, end_year):
+    # Per-year markets are cleaned once per dataset and shared across backtests
+    universe = MarketUniverse.of(data)
+
+    def record_year(cohort, year, growth, total_start_value, total_end_value, holdings):
+        if verbosity >= 2:
+            label = f"[{cohort}] " if len(specs) > 1 else ""
+            print(f"{label}Year {year} to {year + 1}: Growth: {growth:.2%}, "
+                  f"Start Value: ${total_start_value:.2f}, End Value: ${total_end_value:.2f}")
 
-        market = MarketObject(data.loc[data['Year'] == year], year)
-        yearly_portfolio = []
+        # Liquidate and reinvest; record the return for Information Ratio / Sharpe
+        cohort_state = state[cohort]
+        cohort_state['aum'] = total_end_value
+        cohort_state['portfolio_returns'].append(growth)
+        benchmark_return = get_benchmark_return(year)
+        cohort_state['benchmark_returns'].append(benchmark_return)
+        cohort_state['portfolio_values'].append(total_end_value)
+        cohort_state['records'].append((year, growth, total_start_value, total_end_value, holdings))
+        if on_year is not None:
+            return bool(on_year({
+                'cohort': cohort, 'year': year, 'growth': growth, 'start_value': total_start_value,
+                'end_value': total_end_value, 'holdings': holdings, 'benchmark_return': benchmark_return,
+            }))
+        return False
+
+    # Resume after the years every cohort already has checkpointed
+    keys = {
+        cohort: checkpoint_key('cohorts', universe.fingerprint, factors, start_year, initial_aum, restrict_fossil_fuels,
+                               screens, which, pct, use_market_cap_weight)
+        for cohort, (which, pct) in specs.items()
+    }
+    cached = {cohort: load_checkpoint(key, end_year - start_year) for cohort, key in keys.items()}
+    resume_year = start_year + min(len(records) for records in cached.values())
+    stopped = False
+    for i, year in enumerate(range(start_year, resume_year)):
+        # Every cohort records the year before a stop request takes effect
+        stopped = any([record_year(cohort, *records[i]) for cohort, records in cached.items()])
+        years.append(year + 1)
+        if stopped:
+            break
+    # Progress for background jobs (see jobs.py); also where a cancelled job stops
+    report_progress(resume_year - start_year, end_year - start_year)
+
+    for year in range(resume_year, resume_year if stopped else end_year):
+
+        # Screened up front so holdings and start values see the same market
+        market = universe.market(year, restrict_fossil_fuels=restrict_fossil_fuels, screens=screens)
+        yearly_portfolios = {cohort: [] for cohort in specs}
 
         for factor in factors:
-            factor_portfolio = calculate_holdings(
-                factor=factor,
-                aum=aum / len(factors),
-                market=market,
-                restrict_fossil_fuels=restrict_fossil_fuels,
-                top_pct=top_pct,
-                which=which,
-                use_market_cap_weight=use_market_cap_weight
-            )
-            yearly_portfolio.append(factor_portfolio)
-
-        if year < end_year:
-            next_market = MarketObject(data.loc[data['Year'] == year + 1], year + 1)
+            # Score and rank once per factor-year; partition once per distinct percentage
+            tickers, scores = _factor_scores(factor, market)
+            selections = {}
+            for pct in {pct for _, pct in specs.values()}:
+                n_select = _n_select(len(scores), pct)
+                selections[pct] = dict(zip(('top', 'bottom'), select_ranked(scores, n_select, which='both')))
+
+            for cohort, (which, pct) in specs.items():
+                aum = state[cohort]['aum'] / len(factors)
+                if len(scores) == 0:
+                    factor_portfolio = Portfolio(name=f"Portfolio_{market.t}")
+                else:
+                    idx = selections[pct][which]
+                    factor_portfolio = _build_portfolio(tickers[idx].tolist(), aum, market, use_market_cap_weight)
+                yearly_portfolios[cohort].append(factor_portfolio)
+
+        next_market = universe.market(year + 1)
+        for cohort, yearly_portfolio in yearly_portfolios.items():
             growth, total_start_value, total_end_value = calculate_growth(yearly_portfolio, next_market, market, verbosity)
+            holdings = sum(len(portfolio) for portfolio in yearly_portfolio)
+            stopped = record_year(cohort, year, growth, total_start_value, total_end_value, holdings) or stopped
 
-            if verbosity is not None and verbosity >= 2:
-                print(f"Year {year} to {year + 1}: Growth: {growth:.2%}, "
+        years.append(year+1) #adding next year to match portfolio_values
+        report_progress(year + 1 - start_year, end_year - start_year)
+        if stopped:
+            break
+
+    for cohort, key in keys.items():
+        save_checkpoint(key, state[cohort]['records'])
+
+    # An early stop ends the results at the last computed year
+    last_year = years[-1]
+    results = {
+        cohort: summarize_backtest(
+            initial_aum, cohort_state['aum'], start_year, last_year, list(years),
+            cohort_state['portfolio_returns'], cohort_state['benchmark_returns'], cohort_state['portfolio_values'],
+            verbosity=verbosity, risk_free_rate_source=risk_free_rate_source
+        )
+        for cohort, cohort_state in state.items()
+    }
+    if last_year == end_year:
+        RESULT_CACHE.put(result_key, results)
+    return results
+
+
+def rebalance_quantiles(data, factors, start_year, end_year, initial_aum, n_quantiles=10, verbosity=0,
+                        restrict_fossil_fuels=False, use_market_cap_weight=False, screens=None):
+    """
+    Backtest every quantile bucket (e.g. deciles) of the factor ranking at once.
+
+    Each factor-year is ranked once and every scored stock is assigned to one
+    of `n_quantiles` buckets (bucket 1 = most attractive). Each bucket is run
+    as its own portfolio with the same rules as `rebalance_portfolio`: AUM
+    split equally across factors, liquidated and reinvested every year. A
+    factor with no stocks in a bucket that year (fewer scored stocks than
+    buckets) holds its share of the bucket's AUM in cash.
+
+    Returns:
+        dict:
+            'quantiles': bucket number (1..n) -> result dict from `summarize_backtest`
+            'spread_returns': yearly long-short return (bucket 1 minus bucket n)
+            'spread_values': value of `initial_aum` compounded at the spread returns
+            'years', 'benchmark_returns', 'n_quantiles'
+    """
+    n_quantiles = int(n_quantiles)
+    if n_quantiles < 2:
+        raise ValueError(f"n_quantiles must be at least 2 for a long-short spread, got {n_quantiles}.")
+    verbosity = 0 if verbosity is None else verbosity
+
+    buckets = range(1, n_quantiles + 1)
+    aum = dict.fromkeys(buckets, initial_aum)
+    bucket_returns = {b: [] for b in buckets}
+    bucket_values = {b: [initial_aum] for b in buckets}
+    benchmark_returns = []
+    years = [start_year]
+
+    universe = MarketUniverse.of(data)
+
+    for year in range(start_year, end_year):
+        market = universe.market(year, restrict_fossil_fuels=restrict_fossil_fuels, screens=screens)
+        yearly_portfolios = {b: [] for b in buckets}
+        cash = dict.fromkeys(buckets, 0.0)
+
+        for factor in factors:
+            # One ranking per factor-year serves every bucket
+            tickers, scores = _factor_scores(factor, market)
+            bucket, order = quantile_buckets(scores, n_quantiles)
+            ranked_bucket = bucket[order]
+            for b in buckets:
+                idx = order[ranked_bucket == b - 1]
+                if len(idx) == 0:
+                    cash[b] += aum[b] / len(factors)
+                    continue
+                yearly_portfolios[b].append(
+                    _build_portfolio(tickers[idx].tolist(), aum[b] / len(factors), market, use_market_cap_weight)
+                )
+
+        next_market = universe.market(year + 1)
+        benchmark_returns.append(get_benchmark_return(year))
+        for b in buckets:
+            growth, total_start_value, total_end_value = calculate_growth(yearly_portfolios[b], next_market, market, verbosity)
+            if not total_start_value:
+                # Nothing was invested this year: the bucket's AUM stays in cash
+                growth, total_end_value = 0, aum[b]
+            elif cash[b]:
+                # Uninvested factor shares earn nothing but stay in the bucket
+                total_end_value += cash[b]
+                growth = total_end_value / (total_start_value + cash[b]) - 1
+            if verbosity >= 2:
+                print(f"[Q{b}] Year {year} to {year + 1}: Growth: {growth:.2%}, "
                       f"Start Value: ${total_start_value:.2f}, End Value: ${total_end_value:.2f}")
+            aum[b] = total_end_value
+            bucket_returns[b].append(growth)
+            bucket_values[b].append(total_end_value)
 
-            aum = total_end_value  # Liquidate and reinvest
+        years.append(year + 1)
 
-            # Append annual return (growth) to portfolio_returns
-            portfolio_returns.append(growth)
+    spread_returns = (np.array(bucket_returns[1], dtype=float) - np.array(bucket_returns[n_quantiles], dtype=float)).tolist()
+    spread_values = [initial_aum] + (initial_aum * np.cumprod(1 + np.array(spread_returns))).tolist()
 
-            # Get benchmark return for the year (replace it as needed)
-            benchmark_return = get_benchmark_return(year)  # Define this function based on benchmark data
-            benchmark_returns.append(benchmark_return)
-            portfolio_values.append(aum)  # add current AUM to the list
+    if verbosity >= 1:
+        print(f"\n==== Quantile Summary ({n_quantiles} buckets, Q1 = best) ====")
+        for b in buckets:
+            print(f"Q{b}: Final Value: ${aum[b]:.2f}")
+        print(f"Long-Short (Q1 - Q{n_quantiles}): Final Value: ${spread_values[-1]:.2f}")
 
-        years.append(year+1) #adding next year to match portfolio_values
+    return {
+        'n_quantiles': n_quantiles,
+        'years': years,
+        'benchmark_returns': benchmark_returns,
+        'quantiles': {
+            b: summarize_backtest(initial_aum, aum[b], start_year, end_year, list(years), bucket_returns[b],
+                                  list(benchmark_returns), bucket_values[b], verbosity=0)
+            for b in buckets
+        },
+        'spread_returns': spread_returns,
+        'spread_values': spread_values,
+    }
+
+
+@timed('metrics')
+def summarize_backtest(initial_aum, aum, start_year, end_year, years, portfolio_returns,
+                       benchmark_returns, portfolio_values, verbosity=0, risk_free_rate_source="FRED (Oct 1)"):
+    """
+    Build the backtest result dict (and print the summary) from a finished year loop.
+
+    Shared by `rebalance_portfolio` and the panel engine so both return
+    exactly the same keys and metrics.
+    """
+    verbosity = 0 if verbosity is None else verbosity
 
-    
     if verbosity is not None and verbosity >= 1:
 
         print("\n==== Final Summary ====")
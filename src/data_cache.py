@@ -0,0 +1,194 @@
+"""
+Local columnar cache for Supabase table loads.
+
+Each (table, sector filter, column projection, date range) combination is stored as one Parquet file plus a small
+JSON sidecar holding the schema fingerprint and the `ID` high-water mark.
+A warm cache is refreshed incrementally by fetching only rows whose `ID` is
+greater than the cached maximum; a schema change forces a full reload.
+
+Cache location: `cache_dir` argument > FACTOR_LAKE_CACHE_DIR env var > ~/.cache/factor_lake
+"""
+import hashlib
+import json
+import os
+import re
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from .supabase_client import load_supabase_data
+from .diagnostics import INFO, WARNING, event
+
+# Bump when the on-disk layout changes so stale caches are ignored
+CACHE_FORMAT_VERSION = 1
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'factor_lake')
+REFRESH_MODES = ('incremental', 'full', 'none')
+
+
+def get_cache_dir(cache_dir=None):
+    """Resolve the cache directory (argument > env var > default)."""
+    return cache_dir or os.environ.get('FACTOR_LAKE_CACHE_DIR') or DEFAULT_CACHE_DIR
+
+
+def schema_fingerprint(columns):
+    """Order-independent hash of a frame's column names."""
+    joined = '\x1f'.join(sorted(str(c) for c in columns))
+    return hashlib.sha1(joined.encode('utf-8')).hexdigest()[:16]
+
+
+class TableCache:
+    """
+    On-disk cache entry for one Supabase table + sector filter + column projection + date range.
+
+    Args:
+        table_name (str): Supabase table name
+        sectors (list): sector filter applied server-side (order-insensitive)
+        cache_dir (str): directory for cache files (see `get_cache_dir`)
+        columns (list): selected Supabase columns, None for all (order-insensitive)
+        start_date (str), end_date (str): server-side Date range, None for unbounded
+    """
+
+    def __init__(self, table_name, sectors=None, cache_dir=None, columns=None, start_date=None, end_date=None):
+        self.table_name = table_name
+        self.sectors = sorted(sectors) if sectors else None
+        self.columns = sorted(columns) if columns else None
+        self.date_range = [start_date, end_date] if (start_date or end_date) else None
+        self.cache_dir = get_cache_dir(cache_dir)
+        key_parts = {'table': table_name, 'sectors': self.sectors, 'version': CACHE_FORMAT_VERSION}
+        if self.columns:
+            key_parts['columns'] = self.columns
+        if self.date_range:
+            key_parts['date_range'] = self.date_range
+        key = hashlib.sha1(json.dumps(key_parts, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+        safe_name = re.sub(r'[^A-Za-z0-9_-]+', '_', table_name).strip('_') or 'table'
+        self.data_path = os.path.join(self.cache_dir, f"{safe_name}-{key}.parquet")
+        self.meta_path = os.path.join(self.cache_dir, f"{safe_name}-{key}.json")
+
+    def read(self):
+        """Return (DataFrame, metadata) or (None, None) when there is no usable entry."""
+        if not (os.path.exists(self.data_path) and os.path.exists(self.meta_path)):
+            return None, None
+        try:
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+            if meta.get('version') != CACHE_FORMAT_VERSION:
+                return None, None
+            df = pd.read_parquet(self.data_path)
+        except Exception as e:
+            event(WARNING, 'cache_unreadable', "Warning: ignoring unreadable cache for '%s': %s", self.table_name, e)
+            return None, None
+        if schema_fingerprint(df.columns) != meta.get('schema'):
+            return None, None
+        return df, meta
+
+    def write(self, df):
+        """Persist `df` and its metadata. Returns the metadata dict, or None on failure."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = self.data_path + '.tmp'
+        try:
+            try:
+                df.to_parquet(tmp_path, index=False)
+            except (TypeError, ValueError):
+                # Mixed-type object columns (e.g. numbers and '--') can't be written as-is
+                df = df.copy()
+                for col in df.columns[df.dtypes == object]:
+                    df[col] = df[col].astype('string')
+                df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, self.data_path)
+        except Exception as e:
+            event(WARNING, 'cache_write_failed', "Warning: could not write cache for '%s': %s", self.table_name, e)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return None
+
+        meta = {
+            'version': CACHE_FORMAT_VERSION,
+            'table': self.table_name,
+            'sectors': self.sectors,
+            'columns': self.columns,
+            'date_range': self.date_range,
+            'schema': schema_fingerprint(df.columns),
+            'rows': int(len(df)),
+            'max_id': _max_id(df),
+            'updated_at': datetime.now(timezone.utc).isoformat(),
+        }
+        with open(self.meta_path, 'w') as f:
+            json.dump(meta, f, indent=2)
+        return meta
+
+    def clear(self):
+        """Delete this cache entry if present."""
+        for path in (self.data_path, self.meta_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _max_id(df):
+    if 'ID' not in df.columns or df.empty:
+        return None
+    ids = pd.to_numeric(df['ID'], errors='coerce').dropna()
+    if ids.empty:
+        return None
+    value = ids.max()
+    return int(value) if float(value).is_integer() else float(value)
+
+
+def load_supabase_data_cached(table_name='Full Precision Test', show_progress=True, sectors=None,
+                              cache_dir=None, refresh='incremental', columns=None, start_date=None, end_date=None):
+    """
+    Load a Supabase table through the local cache.
+
+    Args:
+        table_name (str): Name of the Supabase table to load
+        show_progress (bool): Whether to print loading progress messages
+        sectors (list): Optional server-side sector filter (part of the cache key)
+        cache_dir (str): Cache directory override
+        refresh (str): 'incremental' (fetch rows with ID > cached max), 'full'
+            (re-download everything) or 'none' (use the cache as-is, offline)
+        columns (list): Supabase columns to select (part of the cache key); None for all
+        start_date (str), end_date (str): server-side Date range (part of the cache key)
+
+    Returns:
+        pandas.DataFrame: raw (unstandardized) table rows, same as `load_supabase_data`
+    """
+    if refresh not in REFRESH_MODES:
+        raise ValueError(f"Unknown cache refresh mode: {refresh}. Expected one of {REFRESH_MODES}.")
+
+    cache = TableCache(table_name, sectors=sectors, cache_dir=cache_dir, columns=columns,
+                       start_date=start_date, end_date=end_date)
+    query = dict(show_progress=show_progress, sectors=sectors, columns=columns,
+                 start_date=start_date, end_date=end_date)
+    cached, meta = cache.read()
+
+    if cached is not None and refresh == 'none':
+        if show_progress:
+            event(INFO, 'cache_hit', "Loaded %s records from local cache (no refresh): %s", len(cached), cache.data_path)
+        return cached
+
+    try:
+        if cached is not None and refresh == 'incremental' and meta.get('max_id') is not None:
+            new_rows = load_supabase_data(table_name, min_id=meta['max_id'], **query)
+            if new_rows.empty:
+                if show_progress:
+                    event(INFO, 'cache_hit', "Cache is up to date (%s records): %s", len(cached), cache.data_path)
+                return cached
+            if schema_fingerprint(new_rows.columns) != meta.get('schema'):
+                if show_progress:
+                    event(INFO, 'cache_schema_changed', "Table schema changed since the cache was written; reloading in full.")
+                fresh = load_supabase_data(table_name, **query)
+            else:
+                fresh = pd.concat([cached, new_rows[cached.columns]], ignore_index=True)
+                fresh = fresh.drop_duplicates(subset='ID', keep='last').reset_index(drop=True)
+                if show_progress:
+                    event(INFO, 'cache_refreshed', "Cache refreshed with %s new records (%s total).", len(new_rows), len(fresh))
+        else:
+            fresh = load_supabase_data(table_name, **query)
+    except Exception as e:
+        if cached is None:
+            raise
+        event(WARNING, 'cache_stale', "Warning: Supabase refresh failed (%s); using cached data from %s.", e, meta.get('updated_at'))
+        return cached
+
+    if not fresh.empty:
+        cache.write(fresh)
+    return fresh
@@ -0,0 +1,168 @@
+"""
+Process-wide registry of loaded datasets shared between sessions.
+
+Every Streamlit session used to call `load_data` and keep its own copy of the
+same table in `st.session_state`. `DatasetRegistry` loads each distinct
+configuration once per process and hands the same frame to every caller:
+concurrent requests for a configuration that is still loading wait for that
+one load instead of starting their own. Entries are evicted least recently
+used once the registry exceeds `max_entries` or `max_bytes`; `invalidate`
+drops them explicitly (e.g. after the Supabase table changed). This sits in
+front of the on-disk `data_cache`: it saves the load itself, not just the fetch.
+
+Returned frames are shared and read-only: the registry stores a copy whose
+numeric, boolean, datetime and categorical columns sit on non-writeable numpy
+arrays, so in-place value writes (`.loc[...] = ...`, `.values[...] = ...`)
+raise instead of changing the data under every other session. Build a new
+frame (a filtered selection or `.copy()`) to modify. Sharing the object also
+lets the per-frame caches (`MarketUniverse.of`, `ScreenMasks.of`, dataset
+fingerprints), which assume the frame never changes, be reused across sessions.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from .market_object import load_data
+
+
+def _frozen(value):
+    """Hashable, order-insensitive form of a load argument."""
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = [_frozen(v) for v in value]
+        return tuple(sorted(items, key=repr)) if isinstance(value, (set, frozenset)) else tuple(items)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _frozen(v)) for k, v in value.items()))
+    return getattr(value, 'column_name', value)
+
+
+def dataset_key(**load_kwargs):
+    """Registry key for a `load_data` call: its keyword arguments (factor objects by column name, sectors as a set)."""
+    kwargs = dict(load_kwargs)
+    if kwargs.get('sectors') is not None:
+        kwargs['sectors'] = frozenset(kwargs['sectors'])
+    kwargs.pop('show_loading_progress', None)
+    return ('load_data',) + _frozen(kwargs)
+
+
+def read_only_frame(frame):
+    """
+    Copy of `frame` whose columns are backed by non-writeable arrays.
+
+    Columns with a numpy dtype are copied into one read-only array each and
+    categoricals get read-only codes. Extension columns without a numpy
+    backing (e.g. Arrow strings) are kept as they are.
+    """
+    columns = {}
+    for name, series in frame.items():
+        values = series.array
+        if isinstance(values, pd.Categorical):
+            codes = np.array(values.codes)
+            codes.flags.writeable = False
+            values = pd.Categorical.from_codes(codes, dtype=values.dtype)
+        elif isinstance(series.dtype, np.dtype):
+            values = series.to_numpy(copy=True)
+            values.flags.writeable = False
+        columns[name] = values
+    frozen = pd.DataFrame(columns, index=frame.index, copy=False)
+    frozen.attrs = dict(frame.attrs)
+    return frozen
+
+
+class DatasetRegistry:
+    """
+    Bounded, thread-safe LRU of loaded frames.
+
+    Args:
+        max_entries (int): most datasets kept at once
+        max_bytes (int): total `memory_usage(deep=True)` budget (None: unbounded); the
+            most recently loaded dataset is always kept, even if it alone exceeds it
+    """
+
+    def __init__(self, max_entries=4, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (frame, nbytes)
+        self._loading = {}  # key -> lock held while that key loads
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_load(self, key, load):
+        """Shared frame for `key`, calling `load()` once (other callers for `key` wait for it) on a miss."""
+        frame = self._get(key)
+        if frame is not None:
+            return frame
+        with self._lock:
+            key_lock = self._loading.setdefault(key, threading.Lock())
+        with key_lock:
+            # Loaded by another caller while we waited
+            frame = self._get(key, count=False)
+            if frame is not None:
+                return frame
+            try:
+                frame = read_only_frame(load())
+                nbytes = int(frame.memory_usage(deep=True).sum())
+                with self._lock:
+                    self.misses += 1
+                    self._entries[key] = (frame, nbytes)
+                    self._entries.move_to_end(key)
+                    self._evict()
+            finally:
+                # Also on failure, so a failed load (e.g. a Supabase error) does not leave the key's lock behind;
+                # callers already waiting on it retry the load themselves
+                with self._lock:
+                    if self._loading.get(key) is key_lock:
+                        del self._loading[key]
+        return frame
+
+    def load_data(self, **load_kwargs):
+        """`market_object.load_data(**load_kwargs)`, shared across callers with the same arguments."""
+        return self.get_or_load(dataset_key(**load_kwargs), lambda: load_data(**load_kwargs))
+
+    def _get(self, key, count=True):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            if count:
+                self.hits += 1
+            return entry[0]
+
+    def _evict(self):
+        # Caller holds self._lock
+        while len(self._entries) > max(1, self.max_entries):
+            self._entries.popitem(last=False)
+        if self.max_bytes is not None:
+            while len(self._entries) > 1 and sum(n for _, n in self._entries.values()) > self.max_bytes:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key=None):
+        """Drop `key` (or every entry when None); the next request reloads it."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def info(self):
+        """Hit/miss counters, entry count and total bytes held."""
+        with self._lock:
+            return {
+                'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries),
+                'bytes': sum(n for _, n in self._entries.values()),
+                'max_entries': self.max_entries, 'max_bytes': self.max_bytes,
+            }
+
+
+def _env_max_bytes():
+    mb = os.environ.get('FACTOR_LAKE_DATASET_CACHE_MB')
+    return int(float(mb) * 1024 * 1024) if mb else None
+
+
+# Shared by every session of the process (e.g. all Streamlit users); FACTOR_LAKE_DATASET_CACHE_MB bounds its memory
+SHARED_DATASETS = DatasetRegistry(max_entries=int(os.environ.get('FACTOR_LAKE_DATASET_CACHE_ENTRIES', 4)),
+                                  max_bytes=_env_max_bytes())
@@ -0,0 +1,125 @@
+"""
+Structured diagnostics for the load / backtest pipeline.
+
+Hot paths report through this module instead of `print`:
+
+- `count(name, n)` adds to aggregated counters (skipped tickers, invalid
+  prices, dropped exits, ...): one dict update, no string building.
+- `event(level, name, message, *args)` logs through the 'factor_lake'
+  logger. `message % args` is only formatted when `level` is enabled, and
+  callers guard anything expensive to build (ticker lists, joins) with
+  `if enabled(DEBUG):`.
+
+Counters are kept process-wide (`counters()`, `reset_counters()`) and for
+every enclosing `with counting() as counts:` block of the current context,
+so one run's counts can be read without interference from other sessions:
+
+    with counting() as counts:
+        rebalance_portfolio(rdata, factors, 2002, 2023, 1000)
+    counts   # {'exit_missing': 41, 'fossil_rows_removed': 380, ...}
+
+The logger prints INFO and above to stdout as plain messages, as the
+pipeline always has. Per-ticker detail is DEBUG. Set FACTOR_LAKE_LOG_LEVEL
+(e.g. WARNING on Streamlit Cloud, DEBUG when investigating) or configure the
+'factor_lake' logger directly.
+"""
+import contextvars
+import logging
+import os
+import sys
+import threading
+from collections import Counter
+from logging import DEBUG, INFO, WARNING, ERROR  # noqa: F401 (re-exported levels)
+
+LOGGER = logging.getLogger('factor_lake')
+
+# Innermost active counting() scope of the current context (None: process-wide counters only)
+_ACTIVE = contextvars.ContextVar('factor_lake_counters', default=None)
+_COUNTERS = Counter()
+_LOCK = threading.Lock()
+
+
+class _StdoutHandler(logging.Handler):
+    """Writes to the current sys.stdout (so redirect_stdout and test capture still apply)."""
+
+    def emit(self, record):
+        try:
+            sys.stdout.write(self.format(record) + '\n')
+        except Exception:
+            self.handleError(record)
+
+
+def _configure():
+    if not LOGGER.handlers:
+        handler = _StdoutHandler()
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        LOGGER.addHandler(handler)
+        LOGGER.propagate = False
+    level = os.environ.get('FACTOR_LAKE_LOG_LEVEL')
+    LOGGER.setLevel(logging.getLevelName(level.upper()) if level else INFO)
+
+
+_configure()
+
+
+def enabled(level):
+    """True if events at `level` are emitted (check before building expensive arguments)."""
+    return LOGGER.isEnabledFor(level)
+
+
+def event(level, name, message, *args, **fields):
+    """
+    Log `message % args` at `level` if enabled. `name` and `fields` are attached
+    to the record (`record.event`, `record.fields`) for structured handlers.
+    """
+    if LOGGER.isEnabledFor(level):
+        LOGGER.log(level, message, *args, extra={'event': name, 'fields': fields})
+
+
+def count(name, n=1):
+    """Add `n` to counter `name` (process-wide and in every active counting() scope)."""
+    if not n:
+        return
+    with _LOCK:
+        _COUNTERS[name] += n
+    scope = _ACTIVE.get()
+    while scope is not None:
+        scope.add(name, n)
+        scope = scope.parent
+
+
+class _Scope(dict):
+    """Counts collected inside one counting() block (a plain dict of name -> total)."""
+
+    def __init__(self, parent):
+        super().__init__()
+        self.parent = parent
+        self._lock = threading.Lock()
+
+    def add(self, name, n):
+        with self._lock:
+            self[name] = self.get(name, 0) + n
+
+
+class counting:
+    """Context manager collecting the counts made by the enclosed block (and the calls it makes)."""
+
+    def __enter__(self):
+        self.counts = _Scope(parent=_ACTIVE.get())
+        self._token = _ACTIVE.set(self.counts)
+        return self.counts
+
+    def __exit__(self, *exc):
+        _ACTIVE.reset(self._token)
+        return False
+
+
+def counters():
+    """Process-wide counter totals since start (or the last reset)."""
+    with _LOCK:
+        return dict(_COUNTERS)
+
+
+def reset_counters():
+    with _LOCK:
+        _COUNTERS.clear()
@@ -84,3 +84,10 @@ class NextYrReturn(Factors):
 class NextYrActiveReturn(Factors):
     def __init__(self):
         super().__init__("Next-Year's Active Return %")
+
+# Selectable (non-target) factors by column name
+FACTOR_CLASSES = {
+    cls().column_name: cls
+    for cls in (ROE, ROA, Momentum12m, Momentum6m, Momentum1m, P2B, NextFYrEarns, OneYrPriceVol,
+                AccrualsAssets, ROAPercentage, OneYrAssetGrowth, OneYrCapEXGrowth, BookPrice)
+}
@@ -1,8 +1,15 @@
+import threading
+from collections import OrderedDict
+
 import numpy as np
 import pandas as pd
 from typing import Optional
 
+from .factors_doc import FACTOR_DOCS
+from .profiling import timed
+
 # Small helper to normalize a factor Series so that higher values mean better
+@timed('normalize')
 def normalize_series(s: pd.Series,
                      higher_is_better: bool = True,
                      method: str = 'reciprocal_if_positive',
@@ -58,3 +65,221 @@ def normalize_series(s: pd.Series,
             s = (s - mean) / std
 
     return s
+
+
+@timed('normalize')
+def normalize_panel(data: pd.DataFrame,
+                    columns=None,
+                    year_col: str = 'Year',
+                    mask: Optional[np.ndarray] = None,
+                    winsorize_pct: Optional[float] = 0.005) -> pd.DataFrame:
+    """
+    `normalize_series` applied to every factor column within every year at once.
+
+    Winsorizes, inverts (per FACTOR_DOCS `higher_is_better`, same
+    reciprocal-or-negate rule) and z-scores each (year, factor) group with one
+    groupby over the whole matrix plus NumPy bincount reductions, instead of
+    one pandas pass per factor-year. Each group gives the same values as
+    `normalize_series` on that year's rows (up to summation order).
+
+    Args:
+        data: frame with `year_col` and the factor columns
+        columns: factor columns to normalize (default: every FACTOR_DOCS column present)
+        year_col: grouping column
+        mask: optional boolean array; only these rows form each year's universe (others are NaN)
+        winsorize_pct: fraction winsorized on each tail, as in `normalize_series`
+
+    Returns:
+        DataFrame indexed like `data` with one float64 column per factor
+    """
+    if columns is None:
+        columns = [col for col in FACTOR_DOCS if col in data.columns]
+    out = np.full((len(data), len(columns)), np.nan)
+
+    years = pd.to_numeric(data[year_col], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    rows = ~np.isnan(years)
+    if mask is not None:
+        rows &= np.asarray(mask, dtype=bool)
+    rows = np.flatnonzero(rows)
+    if len(columns) == 0 or len(rows) == 0:
+        return pd.DataFrame(out, index=data.index, columns=columns)
+
+    codes, _ = pd.factorize(years[rows])
+    n_groups = codes.max() + 1
+    values = np.column_stack([
+        pd.to_numeric(data[col], errors='coerce').to_numpy(dtype=float, na_value=np.nan)[rows] for col in columns
+    ])
+
+    # Winsorize: per-(year, factor) quantiles from a single groupby over the matrix
+    if winsorize_pct and winsorize_pct > 0:
+        grouped = pd.DataFrame(values).groupby(codes, sort=True)
+        lower = grouped.quantile(winsorize_pct).to_numpy()[codes]
+        upper = grouped.quantile(1 - winsorize_pct).to_numpy()[codes]
+        with np.errstate(invalid='ignore'):
+            values = np.where(values < lower, lower, np.where(values > upper, upper, values))
+
+    def group_sum(weights):
+        return np.bincount(codes, weights=weights, minlength=n_groups)
+
+    for j, col in enumerate(columns):
+        v = values[:, j]
+        present = ~np.isnan(v)
+        counts = group_sum(present.astype(float))
+
+        if not FACTOR_DOCS.get(col, {}).get('higher_is_better', True):
+            # Same rule as normalize_series: negate when >10% of the year is non-positive, else reciprocal
+            with np.errstate(invalid='ignore'):
+                nonpos = group_sum((present & (v <= 0)).astype(float))
+            nonpos_frac = np.divide(nonpos, counts, out=np.zeros(n_groups), where=counts > 0)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                reciprocal = np.where(v == 0, np.nan, 1.0 / v)
+            v = np.where(nonpos_frac[codes] > 0.1, -v, reciprocal)
+            present = ~np.isnan(v)
+            counts = group_sum(present.astype(float))
+
+        # z-score within each year (sample std); constant or single-value years are only demeaned
+        filled = np.where(present, v, 0.0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = group_sum(filled) / counts
+            centered = v - mean[codes]
+            var = group_sum(np.where(present, centered, 0.0) ** 2) / (counts - 1)
+        std = np.sqrt(np.where(counts > 1, var, np.nan))
+        scale = np.where((std == 0) | np.isnan(std), 1.0, std)
+        out[rows, j] = centered / scale[codes]
+
+    return pd.DataFrame(out, index=data.index, columns=columns)
+
+
+@timed('select')
+def select_ranked(scores: np.ndarray, n_select: int, which: str = 'top'):
+    """
+    Positions of the `n_select` best ('top') or worst ('bottom') scores without a full sort.
+
+    Ranking matches a stable `sorted(..., reverse=True)` over the scores: higher
+    first, ties in position order. 'top' returns the first `n_select` of that
+    ranking and 'bottom' the last `n_select`, both in ranked order. 'both'
+    returns (top, bottom) from a single `np.argpartition` pass.
+
+    Args:
+        scores: 1-D array of non-NaN scores
+        n_select: number of positions per cohort (clipped to len(scores))
+        which: 'top', 'bottom' or 'both'
+    """
+    if which not in ('top', 'bottom', 'both'):
+        raise ValueError(f"Unknown selection: {which}. Expected 'top', 'bottom' or 'both'.")
+    neg = -np.asarray(scores, dtype=float)
+    n = len(neg)
+    k = min(max(int(n_select), 0), n)
+    if k == 0:
+        empty = np.empty(0, dtype=np.intp)
+        return (empty, empty) if which == 'both' else empty
+
+    # k-th best sits at position k-1 of ascending `neg`, k-th worst at n-k
+    kth = sorted({k - 1, n - k} if which == 'both' else ({k - 1} if which == 'top' else {n - k}))
+    part = np.argpartition(neg, kth)
+
+    def take(best):
+        bound = neg[part[k - 1] if best else part[n - k]]
+        strict = np.flatnonzero(neg < bound if best else neg > bound)
+        ties = np.flatnonzero(neg == bound)
+        # Ties at the boundary: earliest positions rank first
+        ties = ties[:k - len(strict)] if best else ties[len(ties) - (k - len(strict)):]
+        chosen = np.concatenate([strict, ties])
+        return chosen[np.lexsort((chosen, neg[chosen]))]
+
+    if which == 'both':
+        return take(True), take(False)
+    return take(which == 'top')
+
+
+@timed('select')
+def quantile_buckets(scores: np.ndarray, n_quantiles: int):
+    """
+    Bucket index (0 = best) of every score in one stable ranking.
+
+    Uses the same ranking as `select_ranked` (higher first, ties in position
+    order) and splits it into `n_quantiles` contiguous buckets whose sizes
+    differ by at most one.
+
+    Returns:
+        (bucket, order): bucket per position, and the positions in ranked order
+    """
+    if int(n_quantiles) < 1:
+        raise ValueError(f"n_quantiles must be at least 1, got {n_quantiles}.")
+    neg = -np.asarray(scores, dtype=float)
+    order = np.argsort(neg, kind='stable')
+    ranks = np.empty(len(neg), dtype=np.intp)
+    ranks[order] = np.arange(len(neg))
+    bucket = ranks * int(n_quantiles) // max(len(neg), 1)
+    return bucket, order
+
+
+class ScoreCache:
+    """
+    Bounded, thread-safe LRU cache of normalized factor scores.
+
+    Keys are tuples naming the consumer and a dataset fingerprint (see
+    `market_object.dataset_fingerprint`) followed by whatever fixes the
+    normalization input (universe screen, extra columns). Values are
+    `normalize_panel` matrices for all factors and years of one dataset, so a
+    handful of entries covers a session. Cached arrays are marked read-only
+    because they are shared between callers.
+    """
+
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key, compute):
+        """Cached value for `key`, or `compute()` (stored, with its arrays frozen) on a miss."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        value = compute()
+        for array in (value if isinstance(value, tuple) else (value,)):
+            if isinstance(array, np.ndarray):
+                array.setflags(write=False)
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def get(self, key, default=None):
+        """Cached value for `key` (counted as a hit or miss), or `default`."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        """Store `value` under `key`, evicting the least recently used entries beyond `maxsize`."""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def info(self):
+        """Hit/miss counters and current size."""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries), 'maxsize': self.maxsize}
+
+
+# Process-wide normalization cache shared by calculate_holdings and the panel engine
+NORMALIZATION_CACHE = ScoreCache()
@@ -0,0 +1,194 @@
+"""
+Background execution of long backtests.
+
+`JobRunner.submit(func, *args, **kwargs)` runs `func` on a worker thread and
+returns a job id straight away, so the Streamlit script thread is free to
+render and poll:
+
+    job_id = JOB_RUNNER.submit(rebalance_portfolio_panel, rdata, factors, 2002, 2023, 1000)
+    JOB_RUNNER.status(job_id)   # {'state': 'running', 'done': 7, 'total': 21, ...}
+    JOB_RUNNER.result(job_id)   # the result dict once 'done'
+    JOB_RUNNER.cancel(job_id)
+
+The backtest loops call `report_progress(done, total)` once per year (the
+panel engine, which computes all years in one vectorized pass, before and
+after that pass). Outside
+a job that is a context-variable lookup; inside one it updates the job's
+progress and, once the job has been cancelled, raises `JobCancelled` so the
+backtest stops at the next year boundary.
+"""
+import contextvars
+import itertools
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+# Job whose function runs in the current context (None: not inside a job)
+_CURRENT = contextvars.ContextVar('factor_lake_job', default=None)
+
+JOB_STATES = ('queued', 'running', 'done', 'failed', 'cancelled')
+
+
+class JobCancelled(Exception):
+    """Raised inside a job's function at the next progress report after `cancel`."""
+
+
+class Job:
+    """One submitted call: state, progress, result or error, and timestamps."""
+
+    def __init__(self, job_id, description=None):
+        self.id = job_id
+        self.description = description
+        self.state = 'queued'
+        self.done = 0
+        self.total = None
+        self.result = None
+        self.error = None
+        self.traceback = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.future = None
+        self._cancel = threading.Event()
+
+    @property
+    def finished_running(self):
+        return self.state in ('done', 'failed', 'cancelled')
+
+    def snapshot(self):
+        """Status dict safe to hand to the UI (no result payload)."""
+        return {
+            'id': self.id, 'description': self.description, 'state': self.state,
+            'done': self.done, 'total': self.total, 'error': None if self.error is None else str(self.error),
+            'submitted': self.submitted, 'started': self.started, 'finished': self.finished,
+        }
+
+
+def report_progress(done, total):
+    """Record `done` of `total` steps on the current job; raise JobCancelled if it was cancelled."""
+    job = _CURRENT.get()
+    if job is None:
+        return
+    job.done, job.total = done, total
+    if job._cancel.is_set():
+        raise JobCancelled(f"Job {job.id} cancelled")
+
+
+class JobRunner:
+    """
+    Thread pool with a job table.
+
+    Threads rather than processes: jobs share the loaded frames and the
+    process-wide caches (normalization, checkpoints, results) without copying
+    or pickling, and numpy / pandas release the GIL in the heavy kernels.
+
+    Args:
+        max_workers (int): jobs running at once; later submissions queue
+        max_finished (int): finished jobs kept in the table (oldest dropped first)
+    """
+
+    def __init__(self, max_workers=2, max_finished=50):
+        self.max_workers = max_workers
+        self.max_finished = max_finished
+        self._executor = None
+        self._jobs = OrderedDict()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args, description=None, **kwargs):
+        """Queue `func(*args, **kwargs)`; returns the job id."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='factor_lake_job')
+            job = Job(f'job-{next(self._ids)}', description)
+            self._jobs[job.id] = job
+            self._prune()
+            context = contextvars.copy_context()
+            job.future = self._executor.submit(context.run, self._run, job, func, args, kwargs)
+        return job.id
+
+    @staticmethod
+    def _run(job, func, args, kwargs):
+        if job._cancel.is_set():
+            job.state, job.finished = 'cancelled', time.time()
+            return
+        _CURRENT.set(job)
+        job.state, job.started = 'running', time.time()
+        try:
+            job.result = func(*args, **kwargs)
+            job.state = 'done'
+        except JobCancelled:
+            job.state = 'cancelled'
+        except Exception as e:
+            job.error, job.traceback = e, traceback.format_exc()
+            job.state = 'failed'
+        finally:
+            job.finished = time.time()
+
+    def _prune(self):
+        # Caller holds self._lock
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished_running]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        """The Job for `job_id` (KeyError if unknown or pruned)."""
+        with self._lock:
+            return self._jobs[job_id]
+
+    def status(self, job_id):
+        """Status snapshot of `job_id` (see `Job.snapshot`)."""
+        return self.get(job_id).snapshot()
+
+    def result(self, job_id, timeout=None):
+        """
+        Wait (up to `timeout` seconds) for `job_id` and return its result.
+
+        Raises:
+            JobCancelled: the job was cancelled
+            TimeoutError: still running after `timeout`
+            Exception: whatever the job's function raised
+        """
+        job = self.get(job_id)
+        try:
+            job.future.result(timeout=timeout)
+        except CancelledError:
+            pass
+        if job.state == 'cancelled':
+            raise JobCancelled(f"Job {job_id} cancelled")
+        if job.state == 'failed':
+            raise job.error
+        return job.result
+
+    def cancel(self, job_id):
+        """Request cancellation; returns False if the job had already finished."""
+        job = self.get(job_id)
+        if job.finished_running:
+            return False
+        job._cancel.set()
+        if job.future.cancel():
+            job.state, job.finished = 'cancelled', time.time()
+        return True
+
+    def jobs(self):
+        """Status snapshots of every job in the table, oldest first."""
+        with self._lock:
+            return [job.snapshot() for job in self._jobs.values()]
+
+    def shutdown(self, wait=True):
+        """Cancel unfinished jobs and stop the worker threads."""
+        with self._lock:
+            jobs = list(self._jobs.values())
+            executor, self._executor = self._executor, None
+        for job in jobs:
+            if not job.finished_running:
+                self.cancel(job.id)
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+# Process-wide runner shared by every Streamlit session, so concurrent sessions queue rather than oversubscribe
+JOB_RUNNER = JobRunner()
@@ -1,5 +1,5 @@
 from .market_object import load_data
-from .calculate_holdings import rebalance_portfolio
+from .panel_engine import rebalance_portfolio_panel
 from .user_input import get_factors
 from .verbosity_options import get_verbosity_level
 from .fossil_fuel_restriction import get_fossil_fuel_restriction
@@ -22,25 +22,36 @@ def main():
     # Sector selection
     selected_sectors = get_sector_selection()
 
-    # Load market data
+    available_factors = [
+        'ROE using 9/30 Data', 'ROA using 9/30 Data', '12-Mo Momentum %',
+        '6-Mo Momentum %', '1-Mo Momentum %', 'Price to Book Using 9/30 Data',
+        'Next FY Earns/P', '1-Yr Price Vol %', 'Accruals/Assets', 'ROA %',
+        '1-Yr Asset Growth %', '1-Yr CapEX Growth %', 'Book/Price'
+    ]
+
+    ### Get user selections ###
+    factors = get_factors(available_factors)
+    verbosity_level = get_verbosity_level()
+
+    # Separate factor objects from their names for use downstream
+    factor_objects, factor_names = (zip(*factors) if factors else ([], []))
+
+    # Load market data (only the columns the selected factors need)
     rdata = load_data(
         restrict_fossil_fuels=restrict_fossil_fuels, 
         use_supabase=use_supabase,
         show_loading_progress=show_loading,
-        sectors=selected_sectors
+        sectors=selected_sectors,
+        factors=list(factor_names)
     )
 
     ### Data preprocessing ###
     # Note: Fossil fuel filtering is applied later in calculate_holdings() for each year
-    rdata['Ticker'] = rdata['Ticker-Region'].dropna().apply(lambda x: x.split('-')[0].strip())
-    rdata['Year'] = pd.to_datetime(rdata['Date']).dt.year
-
-    available_factors = [
-        'ROE using 9/30 Data', 'ROA using 9/30 Data', '12-Mo Momentum %',
-        '6-Mo Momentum %', '1-Mo Momentum %', 'Price to Book Using 9/30 Data',
-        'Next FY Earns/P', '1-Yr Price Vol %', 'Accruals/Assets', 'ROA %',
-        '1-Yr Asset Growth %', '1-Yr CapEX Growth %', 'Book/Price'
-    ]
+    # load_data already derives typed Ticker/Year columns; only fill them in if missing
+    if 'Ticker' not in rdata.columns:
+        rdata['Ticker'] = rdata['Ticker-Region'].dropna().apply(lambda x: x.split('-')[0].strip())
+    if 'Year' not in rdata.columns:
+        rdata['Year'] = pd.to_datetime(rdata['Date']).dt.year
     
     # Only select columns that actually exist
     cols_to_keep = ['Ticker', 'Year']
@@ -56,16 +67,9 @@ def main():
     
     rdata = rdata[cols_to_keep]
 
-    ### Get user selections ###
-    factors = get_factors(available_factors)
-    verbosity_level = get_verbosity_level()
-
-    # Separate factor objects from their names for use downstream
-    factor_objects, factor_names = (zip(*factors) if factors else ([], []))
-
     ### Rebalancing portfolio across years ###
     # ...existing code...
-    results = rebalance_portfolio(
+    results = rebalance_portfolio_panel(
         rdata, list(factor_objects),
         start_year=2002, end_year=2023,
         initial_aum=1,
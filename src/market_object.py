@@ -1,23 +1,49 @@
+import datetime
+import hashlib
 import pandas as pd
 import numpy as np
-from .supabase_client import load_supabase_data
+from .supabase_client import load_supabase_data, year_date_range
+from .data_cache import load_supabase_data_cached
+from .factor_utils import normalize_panel, NORMALIZATION_CACHE
+from .profiling import stage, timed
+from .diagnostics import DEBUG, ERROR, INFO, WARNING, count, enabled, event
+from .screens import (
+    FOSSIL_FLAG_COLUMN, SECTOR_COLUMN, VOLUME_COLUMN, ScreenMasks, canonical_screens, fossil_fuel_flags
+)
 import os
+import weakref
 
 ### CREATING FUNCTION TO LOAD DATA ### Tables: FR2000 Annual Quant Data Full Precision Test
-def load_data(restrict_fossil_fuels=False, use_supabase=True, table_name='Full Precision Test', show_loading_progress=True, data_path=None, excel_sheet='Data', sectors=None):
+@timed('load')
+def load_data(restrict_fossil_fuels=False, use_supabase=True, table_name='Full Precision Test', show_loading_progress=True, data_path=None, excel_sheet='Data', sectors=None,
+              use_cache=True, cache_dir=None, cache_refresh='incremental', columns=None, factors=None,
+              start_year=None, end_year=None, float_dtype='float64'):
     """
     Load market data from either Supabase or Excel file (fallback).
-    
+
     Args:
         restrict_fossil_fuels (bool): Whether to exclude fossil fuel companies
         use_supabase (bool): If True, use Supabase; if False, use Excel fallback
         table_name (str): Name of Supabase table containing market data
         show_loading_progress (bool): Whether to show loading progress messages
-    
+        use_cache (bool): Read Supabase tables through the local Parquet cache (see data_cache.py)
+        cache_dir (str): Cache directory override (default: FACTOR_LAKE_CACHE_DIR or ~/.cache/factor_lake)
+        cache_refresh (str): 'incremental', 'full' or 'none' (offline: use cached rows as-is)
+        columns (list): Extra column names to load. When `columns` or `factors` is given only
+            the core columns (ID, Ticker-Region, Date, Ending Price, Market Capitalization),
+            the screen columns in use and the requested ones are fetched/read.
+        factors (list): Factor objects or factor column names to load (see `columns`)
+        start_year (int): First year to load (Date filter pushed to Supabase / applied while reading files)
+        end_year (int): Last year to load, inclusive
+        float_dtype (str): 'float64' or 'float32' storage for price/cap/factor columns (see `_enforce_schema`)
+
     Returns:
         pandas.DataFrame: Market data
     """
-    
+    if float_dtype not in FLOAT_DTYPES:
+        raise ValueError(f"Unknown float_dtype: {float_dtype}. Expected one of {FLOAT_DTYPES}.")
+    projection = _projection_columns(columns, factors, restrict_fossil_fuels=restrict_fossil_fuels, sectors=sectors)
+
     if use_supabase:
         try:
             # Resolve which Supabase table to use (param > env var > sensible default)
@@ -25,11 +51,23 @@ def load_data(restrict_fossil_fuels=False, use_supabase=True, table_name='Full P
 
             # Load data from Supabase
             if show_loading_progress:
-                print(f"Using Supabase table: '{effective_table}'")
-            rdata = load_supabase_data(effective_table, show_progress=show_loading_progress, sectors=sectors)
+                event(INFO, 'load_source', "Using Supabase table: '%s'", effective_table)
+            # Server-side projection: only the needed columns cross the wire
+            select_columns = _to_supabase_columns(projection) if projection else None
+            # Server-side Date range: only the requested years cross the wire
+            start_date, end_date = year_date_range(start_year, end_year)
+            with stage('fetch') as fetch:
+                if use_cache:
+                    rdata = load_supabase_data_cached(effective_table, show_progress=show_loading_progress, sectors=sectors,
+                                                      cache_dir=cache_dir, refresh=cache_refresh, columns=select_columns,
+                                                      start_date=start_date, end_date=end_date)
+                else:
+                    rdata = load_supabase_data(effective_table, show_progress=show_loading_progress, sectors=sectors,
+                                               columns=select_columns, start_date=start_date, end_date=end_date)
+                fetch.rows = len(rdata)
             
             if rdata.empty:
-                print("Warning: No data loaded from Supabase. Check your table and connection.")
+                event(WARNING, 'load_empty', "Warning: No data loaded from Supabase. Check your table and connection.")
                 return rdata
             
             # Standardize column names to match existing code expectations
@@ -37,22 +75,7 @@ def load_data(restrict_fossil_fuels=False, use_supabase=True, table_name='Full P
 
             # Apply sector restriction logic (post-standardization)
             if restrict_fossil_fuels:
-                industry_col = 'FactSet Industry'
-                if industry_col in rdata.columns:
-                    before = rdata.copy()
-                    rdata[industry_col] = rdata[industry_col].astype(str).str.lower()
-                    fossil_keywords = ['oil', 'gas', 'coal', 'energy', 'fossil']
-                    mask = rdata[industry_col].apply(lambda x: not any(kw in x for kw in fossil_keywords))
-                    rdata = rdata[mask]
-                    # Report removals (tickers)
-                    if 'Ticker' in before.columns and 'Ticker' in rdata.columns:
-                        removed = sorted(set(before['Ticker']) - set(rdata['Ticker']))
-                        if removed:
-                            print(f"Fossil filter removed {len(removed)} tickers (Supabase): {', '.join(removed[:25])}{' ...' if len(removed) > 25 else ''}")
-                        else:
-                            print("Fossil filter removed 0 tickers (Supabase)")
-                else:
-                    print("Warning: 'FactSet Industry' column not found. Fossil fuel filtering skipped.")
+                rdata = _drop_fossil_rows(rdata, context_label="Supabase")
 
             # If sectors are provided, apply client-side filter as safety-net (in case server-side failed)
             if sectors:
@@ -66,33 +89,39 @@ def load_data(restrict_fossil_fuels=False, use_supabase=True, table_name='Full P
                 dup_removed = before_total - len(rdata)
 
                 # Filter out rows missing essential data (uses same logic as for Excel fallback)
-                rdata_before_filter = rdata.copy()
+                rows_before_filter = len(rdata)
                 rdata = _filter_essential_data(rdata)
-                nulls_removed = len(rdata_before_filter) - len(rdata)
+                nulls_removed = rows_before_filter - len(rdata)
 
+                count('duplicate_rows_removed', dup_removed)
                 if dup_removed > 0 or nulls_removed > 0:
-                    print(f"Supabase load: removed {dup_removed} duplicate rows and {nulls_removed} rows with missing essential data (out of {before_total} rows).")
+                    event(INFO, 'load_cleaned', "Supabase load: removed %s duplicate rows and %s rows with missing essential data (out of %s rows).",
+                          dup_removed, nulls_removed, before_total)
             except Exception:
                 # Non-fatal: continue without failing the load
                 pass
 
-            print(f"Successfully loaded {len(rdata)} records from Supabase")
+            # Enforce compact dtypes once; downstream code relies on them instead of re-coercing
+            rdata = _add_fossil_flag(_enforce_schema(rdata, float_dtype=float_dtype))
+
+            event(INFO, 'load_done', "Successfully loaded %s records from Supabase", len(rdata))
             # Quick sanity check: distribution by Year after standardization
-            if 'Year' in rdata.columns:
+            if 'Year' in rdata.columns and enabled(INFO):
                 try:
                     year_counts = rdata['Year'].value_counts().sort_index()
                     # Print a compact summary
-                    print("Rows per Year (Supabase):", ", ".join([f"{int(y)}: {int(c)}" for y, c in year_counts.items()]))
+                    event(INFO, 'load_years', "Rows per Year (Supabase): %s",
+                          ", ".join([f"{int(y)}: {int(c)}" for y, c in year_counts.items()]))
                 except Exception:
                     pass
             return rdata
             
         except Exception as e:
-            print(f"Error loading from Supabase: {e}")
+            event(ERROR, 'load_failed', "Error loading from Supabase: %s", e)
             raise RuntimeError(f"Failed to load data from Supabase. Please check your Supabase configuration and secrets. Error: {e}")
     
     if not use_supabase:
-        # Fallback to local file (Excel or CSV). Accepts a data_path (CSV/Excel path OR file-like object).
+        # Fallback to local file (Excel, CSV or Parquet). Accepts a data_path (path OR file-like object).
         try:
             from google.colab import drive  # type: ignore
             in_colab = True
@@ -104,38 +133,50 @@ def load_data(restrict_fossil_fuels=False, use_supabase=True, table_name='Full P
             #data_path = '/content/drive/My Drive/Cayuga Fund Factor Lake/FR2000 Annual Quant Data FOR RETURN SIMULATION.xlsx'
             data_path = '/content/drive/MyDrive/Cayuga Fund Factor Lake/Full Precision Test_rows.csv'
         if data_path is None:
-            print("Excel/CSV fallback unavailable: provide data_path when not using Supabase or run in Colab.")
+            event(ERROR, 'load_failed', "Excel/CSV fallback unavailable: provide data_path when not using Supabase or run in Colab.")
             raise RuntimeError("Excel/CSV fallback unavailable: provide data_path when not using Supabase or run in Colab.")
 
         # Mount Drive in Colab if necessary (only for string paths)
         if in_colab and isinstance(data_path, str) and not os.path.exists('/content/drive'):
             try:
-                print("Mounting Google Drive...")
+                event(INFO, 'load_source', "Mounting Google Drive...")
                 drive.mount('/content/drive')
             except Exception:
                 pass
 
+        # Files may use either naming convention (and may carry Ticker/Year already), so accept all forms
+        usecols = None
+        if projection:
+            wanted = set(projection) | set(_to_supabase_columns(projection)) | DERIVED_COLUMNS
+            usecols = lambda c: str(c).strip() in wanted
+
         try:
             # Check if data_path is a file-like object (e.g., Streamlit UploadedFile) or a string path
             is_file_like = hasattr(data_path, 'read')
             
-            if is_file_like:
-                # Handle file-like objects (e.g., from Streamlit file_uploader)
-                file_name = getattr(data_path, 'name', 'uploaded_file')
-                print(f"Loading data from uploaded file: {file_name}")
-                
-                if file_name.lower().endswith('.csv'):
-                    rdata = pd.read_csv(data_path)
-                else:
-                    rdata = pd.read_excel(data_path, sheet_name=excel_sheet, header=2, skiprows=[3, 4])
-            else:
-                # Handle string paths
-                print(f"Loading data file from: {data_path}")
-                lp = str(data_path).lower()
-                if lp.endswith('.csv'):
-                    rdata = pd.read_csv(data_path)
+            with stage('fetch') as fetch:
+                if is_file_like:
+                    # Handle file-like objects (e.g., from Streamlit file_uploader)
+                    file_name = getattr(data_path, 'name', 'uploaded_file')
+                    event(INFO, 'load_source', "Loading data from uploaded file: %s", file_name)
+
+                    if file_name.lower().endswith('.csv'):
+                        rdata = _read_csv_year_range(data_path, usecols, start_year, end_year)
+                    elif file_name.lower().endswith('.parquet'):
+                        rdata = _read_parquet_year_range(data_path, usecols, start_year, end_year)
+                    else:
+                        rdata = pd.read_excel(data_path, sheet_name=excel_sheet, header=2, skiprows=[3, 4], usecols=usecols)
                 else:
-                    rdata = pd.read_excel(data_path, sheet_name=excel_sheet, header=2, skiprows=[3, 4])
+                    # Handle string paths
+                    event(INFO, 'load_source', "Loading data file from: %s", data_path)
+                    lp = str(data_path).lower()
+                    if lp.endswith('.csv'):
+                        rdata = _read_csv_year_range(data_path, usecols, start_year, end_year)
+                    elif lp.endswith('.parquet'):
+                        rdata = _read_parquet_year_range(data_path, usecols, start_year, end_year)
+                    else:
+                        rdata = pd.read_excel(data_path, sheet_name=excel_sheet, header=2, skiprows=[3, 4], usecols=usecols)
+                fetch.rows = len(rdata)
 
             # Normalize column names and remove duplicate columns
             rdata.columns = rdata.columns.str.strip()
@@ -144,24 +185,12 @@ def load_data(restrict_fossil_fuels=False, use_supabase=True, table_name='Full P
             # Standardize to the same column names we expect from Supabase
             rdata = _standardize_column_names(rdata)
 
+            # Drop out-of-range years before any further work (CSVs were already filtered per chunk)
+            rdata = _filter_year_range(rdata, start_year, end_year)
+
             # Apply sector restriction logic (post-standardization)
             if restrict_fossil_fuels:
-                industry_col = 'FactSet Industry'
-                if industry_col in rdata.columns:
-                    before = rdata.copy()
-                    rdata[industry_col] = rdata[industry_col].astype(str).str.lower()
-                    fossil_keywords = ['oil', 'gas', 'coal', 'energy', 'fossil']
-                    mask = rdata[industry_col].apply(lambda x: not any(kw in x for kw in fossil_keywords))
-                    rdata = rdata[mask]
-                    # Report removals (tickers)
-                    if 'Ticker' in before.columns and 'Ticker' in rdata.columns:
-                        removed = sorted(set(before['Ticker']) - set(rdata['Ticker']))
-                        if removed:
-                            print(f"Fossil filter removed {len(removed)} tickers (Excel/CSV): {', '.join(removed[:25])}{' ...' if len(removed) > 25 else ''}")
-                        else:
-                            print("Fossil filter removed 0 tickers (Excel/CSV)")
-                else:
-                    print("Warning: 'FactSet Industry' column not found. Fossil fuel filtering skipped.")
+                rdata = _drop_fossil_rows(rdata, context_label="Excel/CSV")
 
             # If sectors are provided, apply client-side filter
             if sectors:
@@ -175,80 +204,255 @@ def load_data(restrict_fossil_fuels=False, use_supabase=True, table_name='Full P
                 dup_removed = before_total - len(rdata)
 
                 # Filter out rows missing essential data
-                rdata_before_filter = rdata.copy()
+                rows_before_filter = len(rdata)
                 rdata = _filter_essential_data(rdata)
-                nulls_removed = len(rdata_before_filter) - len(rdata)
+                nulls_removed = rows_before_filter - len(rdata)
 
+                count('duplicate_rows_removed', dup_removed)
                 if dup_removed > 0 or nulls_removed > 0:
-                    print(f"File load: removed {dup_removed} duplicate rows and {nulls_removed} rows with missing essential data (out of {before_total} rows).")
+                    event(INFO, 'load_cleaned', "File load: removed %s duplicate rows and %s rows with missing essential data (out of %s rows).",
+                          dup_removed, nulls_removed, before_total)
             except Exception:
                 pass
 
-            print(f"Successfully loaded {len(rdata)} records from file")
+            rdata = _add_fossil_flag(_enforce_schema(rdata, float_dtype=float_dtype))
+
+            event(INFO, 'load_done', "Successfully loaded %s records from file", len(rdata))
             # Quick sanity check: distribution by Year after standardization
-            if 'Year' in rdata.columns:
+            if 'Year' in rdata.columns and enabled(INFO):
                 try:
                     year_counts = rdata['Year'].value_counts().sort_index()
-                    print("Rows per Year (File):", ", ".join([f"{int(y)}: {int(c)}" for y, c in year_counts.items()]))
+                    event(INFO, 'load_years', "Rows per Year (File): %s",
+                          ", ".join([f"{int(y)}: {int(c)}" for y, c in year_counts.items()]))
                 except Exception:
                     pass
             return rdata
 
         except Exception as e:
-            print(f"Error loading data file: {e}")
+            event(ERROR, 'load_failed', "Error loading data file: %s", e)
             raise
 
 
+# HARDCODED mapping - Supabase column names -> Expected column names
+SUPABASE_COLUMN_MAP = {
+    # Core columns
+    'ID': 'ID',
+    'Security_Name': 'Security Name',
+    'Ticker-Region': 'Ticker-Region',
+    'Russell_2000_Port_Weight': 'Russell 2000 Port. Weight',
+    'Ending_Price': 'Ending Price',
+    'Market_Capitalization': 'Market Capitalization',
+    'Date': 'Date',
+    'FactSet_Industry': 'FactSet Industry',
+    'Scotts_Sector_5': "Scott's Sector (5)",
+
+    # Factor columns - EXACT mapping from Supabase
+    'ROE_using_9-30_Data': 'ROE using 9/30 Data',
+    'ROA_using_9-30_Data': 'ROA using 9/30 Data',
+    'Price_to_Book_Using_9-30_Data': 'Price to Book Using 9/30 Data',
+    'Next_FY_Earns-P': 'Next FY Earns/P',
+    '12-Mo_Momentum': '12-Mo Momentum %',
+    '6-Mo_Momentum': '6-Mo Momentum %',
+    '1-Mo_Momentum': '1-Mo Momentum %',
+    '1-Yr_Price_Vol': '1-Yr Price Vol %',
+    'Accruals-Assets': 'Accruals/Assets',
+    'ROA': 'ROA %',
+    '1-Yr_Asset_Growth': '1-Yr Asset Growth %',
+    '1-Yr_CapEX_Growth': '1-Yr CapEX Growth %',
+    'Book-Price': 'Book/Price',
+    'Next-Years_Return': "Next-Year's Return %",
+    'Next-Years_Active_Return': "Next-Year's Active Return %",
+
+    # Financial data columns
+    'NI_Millions': 'NI, $Millions',
+    'OpCF_Millions': 'OpCF, $Millions',
+    'Latest_Assets_Millions': 'Latest Assets, $Millions',
+    'Prior_Years_Assets_Millions': "Prior Year's Assets, $Millions",
+    'Book_Value_Per_Share': 'Book Value Per Share $',
+    'CapEx_Millions': 'CapEx, $Millions',
+    'Prior_Years_CapEx_Millions': "Prior Year's CapEx, $Millions",
+    'Earnings_Surprise': 'Earnings Surprise %',
+    'EarningsReportedLast': 'Earnings Reported Last',
+    'Avg_Daily_3-Mo_Volume_Mills': 'Avg Daily 3-Mo Volume Mills $',
+}
+
+# Reverse mapping (expected column name -> Supabase column name) for server-side projection
+STANDARD_TO_SUPABASE = {v: k for k, v in SUPABASE_COLUMN_MAP.items()}
+
+# Columns every backtest needs regardless of the selected factors
+CORE_COLUMNS = ['ID', 'Ticker-Region', 'Date', 'Ending Price', 'Market Capitalization']
+
+# Derived by _standardize_column_names, never stored in the table
+DERIVED_COLUMNS = {'Ticker', 'Year'}
+
+
+def _projection_columns(columns=None, factors=None, restrict_fossil_fuels=False, sectors=None):
+    """
+    Standardized column names a load needs, or None to load every column.
+
+    Args:
+        columns: extra standardized (or raw Supabase) column names
+        factors: factor objects (anything with `column_name`) or factor column names
+        restrict_fossil_fuels (bool): include 'FactSet Industry' for the fossil screen
+        sectors: include "Scott's Sector (5)" for the sector filter
+    """
+    if columns is None and factors is None:
+        return None
+    wanted = list(CORE_COLUMNS)
+    if restrict_fossil_fuels:
+        wanted.append('FactSet Industry')
+    if sectors:
+        wanted.append("Scott's Sector (5)")
+    wanted.extend(getattr(f, 'column_name', str(f)) for f in (factors or []))
+    wanted.extend(columns or [])
+    return [c for c in dict.fromkeys(wanted) if c not in DERIVED_COLUMNS]
+
+
+def _to_supabase_columns(columns):
+    """Translate standardized column names back to Supabase column names."""
+    return [STANDARD_TO_SUPABASE.get(c, c) for c in columns]
+
+
+# Identifier/label columns stored as categoricals (few distinct values, many rows)
+CATEGORICAL_COLUMNS = ['Ticker', 'Ticker-Region', 'Security Name', 'FactSet Industry', "Scott's Sector (5)", 'Date']
+
+# Every other mapped column except these holds prices, weights or factor values
+NON_FLOAT_COLUMNS = set(CATEGORICAL_COLUMNS) | {'ID', 'Year', 'Earnings Reported Last'}
+FLOAT_COLUMNS = [c for c in SUPABASE_COLUMN_MAP.values() if c not in NON_FLOAT_COLUMNS]
+FLOAT_DTYPES = ('float64', 'float32')
+
+
+@timed('schema')
+def _enforce_schema(df, float_dtype='float64'):
+    """
+    Convert a standardized frame to compact, consistent dtypes:
+    identifier/sector columns -> category, Year -> int16, price/cap/factor columns -> `float_dtype`.
+    Non-numeric placeholders ('--', 'N/A', ...) become NaN.
+    """
+    df = df.copy()
+    for col in FLOAT_COLUMNS:
+        if col in df.columns:
+            values = df[col]
+            if not pd.api.types.is_numeric_dtype(values):
+                values = pd.to_numeric(values, errors='coerce')
+            df[col] = values.astype(float_dtype)
+    if 'Year' in df.columns:
+        years = pd.to_numeric(df['Year'], errors='coerce')
+        if years.notna().all():
+            df['Year'] = years.astype('int16')
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+    return df
+
+
+def _add_fossil_flag(df):
+    """Add the boolean FOSSIL_FLAG_COLUMN (computed once per load) when 'FactSet Industry' is present."""
+    if 'FactSet Industry' in df.columns:
+        df[FOSSIL_FLAG_COLUMN] = fossil_fuel_flags(df['FactSet Industry'])
+    return df
+
+
+def _numeric(series):
+    """Series as numbers; a no-op for columns `_enforce_schema` already typed."""
+    if pd.api.types.is_numeric_dtype(series):
+        return series
+    return pd.to_numeric(series, errors='coerce')
+
+
+# Rows parsed per chunk when a CSV is read with a year range
+CSV_CHUNK_ROWS = 100_000
+
+
+def _filter_year_range(df, start_year=None, end_year=None):
+    """Keep rows whose Year (or Date year) lies in [start_year, end_year]; no-op without bounds."""
+    if start_year is None and end_year is None:
+        return df
+    if 'Year' in df.columns:
+        years = pd.to_numeric(df['Year'], errors='coerce')
+    elif 'Date' in df.columns:
+        years = pd.to_datetime(df['Date'], errors='coerce').dt.year
+    else:
+        return df
+    mask = pd.Series(True, index=df.index)
+    if start_year is not None:
+        mask &= years >= int(start_year)
+    if end_year is not None:
+        mask &= years <= int(end_year)
+    return df[mask]
+
+
+def _read_csv_year_range(data_path, usecols=None, start_year=None, end_year=None):
+    """
+    Read a CSV, dropping out-of-range years chunk by chunk so the full history
+    is never held in memory at once.
+    """
+    if start_year is None and end_year is None:
+        return pd.read_csv(data_path, usecols=usecols)
+    chunks = [
+        _filter_year_range(chunk.rename(columns=lambda c: str(c).strip()), start_year, end_year)
+        for chunk in pd.read_csv(data_path, usecols=usecols, chunksize=CSV_CHUNK_ROWS)
+    ]
+    return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+
+
+def _parquet_year_filters(schema, start_year=None, end_year=None):
+    """
+    pyarrow `filters` keeping [start_year, end_year] on a numeric Year or a
+    date/timestamp Date column, so row groups outside the range are skipped.
+    None when the file has neither (the caller's `_filter_year_range` still applies).
+    """
+    import pyarrow as pa
+    if start_year is None and end_year is None:
+        return None
+    names = {str(name).strip(): name for name in schema.names}
+    filters = []
+    if 'Year' in names:
+        field = schema.field(names['Year'])
+        if not (pa.types.is_integer(field.type) or pa.types.is_floating(field.type)):
+            return None
+        if start_year is not None:
+            filters.append((field.name, '>=', int(start_year)))
+        if end_year is not None:
+            filters.append((field.name, '<=', int(end_year)))
+        return filters
+    if 'Date' in names:
+        field = schema.field(names['Date'])
+        if pa.types.is_date(field.type):
+            boundary = datetime.date
+        elif pa.types.is_timestamp(field.type) and field.type.tz is None:
+            boundary = datetime.datetime
+        else:
+            return None
+        if start_year is not None:
+            filters.append((field.name, '>=', boundary(int(start_year), 1, 1)))
+        if end_year is not None:
+            filters.append((field.name, '<', boundary(int(end_year) + 1, 1, 1)))
+        return filters
+    return None
+
+
+def _read_parquet_year_range(data_path, usecols=None, start_year=None, end_year=None):
+    """
+    Read a Parquet file, decoding only the columns `usecols` accepts and, with
+    a year range, only the row groups that can hold those years.
+    """
+    import pyarrow.parquet as pq
+    schema = pq.read_schema(data_path)
+    if hasattr(data_path, 'seek'):
+        data_path.seek(0)
+    columns = [c for c in schema.names if usecols(c)] if usecols is not None else None
+    return pd.read_parquet(data_path, columns=columns, filters=_parquet_year_filters(schema, start_year, end_year))
+
+
+@timed('standardize')
 def _standardize_column_names(df):
     """
     Hardcoded column name mapping from Supabase format to factor code expectations.
     This maps the EXACT column names from Supabase to what the factor functions expect.
     """
-    # HARDCODED mapping - Supabase column names -> Expected column names
-    column_mapping = {
-        # Core columns
-        'ID': 'ID',
-        'Security_Name': 'Security Name',
-        'Ticker-Region': 'Ticker-Region',
-        'Russell_2000_Port_Weight': 'Russell 2000 Port. Weight',
-        'Ending_Price': 'Ending Price',
-        'Market_Capitalization': 'Market Capitalization',
-        'Date': 'Date',
-        'FactSet_Industry': 'FactSet Industry',
-        'Scotts_Sector_5': "Scott's Sector (5)",
-
-        # Factor columns - EXACT mapping from Supabase
-        'ROE_using_9-30_Data': 'ROE using 9/30 Data',
-        'ROA_using_9-30_Data': 'ROA using 9/30 Data',
-        'Price_to_Book_Using_9-30_Data': 'Price to Book Using 9/30 Data',
-        'Next_FY_Earns-P': 'Next FY Earns/P',
-        '12-Mo_Momentum': '12-Mo Momentum %',
-        '6-Mo_Momentum': '6-Mo Momentum %',
-        '1-Mo_Momentum': '1-Mo Momentum %',
-        '1-Yr_Price_Vol': '1-Yr Price Vol %',
-        'Accruals-Assets': 'Accruals/Assets',
-        'ROA': 'ROA %',
-        '1-Yr_Asset_Growth': '1-Yr Asset Growth %',
-        '1-Yr_CapEX_Growth': '1-Yr CapEX Growth %',
-        'Book-Price': 'Book/Price',
-        'Next-Years_Return': "Next-Year's Return %",
-        'Next-Years_Active_Return': "Next-Year's Active Return %",
-
-        # Financial data columns
-        'NI_Millions': 'NI, $Millions',
-        'OpCF_Millions': 'OpCF, $Millions',
-        'Latest_Assets_Millions': 'Latest Assets, $Millions',
-        'Prior_Years_Assets_Millions': "Prior Year's Assets, $Millions",
-        'Book_Value_Per_Share': 'Book Value Per Share $',
-        'CapEx_Millions': 'CapEx, $Millions',
-        'Prior_Years_CapEx_Millions': "Prior Year's CapEx, $Millions",
-        'Earnings_Surprise': 'Earnings Surprise %',
-        'EarningsReportedLast': 'Earnings Reported Last',
-        'Avg_Daily_3-Mo_Volume_Mills': 'Avg Daily 3-Mo Volume Mills $',
-    }
-
     # Apply column name mapping
-    df = df.rename(columns=column_mapping)
+    df = df.rename(columns=SUPABASE_COLUMN_MAP)
     
     # Ensure required columns exist (with fallback logic)
     if 'Ticker' not in df.columns:
@@ -287,14 +491,35 @@ def _apply_sector_filter(df: pd.DataFrame, sectors, context_label: str = "") ->
         return df
     col = "Scott's Sector (5)"
     if col not in df.columns:
-        print(f"Warning: '{col}' column not found. Sector filtering skipped ({context_label}).")
+        event(WARNING, 'sector_filter_skipped', "Warning: '%s' column not found. Sector filtering skipped (%s).", col, context_label)
         return df
     before = len(df)
     filtered = df[df[col].isin(sectors)].copy()
     removed = before - len(filtered)
-    print(f"Sector filter kept {len(filtered)} rows and removed {removed} ({context_label}).")
+    count('sector_rows_removed', removed)
+    event(INFO, 'sector_filter', "Sector filter kept %s rows and removed %s (%s).", len(filtered), removed, context_label)
     return filtered
 
+def _drop_fossil_rows(rdata, context_label):
+    """Drop fossil-fuel industry rows at load time (lower-casing 'FactSet Industry'), reporting the removed tickers."""
+    industry_col = 'FactSet Industry'
+    if industry_col not in rdata.columns:
+        event(WARNING, 'fossil_filter_skipped', "Warning: 'FactSet Industry' column not found. Fossil fuel filtering skipped.")
+        return rdata
+    rdata[industry_col] = rdata[industry_col].astype(str).str.lower()
+    flags = np.asarray(fossil_fuel_flags(rdata[industry_col]), dtype=bool)
+    count('fossil_rows_removed', int(np.count_nonzero(flags)))
+    # Tickers with no rows left; only worked out when the message is shown
+    if 'Ticker' in rdata.columns and enabled(INFO):
+        tickers = rdata['Ticker']
+        removed = sorted(set(tickers[flags]) - set(tickers[~flags]))
+        if removed:
+            event(INFO, 'fossil_removed', "Fossil filter removed %s tickers (%s): %s%s", len(removed), context_label,
+                  ', '.join(removed[:25]), ' ...' if len(removed) > 25 else '')
+        else:
+            event(INFO, 'fossil_removed', "Fossil filter removed 0 tickers (%s)", context_label)
+    return rdata[~flags]
+
 def _filter_essential_data(df):
     """
     Filter out rows with missing essential data like pricing information.
@@ -330,8 +555,9 @@ def _filter_essential_data(df):
     filtered_count = len(df)
     removed_count = initial_count - filtered_count
     
+    count('rows_missing_essential', removed_count)
     if removed_count > 0:
-        print(f"Filtered out {removed_count} rows with missing essential data (price, ticker, or date)")
+        event(INFO, 'rows_missing_essential', "Filtered out %s rows with missing essential data (price, ticker, or date)", removed_count)
     
     return df
 
@@ -345,6 +571,76 @@ above. The supported entry point is load_data(restrict_fossil_fuels=False,
 use_supabase=True, table_name='All').
 """
 
+# Factor columns a MarketObject keeps (besides 6-Mo Momentum, listed in keep_cols)
+MARKET_FACTOR_COLUMNS = [
+    'ROE using 9/30 Data', 'ROA using 9/30 Data', '12-Mo Momentum %', '1-Mo Momentum %',
+    'Price to Book Using 9/30 Data', 'Next FY Earns/P', '1-Yr Price Vol %', 'Accruals/Assets',
+    'ROA %', '1-Yr Asset Growth %', '1-Yr CapEX Growth %', 'Book/Price',
+    "Next-Year's Return %", "Next-Year's Active Return %"
+]
+
+def _fossil_free_mask(stocks):
+    """Boolean array of rows kept by the fossil screen: the load-time flag column if present, else the keyword screen."""
+    if FOSSIL_FLAG_COLUMN in stocks.columns:
+        return ~stocks[FOSSIL_FLAG_COLUMN].to_numpy(dtype=bool)
+    if 'FactSet Industry' not in stocks.columns:
+        return np.ones(len(stocks), dtype=bool)
+    return ~fossil_fuel_flags(stocks['FactSet Industry'])
+
+
+def _as_labels(tickers):
+    # Arrays (e.g. Portfolio.tickers) go to get_indexer as-is; other iterables become lists
+    return tickers if isinstance(tickers, np.ndarray) else list(tickers)
+
+
+@timed('market')
+def _clean_market_frame(data):
+    """
+    Column selection, placeholder cleanup, numeric coercion and Ticker indexing
+    shared by MarketObject and MarketUniverse. Row-wise, so cleaning the whole
+    frame and slicing by year gives the same result as cleaning each slice.
+    """
+    # Remove duplicated column names
+    data = data.copy(deep=False)
+    data.columns = data.columns.str.strip()
+    data = data.loc[:, ~data.columns.duplicated(keep='first')]
+
+    # Ensure 'Ticker' and 'Year' columns are present
+    if 'Ticker' not in data.columns and 'Ticker-Region' in data.columns:
+        data['Ticker'] = data['Ticker-Region'].str.split('-').str[0].str.strip()
+    if 'Year' not in data.columns and 'Date' in data.columns:
+        data['Year'] = pd.to_datetime(data['Date']).dt.year
+
+    # Keep Ticker-Region so we can index uniquely when present
+    # Include Market Capitalization for cap-weighted portfolios
+    # Sector and volume columns feed the universe screens (see screens.py)
+    keep_cols = ['Ticker-Region', 'Ticker', 'Ending Price', 'Year', '6-Mo Momentum %', 'FactSet Industry', FOSSIL_FLAG_COLUMN,
+                 SECTOR_COLUMN, 'Market Capitalization', VOLUME_COLUMN] + MARKET_FACTOR_COLUMNS
+
+    # Filter and clean data
+    data = data[[col for col in keep_cols if col in data.columns]].copy()
+    # Placeholders can only appear in untyped text columns (loaded frames are typed by _enforce_schema)
+    text_cols = [col for col in data.columns
+                 if not pd.api.types.is_numeric_dtype(data[col]) and not isinstance(data[col].dtype, pd.CategoricalDtype)]
+    if text_cols:
+        data[text_cols] = data[text_cols].replace({'--': None, 'N/A': None, '#N/A': None, '': None})
+
+    # Convert numeric columns to proper numeric types
+    numeric_columns = ['Ending Price', 'Market Capitalization', VOLUME_COLUMN] + [col for col in MARKET_FACTOR_COLUMNS if col in data.columns]
+    for col in numeric_columns:
+        if col in data.columns:
+            data[col] = _numeric(data[col])
+
+    # Prefer 'Ticker' index for compatibility with 'main'; fallback to 'Ticker-Region'
+    index_col = 'Ticker' if 'Ticker' in data.columns else ('Ticker-Region' if 'Ticker-Region' in data.columns else None)
+    if index_col:
+        try:
+            data.set_index(index_col, inplace=True)
+        except Exception:
+            pass
+    return data
+
+
 class MarketObject():
     def __init__(self, data, t, verbosity=1):
         """
@@ -352,66 +648,237 @@ class MarketObject():
         t (int): Year of market data.
         verbosity (int): Controls level of printed output. 0 = silent, 1 = normal, 2+ = verbose.
         """
-        # Remove duplicated column names
-        data.columns = data.columns.str.strip()
-        data = data.loc[:, ~data.columns.duplicated(keep='first')]
-
-        # Ensure 'Ticker' and 'Year' columns are present
-        if 'Ticker' not in data.columns and 'Ticker-Region' in data.columns:
-            data['Ticker'] = data['Ticker-Region'].str.split('-').str[0].str.strip()
-        if 'Year' not in data.columns and 'Date' in data.columns:
-            data['Year'] = pd.to_datetime(data['Date']).dt.year
-
-        # Define relevant columns
-        available_factors = [
-            'ROE using 9/30 Data', 'ROA using 9/30 Data', '12-Mo Momentum %', '1-Mo Momentum %',
-            'Price to Book Using 9/30 Data', 'Next FY Earns/P', '1-Yr Price Vol %', 'Accruals/Assets',
-            'ROA %', '1-Yr Asset Growth %', '1-Yr CapEX Growth %', 'Book/Price',
-            "Next-Year's Return %", "Next-Year's Active Return %"
-        ]
-        # Keep Ticker-Region so we can index uniquely when present
-        # Include Market Capitalization for cap-weighted portfolios
-        keep_cols = ['Ticker-Region', 'Ticker', 'Ending Price', 'Year', '6-Mo Momentum %', 'FactSet Industry', 'Market Capitalization'] + available_factors
-
-        # Filter and clean data
-        data = data[[col for col in keep_cols if col in data.columns]].copy()
-        data.replace({'--': None, 'N/A': None, '#N/A': None, '': None}, inplace=True)
-        
-        # Convert numeric columns to proper numeric types
-        numeric_columns = ['Ending Price', 'Market Capitalization'] + [col for col in available_factors if col in data.columns]
-        for col in numeric_columns:
-            if col in data.columns:
-                data[col] = pd.to_numeric(data[col], errors='coerce')
-
-        # Prefer 'Ticker' index for compatibility with 'main'; fallback to 'Ticker-Region'
-        index_col = 'Ticker' if 'Ticker' in data.columns else ('Ticker-Region' if 'Ticker-Region' in data.columns else None)
-        if index_col:
-            try:
-                data.set_index(index_col, inplace=True)
-            except Exception:
-                pass
-
-        self.stocks = data
+        self.stocks = _clean_market_frame(data)
         self.t = t
         self.verbosity = verbosity
-
-    def get_price(self, ticker):
-        # Try both 'Ending Price' and 'Ending_Price' for compatibility
+        self.fossil_free = False
+        # Set for markets handed out by a MarketUniverse: positions of `stocks` rows in the universe frame
+        self.universe = None
+        self.rows = None
+        # Universe screens (see screens.py) already applied to `stocks`
+        self.screens = ()
+
+    @classmethod
+    def _from_stocks(cls, stocks, t, verbosity=1, fossil_free=False, universe=None, rows=None, screens=()):
+        """Wrap an already-cleaned `stocks` frame without cleaning it again."""
+        market = cls.__new__(cls)
+        market.stocks = stocks
+        market.t = t
+        market.verbosity = verbosity
+        market.fossil_free = fossil_free
+        market.universe = universe
+        market.rows = rows
+        market.screens = screens
+        return market
+
+    def without_fossil_fuels(self):
+        """
+        New MarketObject without fossil-fuel industries (see `fossil_fuel_flags`).
+        Uses the load-time FOSSIL_FLAG_COLUMN when present; the view is built once
+        per `stocks` frame and reused. The original object is left unchanged.
+        """
+        if self.fossil_free:
+            return self
+        cached = self.__dict__.get('_fossil_free_view')
+        if cached is not None and cached[0] is self.stocks:
+            return cached[1]
+        if 'FactSet Industry' not in self.stocks.columns and FOSSIL_FLAG_COLUMN not in self.stocks.columns:
+            view = MarketObject._from_stocks(self.stocks, self.t, self.verbosity, fossil_free=True,
+                                             universe=self.universe, rows=self.rows, screens=self.screens)
+        else:
+            mask = _fossil_free_mask(self.stocks)
+            # Runs once per year and backtest: count always, list the tickers only when asked for
+            n_removed = int(len(mask) - np.count_nonzero(mask))
+            count('fossil_tickers_removed', n_removed)
+            if n_removed and enabled(DEBUG):
+                removed_tickers = [str(t) for t in self.stocks.index[~np.asarray(mask)]]
+                event(DEBUG, 'fossil_removed', "Fossil filter (holdings) removed %s tickers: %s%s", len(removed_tickers),
+                      ', '.join(removed_tickers[:25]), ' ...' if len(removed_tickers) > 25 else '')
+            rows = self.rows[mask] if self.rows is not None else None
+            view = MarketObject._from_stocks(self.stocks[mask], self.t, self.verbosity, fossil_free=True,
+                                             universe=self.universe, rows=rows, screens=self.screens)
+        self._fossil_free_view = (self.stocks, view)
+        return view
+
+    def _price_column(self):
+        # Accept both 'Ending Price' and 'Ending_Price' for compatibility
         for price_col in ['Ending Price', 'Ending_Price']:
-            try:
-                price = self.stocks.loc[ticker, price_col]
-                if isinstance(price, (pd.Series, np.ndarray)):
-                    if hasattr(price, 'dropna') and not price.dropna().empty:
-                        price = price.dropna().iloc[0]
-                    else:
-                        price = price.iloc[0] if hasattr(price, 'iloc') and len(price) > 0 else None
-                if pd.isna(price) or price is None or price <= 0:
-                    if self.verbosity >= 2:
-                        print(f"{ticker} - invalid price ({price}) for {self.t} - SKIPPING")
-                    return None
-                return price
-            except KeyError:
-                continue
-        if self.verbosity >= 2:
-            print(f"{ticker} - not found in market data for {self.t} - SKIPPING")
+            if price_col in self.stocks.columns:
+                return price_col
         return None
+
+    def _lookup(self, col, skip_missing):
+        """
+        (unique ticker Index, values) for `col`, with duplicate tickers resolved once:
+        the first non-missing row if `skip_missing`, otherwise the first row.
+        `values` has a trailing NaN so unknown tickers (indexer -1) read as missing.
+        Rebuilt automatically if `stocks` is replaced.
+        """
+        cache = self.__dict__.get('_lookups')
+        if cache is None or cache[0] is not self.stocks:
+            cache = (self.stocks, {})
+            self._lookups = cache
+        key = (col, skip_missing)
+        if key not in cache[1]:
+            codes, uniques = pd.factorize(self.stocks.index)
+            values = np.full(len(uniques) + 1, np.nan)
+            if col is not None:
+                column = _numeric(self.stocks[col]).to_numpy(dtype=float, na_value=np.nan)
+                rows = codes >= 0
+                if skip_missing:
+                    rows &= ~np.isnan(column)
+                found, first = np.unique(codes[rows], return_index=True)
+                values[found] = column[rows][first]
+            cache[1][key] = (pd.Index(np.asarray(uniques, dtype=object)), values)
+        return cache[1][key]
+
+    def get_prices(self, tickers):
+        """
+        Prices for `tickers` as a float ndarray, NaN where a ticker is missing or
+        its price is missing/non-positive (the cases where get_price returns None).
+        """
+        index, values = self._lookup(self._price_column(), skip_missing=True)
+        prices = values[index.get_indexer(_as_labels(tickers))]
+        prices[~(prices > 0)] = np.nan
+        return prices
+
+    def get_market_caps(self, tickers):
+        """Market capitalization of each ticker's first row as a float ndarray (NaN if missing)."""
+        col = 'Market Capitalization' if 'Market Capitalization' in self.stocks.columns else None
+        index, values = self._lookup(col, skip_missing=False)
+        return values[index.get_indexer(_as_labels(tickers))]
+
+    def get_price(self, ticker):
+        index, values = self._lookup(self._price_column(), skip_missing=True)
+        try:
+            price = values[index.get_loc(ticker)]
+        except (KeyError, TypeError):
+            count('price_not_found')
+            if self.verbosity >= 2:
+                event(DEBUG, 'price_not_found', "%s - not found in market data for %s - SKIPPING", ticker, self.t)
+            return None
+        if not price > 0:
+            count('price_invalid')
+            if self.verbosity >= 2:
+                event(DEBUG, 'price_invalid', "%s - invalid price (%s) for %s - SKIPPING", ticker, price, self.t)
+            return None
+        # Plain float so float32 storage doesn't leak into share/value arithmetic
+        return float(price)
+
+
+class MarketUniverse:
+    """
+    Per-year MarketObjects for one loaded dataset, built once.
+
+    The frame is cleaned/coerced once and grouped by Year; each year's
+    MarketObject (and its fossil-screened and universe-screened variants) is
+    created on first use and cached. The returned objects are shared between backtests and must be
+    treated as read-only.
+
+    Args:
+        data (DataFrame): loaded market data (must not be modified in place afterwards)
+        verbosity (int): verbosity of the MarketObjects handed out
+    """
+
+    def __init__(self, data, verbosity=1):
+        self.verbosity = verbosity
+        self.fingerprint = dataset_fingerprint(data)
+        self._stocks = _clean_market_frame(data)
+        if 'Year' in self._stocks.columns:
+            self._rows = self._stocks.groupby('Year', sort=True).indices
+        else:
+            self._rows = {}
+        self._markets = {}
+        self.screen_masks = ScreenMasks(self._stocks)
+
+    @property
+    def years(self):
+        """Years present in the data, ascending."""
+        return sorted(int(y) for y in self._rows)
+
+    def market(self, year, restrict_fossil_fuels=False, screens=None):
+        """
+        Cached MarketObject for `year` (empty if the year has no rows), restricted to
+        the rows passing every screen in `screens` (see screens.py).
+        """
+        screens = canonical_screens(screens)
+        key = (int(year), bool(restrict_fossil_fuels), tuple(s.key for s in screens))
+        market = self._markets.get(key)
+        if market is None:
+            if screens:
+                base = self.market(year, restrict_fossil_fuels)
+                keep = self.screen_masks.mask(screens)[base.rows]
+                market = MarketObject._from_stocks(base.stocks[keep], int(year), self.verbosity,
+                                                   fossil_free=base.fossil_free, universe=self,
+                                                   rows=base.rows[keep], screens=screens)
+            elif restrict_fossil_fuels:
+                market = self.market(year).without_fossil_fuels()
+            else:
+                rows = self._rows.get(year, np.empty(0, dtype=np.intp))
+                market = MarketObject._from_stocks(self._stocks.iloc[rows], int(year), self.verbosity,
+                                                   universe=self, rows=rows)
+            self._markets[key] = market
+        return market
+
+    def normalized_scores(self, restrict_fossil_fuels=False, screens=()):
+        """
+        (columns, matrix): `normalize_panel` z-scores of every FACTOR_DOCS column for
+        all years at once, one row per universe row (see MarketObject.rows). With
+        `restrict_fossil_fuels` or `screens` each year is normalized over its screened rows.
+        Kept in NORMALIZATION_CACHE under the dataset fingerprint.
+        """
+        screens = canonical_screens(screens)
+
+        def compute():
+            mask = _fossil_free_mask(self._stocks) if restrict_fossil_fuels else None
+            if screens:
+                screened = self.screen_masks.mask(screens)
+                mask = screened if mask is None else mask & screened
+            scores = normalize_panel(self._stocks, mask=mask)
+            return list(scores.columns), scores.to_numpy()
+        key = ('universe', self.fingerprint, bool(restrict_fossil_fuels), tuple(s.key for s in screens))
+        return NORMALIZATION_CACHE.get_or_compute(key, compute)
+
+    @classmethod
+    def of(cls, data, verbosity=1):
+        """
+        Shared universe for `data`, reused for as long as the same frame object is
+        alive (e.g. one Streamlit session's `rdata`). Build a new frame rather than
+        modifying `data` in place if its contents must change.
+        """
+        key = (id(data), verbosity)
+        entry = _UNIVERSES.get(key)
+        if entry is not None and entry[0]() is data:
+            return entry[1]
+        universe = cls(data, verbosity=verbosity)
+        _UNIVERSES[key] = (weakref.ref(data), universe)
+        weakref.finalize(data, _UNIVERSES.pop, key, None)
+        return universe
+
+
+# id(frame) -> (weakref to frame, MarketUniverse); entries are dropped when the frame is collected
+_UNIVERSES = {}
+
+
+def dataset_fingerprint(data):
+    """
+    Content hash of a loaded frame (column names, dtypes and every row), computed
+    once per frame object. Equal frames share a fingerprint, so caches keyed on it
+    (see `factor_utils.NORMALIZATION_CACHE`) survive reloading the same data.
+    Like `MarketUniverse.of`, assumes `data` is not modified in place afterwards.
+    """
+    key = id(data)
+    entry = _FINGERPRINTS.get(key)
+    if entry is not None and entry[0]() is data:
+        return entry[1]
+    digest = hashlib.sha1()
+    digest.update('\x1f'.join(f"{col}:{dtype}" for col, dtype in data.dtypes.items()).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(data, index=False).to_numpy().tobytes())
+    fingerprint = digest.hexdigest()[:16]
+    _FINGERPRINTS[key] = (weakref.ref(data), fingerprint)
+    weakref.finalize(data, _FINGERPRINTS.pop, key, None)
+    return fingerprint
+
+
+# id(frame) -> (weakref to frame, fingerprint)
+_FINGERPRINTS = {}
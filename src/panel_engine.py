@@ -0,0 +1,382 @@
+"""
+Vectorized panel backtest engine.
+
+`rebalance_portfolio` rebuilds two MarketObjects per year and prices every
+selected ticker through `get_price`. This module pivots the loaded frame once
+into a (year x ticker) price matrix, a (year x ticker) market-cap matrix and a
+(year x ticker x factor) score cube, then computes selections, weights and
+year-over-year growth for all years with NumPy array operations.
+
+The selection/weighting rules mirror `calculate_holdings` exactly (same
+normalization, same tie ordering, same duplicate-ticker resolution as
+`MarketObject.get_price`), so `rebalance_portfolio_panel` returns the same
+result dict as `rebalance_portfolio` up to floating-point summation order.
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+from .calculate_holdings import (
+    checkpoint_key, get_benchmark_return, load_checkpoint, save_checkpoint, summarize_backtest
+)
+from .factors_doc import FACTOR_DOCS
+from .factor_utils import normalize_panel, NORMALIZATION_CACHE
+from .market_object import _fossil_free_mask, _numeric, dataset_fingerprint
+from .screens import ScreenMasks, canonical_screens
+from . import profiling
+from .profiling import timed
+from . import diagnostics
+from .diagnostics import DEBUG, WARNING, count, enabled, event
+from .result_cache import RESULT_CACHE
+from .jobs import report_progress
+
+
+class PanelData:
+    """
+    Dense (year x ticker) view of a market data frame.
+
+    Attributes:
+        years (np.ndarray): consecutive calendar years covered by the panel
+        tickers (np.ndarray): sorted unique tickers (column axis)
+        factor_names (list[str]): factor column names (last axis of `scores`)
+        prices (np.ndarray): entry prices seen by the (possibly screened) current market, NaN if unpriced
+        exit_prices (np.ndarray): prices seen by the unscreened next-year market, NaN if unpriced
+        market_caps (np.ndarray): market capitalization of the first eligible row, NaN if missing
+        scores (np.ndarray): normalized factor scores (higher == better), NaN if unavailable
+        first_seen (np.ndarray): row order of a ticker's first scored row within its year (tie-breaker)
+    """
+
+    def __init__(self, years, tickers, factor_names, prices, exit_prices, market_caps, scores, first_seen):
+        self.years = years
+        self.tickers = tickers
+        self.factor_names = factor_names
+        self.prices = prices
+        self.exit_prices = exit_prices
+        self.market_caps = market_caps
+        self.scores = scores
+        self.first_seen = first_seen
+
+
+def _ticker_series(data):
+    # Same precedence as MarketObject: prefer 'Ticker', derive from 'Ticker-Region' otherwise
+    if 'Ticker' in data.columns:
+        return data['Ticker']
+    return data['Ticker-Region'].str.split('-').str[0].str.strip()
+
+
+def _first_per_cell(cells, values, n_cells, pick='first'):
+    """
+    Scatter `values` into a flat array of `n_cells`, keeping the first (or last)
+    row per cell in frame order. Cells without rows are NaN.
+    """
+    out = np.full(n_cells, np.nan)
+    if len(cells) == 0:
+        return out
+    if pick == 'first':
+        uniq, idx = np.unique(cells, return_index=True)
+    else:
+        uniq, idx = np.unique(cells[::-1], return_index=True)
+        idx = len(cells) - 1 - idx
+    out[uniq] = values[idx]
+    return out
+
+
+def panel_scores(data, factor_names=(), restrict_fossil_fuels=False, screens=()):
+    """
+    (columns, matrix): `normalize_panel` z-scores for every FACTOR_DOCS column (plus
+    any other requested factor column) over all years of `data`, one row per row
+    of `data`. Each year is normalized over its ticker rows (and, with
+    `restrict_fossil_fuels` or `screens`, the rows kept by the screens), which is the
+    universe `build_panel` ranks. Kept in NORMALIZATION_CACHE under the dataset
+    fingerprint, so panels for any window, percentage or weighting reuse it.
+    """
+    extra = tuple(sorted(col for col in set(factor_names) if col not in FACTOR_DOCS and col in data.columns))
+    screens = canonical_screens(screens)
+
+    def compute():
+        mask = _ticker_series(data).notna().to_numpy()
+        if restrict_fossil_fuels:
+            mask = mask & _fossil_free_mask(data)
+        if screens:
+            mask = mask & ScreenMasks.of(data).mask(screens)
+        columns = [col for col in FACTOR_DOCS if col in data.columns] + list(extra)
+        normed = normalize_panel(data, columns=columns, mask=mask)
+        return columns, normed.to_numpy()
+
+    key = ('panel', dataset_fingerprint(data), bool(restrict_fossil_fuels), extra, tuple(s.key for s in screens))
+    return NORMALIZATION_CACHE.get_or_compute(key, compute)
+
+
+@timed('build_panel')
+def build_panel(data, factors, start_year, end_year, restrict_fossil_fuels=False, screens=None):
+    """
+    Pivot `data` once into dense per-year arrays for the panel engine.
+
+    Args:
+        data (DataFrame): loaded market data with 'Year', 'Ending Price' and 'Ticker' or 'Ticker-Region'
+        factors (list): factor objects (anything with `column_name`) or column names
+        start_year (int): first rebalance year
+        end_year (int): last year (only its prices are needed)
+        restrict_fossil_fuels (bool): apply the calculate_holdings keyword screen to the current market
+        screens (list): universe screens (see screens.py), also applied to the current market only
+
+    Returns:
+        PanelData
+    """
+    factor_names = [getattr(f, 'column_name', str(f)) for f in factors]
+    years = np.arange(start_year, end_year + 1)
+
+    # Positions of the window's ticker rows in `data` (to index the precomputed scores)
+    positions = np.flatnonzero(((data['Year'] >= start_year) & (data['Year'] <= end_year)).to_numpy())
+    frame = data.iloc[positions]
+    tickers_raw = _ticker_series(frame)
+    has_ticker = tickers_raw.notna().to_numpy()
+    frame = frame.loc[has_ticker]
+    tickers_raw = tickers_raw.loc[has_ticker]
+    positions = positions[has_ticker]
+
+    # Stable sort by year so each year's rows keep their original frame order
+    year_pos = (frame['Year'].to_numpy(dtype=np.int64) - start_year)
+    order = np.argsort(year_pos, kind='stable')
+    year_pos = year_pos[order]
+    codes, tickers = pd.factorize(tickers_raw, sort=True)
+    codes = codes[order]
+    tickers = np.asarray(tickers, dtype=object)
+
+    n_years, n_tickers = len(years), len(tickers)
+    n_cells = n_years * n_tickers
+    cells = year_pos * n_tickers + codes
+
+    keep = _fossil_free_mask(frame)[order] if restrict_fossil_fuels else np.ones(len(frame), dtype=bool)
+    if screens:
+        keep &= ScreenMasks.of(data).mask(screens)[positions[order]]
+
+    def numeric(col):
+        if col not in frame.columns:
+            return np.full(len(frame), np.nan)
+        return _numeric(frame[col]).to_numpy(dtype=float, na_value=np.nan)[order]
+
+    # Prices follow get_price: first non-NaN row per ticker, then invalid if <= 0
+    price_rows = numeric('Ending Price')
+
+    def resolve_prices(row_mask):
+        valid = row_mask & ~np.isnan(price_rows)
+        resolved = _first_per_cell(cells[valid], price_rows[valid], n_cells)
+        resolved[~(resolved > 0)] = np.nan
+        return resolved.reshape(n_years, n_tickers)
+
+    prices = resolve_prices(keep)
+    exit_prices = resolve_prices(np.ones(len(frame), dtype=bool))
+
+    # Market cap follows `.loc[ticker, col].iloc[0]`: first eligible row, even if NaN
+    cap_rows = numeric('Market Capitalization')
+    market_caps = _first_per_cell(cells[keep], cap_rows[keep], n_cells).reshape(n_years, n_tickers)
+
+    scores = np.full((n_years, n_tickers, len(factor_names)), np.nan)
+    first_seen = np.full((n_years, n_tickers, len(factor_names)), np.inf)
+    row_rank = np.arange(len(frame), dtype=float)
+
+    columns, matrix = panel_scores(data, factor_names, restrict_fossil_fuels=restrict_fossil_fuels, screens=screens)
+    frame_rows = positions[order]
+    for f, col in enumerate(factor_names):
+        if col not in columns:
+            continue
+        normed = matrix[frame_rows, columns.index(col)]
+        # dict(normed.dropna()) semantics: value of the last row, position of the first
+        scored = ~np.isnan(normed)
+        scores[:, :, f] = _first_per_cell(cells[scored], normed[scored], n_cells, pick='last').reshape(n_years, n_tickers)
+        first_seen[:, :, f] = _first_per_cell(cells[scored], row_rank[scored], n_cells).reshape(n_years, n_tickers)
+
+    first_seen[np.isnan(first_seen)] = np.inf
+    return PanelData(years, tickers, factor_names, prices, exit_prices, market_caps, scores, first_seen)
+
+
+@timed('select')
+def select_mask(scores, first_seen, top_pct=10, which='top'):
+    """
+    Boolean (year x ticker) selection mask for one factor.
+
+    Ranks by score descending with first appearance as the tie-breaker (the
+    stable `sorted(..., reverse=True)` order used by calculate_holdings) and
+    keeps the top or bottom `top_pct`% of scored tickers in every year at once.
+    """
+    valid = ~np.isnan(scores)
+    neg = np.where(valid, -scores, np.inf)
+    ranks = np.argsort(np.lexsort((first_seen, neg), axis=-1), axis=-1)
+
+    n_valid = valid.sum(axis=-1)
+    n_select = np.array([max(1, math.floor(n * (top_pct / 100.0))) if n else 0 for n in n_valid])[:, None]
+    if which == 'top':
+        return ranks < n_select
+    return (ranks >= n_valid[:, None] - n_select) & (ranks < n_valid[:, None])
+
+
+@timed('growth')
+def factor_year_growth(panel, selected, use_market_cap_weight=False):
+    """
+    Per-dollar start and end values of one factor sleeve for every year.
+
+    Returns:
+        (start, end): arrays of shape (n_years - 1,). `start` is 1 where the
+        sleeve is invested and 0 where it holds nothing; `end` is the value of
+        one invested dollar at the next year's prices (entry price when missing).
+    """
+    entry = panel.prices[:-1]
+    exit_ = panel.exit_prices[1:]
+    held = selected[:-1] & ~np.isnan(entry)
+    gross = np.where(np.isnan(exit_), 1.0, exit_ / np.where(held, entry, 1.0))
+
+    weights = held.astype(float)
+    n_held = weights.sum(axis=1, keepdims=True)
+    weights = np.divide(weights, n_held, out=np.zeros_like(weights), where=n_held > 0)
+
+    if use_market_cap_weight:
+        caps = panel.market_caps[:-1]
+        cap_ok = held & (caps > 0)
+        cap_w = np.where(cap_ok, caps, 0.0)
+        total = cap_w.sum(axis=1, keepdims=True)
+        cap_w = np.divide(cap_w, total, out=np.zeros_like(cap_w), where=total > 0)
+        use_caps = cap_ok.any(axis=1, keepdims=True)
+        weights = np.where(use_caps, cap_w, weights)
+
+    start = (weights.sum(axis=1) > 0).astype(float)
+    end = np.where(held, weights * gross, 0.0).sum(axis=1)
+    return start, end
+
+
+def rebalance_portfolio_panel(data, factors, start_year, end_year, initial_aum, verbosity=0,
+                              restrict_fossil_fuels=False, top_pct=10, which='top',
+                              use_market_cap_weight=False, panel=None, screens=None, profile=False, on_year=None):
+    """
+    Drop-in replacement for `rebalance_portfolio` backed by `PanelData`.
+
+    Accepts the same arguments (plus an optional prebuilt `panel`) and returns
+    the same result dict. Without a prebuilt panel, yearly records are kept in
+    `calculate_holdings.BACKTEST_CHECKPOINTS` and a rerun that only extends
+    `end_year` builds a panel for the new years alone, and the finished result
+    is memoized in `result_cache.RESULT_CACHE`. `profile` (adds 'timings' and
+    'counters') and `on_year` work as in `rebalance_cohorts`; the years are
+    computed in one vectorized pass, so the callback runs after it and an early
+    stop only truncates the result.
+    """
+    if profile:
+        with profiling.profile() as profiler, diagnostics.counting() as counts, \
+                profiling.stage('rebalance', rows=len(data)):
+            result = rebalance_portfolio_panel(data, factors, start_year, end_year, initial_aum, verbosity=verbosity,
+                                               restrict_fossil_fuels=restrict_fossil_fuels, top_pct=top_pct,
+                                               which=which, use_market_cap_weight=use_market_cap_weight,
+                                               panel=panel, screens=screens, on_year=on_year)
+        if isinstance(profile, str):
+            profiler.write_chrome_trace(profile)
+        result['timings'] = profiler.summary()
+        result['counters'] = dict(counts)
+        return result
+
+    verbosity = 0 if verbosity is None else verbosity
+    records = []
+    key = None
+    if panel is None:
+        key = checkpoint_key('panel', dataset_fingerprint(data), factors, start_year, initial_aum,
+                             restrict_fossil_fuels, screens, which, top_pct, use_market_cap_weight)
+        result = RESULT_CACHE.get(key + (int(end_year),)) if on_year is None else None
+        if result is not None:
+            return result
+        records = load_checkpoint(key, end_year - start_year)
+    resume_year = start_year + len(records)
+    aum = records[-1][3] if records else initial_aum
+    report_progress(len(records), end_year - start_year)
+    if resume_year < end_year:
+        if panel is None:
+            panel = build_panel(data, factors, resume_year, end_year, restrict_fossil_fuels=restrict_fossil_fuels,
+                                screens=screens)
+        records.extend(_panel_records(panel, len(factors), resume_year, end_year, aum, top_pct, which,
+                                      use_market_cap_weight, verbosity))
+        if key is not None:
+            save_checkpoint(key, records)
+        report_progress(len(records), end_year - start_year)
+
+    years = [start_year]
+    portfolio_returns = []
+    benchmark_returns = []
+    portfolio_values = [initial_aum]
+    for year, growth, start_value, end_value, holdings in records:
+        if verbosity >= 2:
+            print(f"Year {year} to {year + 1}: Growth: {growth:.2%}, "
+                  f"Start Value: ${start_value:.2f}, End Value: ${end_value:.2f}")
+        portfolio_returns.append(growth)
+        benchmark_returns.append(get_benchmark_return(year))
+        portfolio_values.append(end_value)
+        years.append(year + 1)
+        if on_year is not None and on_year({
+            'cohort': which, 'year': year, 'growth': growth, 'start_value': start_value, 'end_value': end_value,
+            'holdings': holdings, 'benchmark_return': benchmark_returns[-1],
+        }):
+            break
+
+    aum = portfolio_values[-1]
+    # An early stop ends the result at the last reported year
+    result = summarize_backtest(
+        initial_aum, aum, start_year, years[-1], years,
+        portfolio_returns, benchmark_returns, portfolio_values,
+        verbosity=verbosity
+    )
+    if key is not None and years[-1] == end_year:
+        RESULT_CACHE.put(key + (int(end_year),), result)
+    return result
+
+
+def _panel_records(panel, n_factors, start_year, end_year, initial_aum, top_pct, which, use_market_cap_weight,
+                   verbosity):
+    """
+    (year, growth, start_value, end_value, holdings) for every year of `panel` from `start_year`, starting at
+    `initial_aum`. `holdings` counts positions across factor sleeves, as `rebalance_portfolio`'s portfolios hold them.
+    """
+    n_steps = max(0, end_year - start_year)
+    starts = np.zeros(n_steps)
+    ends = np.zeros(n_steps)
+    holdings = np.zeros(n_steps, dtype=np.int64)
+    for f in range(len(panel.factor_names)):
+        selected = select_mask(panel.scores[:, :, f], panel.first_seen[:, :, f], top_pct=top_pct, which=which)
+        held = _held(panel, selected, use_market_cap_weight)
+        if n_steps:
+            unpriced = selected[:-1].any(axis=1) & ~(selected[:-1] & ~np.isnan(panel.prices[:-1])).any(axis=1)
+            count('empty_portfolio', int(np.count_nonzero(unpriced)))
+            for y in np.flatnonzero(unpriced):
+                if use_market_cap_weight:
+                    event(WARNING, 'empty_portfolio', "Warning: No valid priced tickers for year %s; returning empty portfolio.", panel.years[y])
+                else:
+                    event(WARNING, 'empty_portfolio', "Warning: No valid priced tickers for equal-weighting in year %s; returning empty portfolio.", panel.years[y])
+            # Same counters as the MarketObject loop (see calculate_growth)
+            missing = held & np.isnan(panel.exit_prices[1:])
+            count('exit_missing', int(np.count_nonzero(missing)))
+            if verbosity == 3 and enabled(DEBUG):
+                for y, t in zip(*np.nonzero(missing)):
+                    event(DEBUG, 'exit_missing', "%s - Missing in %s, liquidating at entry price: %s",
+                          panel.tickers[t], panel.years[y + 1], panel.prices[y, t])
+        s, e = factor_year_growth(panel, selected, use_market_cap_weight=use_market_cap_weight)
+        starts += s
+        ends += e
+        holdings += held.sum(axis=1)
+
+    # AUM is split equally across factor sleeves each year, so the whole path is a running product
+    # (compounded left to right, so resuming from a checkpointed AUM gives the same values)
+    step = ends / n_factors if n_factors else np.zeros(n_steps)
+    values = np.cumprod(np.concatenate(([initial_aum], step)))
+    start_values = values[:-1] * starts / n_factors if n_factors else np.zeros(n_steps)
+    end_values = values[1:]
+    growth = np.divide(end_values - start_values, start_values,
+                       out=np.zeros(n_steps), where=start_values != 0)
+    return [
+        (year, float(growth[i]), float(start_values[i]), float(end_values[i]), int(holdings[i]))
+        for i, year in enumerate(range(start_year, end_year))
+    ]
+
+
+def _held(panel, selected, use_market_cap_weight=False):
+    """(n_years - 1, n_tickers) mask of the positions one factor sleeve holds (nonzero `factor_year_growth` weight)."""
+    held = selected[:-1] & ~np.isnan(panel.prices[:-1])
+    if use_market_cap_weight:
+        cap_ok = held & (panel.market_caps[:-1] > 0)
+        held = np.where(cap_ok.any(axis=1, keepdims=True), cap_ok, held)
+    return held
@@ -1,31 +1,69 @@
+import numpy as np
+
+
 class Portfolio:
+    """
+    Holdings stored as parallel arrays: `tickers` (object) and `shares` (float64).
+    `investments` is the list-of-dicts view ({'ticker', 'number_of_shares'}).
+    `present_value` prices the holdings with `market.get_prices(tickers)` (one
+    vectorized lookup) or, for markets without it, `market.get_price(ticker)`.
+    """
+    __slots__ = ('name', 'tickers', 'shares')
+
     ### Initialize portfolio by providing a name and a list of investments ###
     def __init__(self, name, investments=None):
         self.name = name
+        self.tickers = np.empty(0, dtype=object)
+        self.shares = np.empty(0, dtype=float)
         if investments is not None:
             self.investments = investments
-        else:
-            self.investments = []
+
+    ### List-of-dicts view of the holdings (a new list on every access) ###
+    @property
+    def investments(self):
+        return [
+            {'ticker': ticker, 'number_of_shares': shares}
+            for ticker, shares in zip(self.tickers.tolist(), self.shares.tolist())
+        ]
+
+    @investments.setter
+    def investments(self, investments):
+        self.tickers = np.array([inv['ticker'] for inv in investments], dtype=object)
+        self.shares = np.array([inv['number_of_shares'] for inv in investments], dtype=float)
+
+    def __len__(self):
+        return len(self.tickers)
 
     ### Add a stock to the portfolio ###
     def add_investment(self, ticker, nShares):
-        investment = {'ticker': ticker, 'number_of_shares': nShares}
-        self.investments.append(investment)
+        self.add_investments([ticker], [nShares])
+
+    ### Add several stocks at once (parallel sequences of tickers and share counts) ###
+    def add_investments(self, tickers, shares):
+        tickers = np.array(list(tickers), dtype=object)
+        shares = np.asarray(shares, dtype=float)
+        if len(tickers) != len(shares):
+            raise ValueError('tickers and shares must have the same length')
+        self.tickers = np.concatenate([self.tickers, tickers])
+        self.shares = np.concatenate([self.shares, shares])
 
     ### Remove a stock from the portfolio ###
     def remove_investment(self, ticker):
-        self.investments = [
-            inv for inv in self.investments if inv['ticker'] != ticker
-        ]
+        keep = self.tickers != ticker
+        self.tickers = self.tickers[keep]
+        self.shares = self.shares[keep]
 
     ### Calculate portfolio value ###
     def present_value(self, market):
-        total_value = 0
-        for inv in self.investments:
-            price = market.get_price(inv['ticker'])
-            if price is not None:
-                total_value += price * inv['number_of_shares']
-        return total_value
+        if len(self.tickers) == 0:
+            return 0
+        # Unpriced holdings (NaN / None) contribute nothing
+        if hasattr(market, 'get_prices'):
+            prices = market.get_prices(self.tickers)
+        else:
+            # Markets that only price one ticker at a time
+            prices = np.array([market.get_price(t) for t in self.tickers.tolist()], dtype=float)
+        return float(self.shares @ np.nan_to_num(prices, nan=0.0))
 
     ### Calculate return for the portfolio ###
     def calculate_return(self, t1_value, t2_value):
@@ -33,4 +71,3 @@ class Portfolio:
             return (t2_value - t1_value) / t1_value * 100
         else:
             raise ValueError('Value at time 1 is 0')
-
@@ -0,0 +1,169 @@
+"""
+Opt-in per-stage timing for the load / backtest pipeline.
+
+Pipeline functions are wrapped with `timed(stage)` (or use `stage(...)` as a
+context manager around a block). While no profiler is active these cost one
+context-variable lookup per call. Inside `with profile() as profiler:` every
+call records its wall time and, where the result has a length (frames,
+arrays, portfolios), its row count:
+
+    with profile() as profiler:
+        rebalance_portfolio(rdata, factors, 2002, 2023, 1000)
+    profiler.summary()                      # {'normalize': {'seconds': ..., 'calls': ..., 'rows': ...}, ...}
+    profiler.write_chrome_trace('trace.json')  # open in chrome://tracing or ui.perfetto.dev
+
+`rebalance_portfolio`, `rebalance_cohorts` and `rebalance_portfolio_panel`
+take `profile=True` (or a trace path) and add the summary to their result
+dict under 'timings' (and the run's diagnostics counters under 'counters').
+"""
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+
+# Innermost active Profiler of the current context (None: instrumentation is off)
+_ACTIVE = contextvars.ContextVar('factor_lake_profiler', default=None)
+
+
+class Profiler:
+    """
+    Collects (stage, start, end, rows) spans. Spans are also forwarded to the
+    profiler that was active when this one started, so nested profiles add up.
+    """
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.origin = time.perf_counter()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def record(self, name, start, end, rows=None):
+        with self._lock:
+            self.spans.append((name, start, end, rows, threading.get_ident()))
+        if self.parent is not None:
+            self.parent.record(name, start, end, rows)
+
+    def summary(self):
+        """Per-stage totals in first-seen order: {stage: {'seconds', 'calls', 'rows'}} (time is inclusive)."""
+        totals = {}
+        with self._lock:
+            spans = list(self.spans)
+        for name, start, end, rows, _ in spans:
+            entry = totals.setdefault(name, {'seconds': 0.0, 'calls': 0, 'rows': 0})
+            entry['seconds'] += end - start
+            entry['calls'] += 1
+            entry['rows'] += rows or 0
+        return totals
+
+    def chrome_trace(self):
+        """Spans as a Chrome trace-event document (complete 'X' events, microseconds)."""
+        pid = os.getpid()
+        with self._lock:
+            spans = list(self.spans)
+        events = [
+            {
+                'name': name, 'cat': 'factor_lake', 'ph': 'X', 'pid': pid, 'tid': tid,
+                'ts': (start - self.origin) * 1e6, 'dur': (end - start) * 1e6,
+                'args': {} if rows is None else {'rows': rows},
+            }
+            for name, start, end, rows, tid in spans
+        ]
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write_chrome_trace(self, path):
+        with open(path, 'w', encoding='utf-8') as fh:
+            json.dump(self.chrome_trace(), fh)
+
+
+class profile:
+    """Context manager activating a new Profiler for the enclosed block (and the calls it makes)."""
+
+    def __enter__(self):
+        self.profiler = Profiler(parent=_ACTIVE.get())
+        self._token = _ACTIVE.set(self.profiler)
+        return self.profiler
+
+    def __exit__(self, *exc):
+        _ACTIVE.reset(self._token)
+        return False
+
+
+def active_profiler():
+    """The innermost active Profiler, or None."""
+    return _ACTIVE.get()
+
+
+def _rows(result):
+    if isinstance(result, (tuple, dict, str)):
+        return None
+    try:
+        return len(result)
+    except TypeError:
+        return None
+
+
+class _Stage:
+    __slots__ = ('profiler', 'name', 'rows', 'start')
+
+    def __init__(self, profiler, name, rows):
+        self.profiler = profiler
+        self.name = name
+        self.rows = rows
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, self.start, time.perf_counter(), self.rows)
+        return False
+
+
+class _NullStage:
+    """Shared no-op stage used while profiling is off; attribute writes (e.g. `rows`) are ignored."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name, rows=None):
+    """
+    Context manager timing the enclosed block as `name`. Set `.rows` on the
+    returned object to record a row count known only at the end.
+    """
+    profiler = _ACTIVE.get()
+    if profiler is None:
+        return _NULL_STAGE
+    return _Stage(profiler, name, rows)
+
+
+def timed(name):
+    """Decorator recording each call as stage `name` (rows: length of the result, when it has one)."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            profiler = _ACTIVE.get()
+            if profiler is None:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            result = None
+            try:
+                result = func(*args, **kwargs)
+                return result
+            finally:
+                profiler.record(name, start, time.perf_counter(), _rows(result))
+        return wrapper
+    return decorate
+
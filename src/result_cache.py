@@ -0,0 +1,159 @@
+"""
+Memoized backtest result dicts.
+
+Streamlit reruns the script on every widget change and the Results / Cohort
+tabs call the backtests again with the same arguments. `rebalance_cohorts`
+and `rebalance_portfolio_panel` look their full configuration (dataset
+fingerprint, factors, years, AUM, fossil flag, screens, cohort / `which`,
+`top_pct`, weighting) up in RESULT_CACHE first, so an identical rerun returns
+the stored result dicts without touching the data.
+
+Entries live in an in-memory LRU and, when a directory is set (`directory`
+argument or the FACTOR_LAKE_RESULT_CACHE_DIR env var), also as one JSON file
+per configuration so results survive restarts. The files hold data only
+(never pickle), so a writable cache folder cannot run code in the app.
+Callers always get their own deep copy. A cache hit skips the year-by-year
+and summary printing.
+"""
+import copy
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .diagnostics import WARNING, event
+
+# Bump when the result dict layout changes so stale files are ignored
+RESULT_FORMAT_VERSION = 2
+
+
+def _to_json(obj):
+    # Tuples and dicts with non-string keys (cohort specs, cache keys) are tagged so they round-trip
+    if isinstance(obj, dict):
+        if all(isinstance(k, str) for k in obj):
+            return {k: _to_json(v) for k, v in obj.items()}
+        return {'__items__': [[_to_json(k), _to_json(v)] for k, v in obj.items()]}
+    if isinstance(obj, tuple):
+        return {'__tuple__': [_to_json(v) for v in obj]}
+    if isinstance(obj, list):
+        return [_to_json(v) for v in obj]
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if obj is None or isinstance(obj, (str, int, float, bool)):
+        return obj
+    raise TypeError(f"cannot store {type(obj).__name__} in the result cache")
+
+
+def _from_json(obj):
+    if isinstance(obj, dict):
+        if '__tuple__' in obj:
+            return tuple(_from_json(v) for v in obj['__tuple__'])
+        if '__items__' in obj:
+            return {_from_json(k): _from_json(v) for k, v in obj['__items__']}
+        return {k: _from_json(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_from_json(v) for v in obj]
+    return obj
+
+
+class ResultCache:
+    """
+    Bounded, thread-safe LRU of backtest results with an optional on-disk store.
+
+    Args:
+        maxsize (int): results kept in memory
+        directory (str): folder for persisted results (None: memory only)
+    """
+
+    def __init__(self, maxsize=64, directory=None):
+        self.maxsize = maxsize
+        self.directory = directory
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        digest = hashlib.sha1(repr((RESULT_FORMAT_VERSION, key)).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f'{digest}.json')
+
+    def get(self, key):
+        """A copy of the result stored for `key` (memory first, then disk), or None."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(self._entries[key])
+        value = self._read(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._store(key, value)
+        return copy.deepcopy(value)
+
+    def put(self, key, value):
+        """Store a copy of `value` under `key` (and on disk when a directory is set)."""
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._store(key, value)
+        self._write(key, value)
+
+    def _store(self, key, value):
+        # Caller holds self._lock
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def _read(self, key):
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as fh:
+                stored = _from_json(json.load(fh))
+            stored_key, value = stored['key'], stored['value']
+        except (OSError, ValueError, TypeError, KeyError):
+            return None
+        # Guard against digest collisions
+        return value if stored_key == key else None
+
+    def _write(self, key, value):
+        if not self.directory:
+            return
+        try:
+            payload = json.dumps(_to_json({'key': key, 'value': value}))
+            os.makedirs(self.directory, exist_ok=True)
+            # Write then rename so concurrent readers never see a partial file
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+                fh.write(payload)
+            os.replace(tmp, self._path(key))
+        except (OSError, TypeError) as e:
+            event(WARNING, 'result_cache_write_failed', "Warning: could not persist backtest result to %s: %s", self.directory, e)
+
+    def clear(self, disk=False):
+        """Drop the in-memory entries (and the persisted files when `disk`)."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.disk_hits = self.misses = 0
+        if disk and self.directory and os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith('.json'):
+                    os.remove(os.path.join(self.directory, name))
+
+    def info(self):
+        """Hit/miss counters and current size."""
+        with self._lock:
+            return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+                    'size': len(self._entries), 'maxsize': self.maxsize, 'directory': self.directory}
+
+
+# Process-wide result cache used by rebalance_cohorts and rebalance_portfolio_panel
+RESULT_CACHE = ResultCache(directory=os.environ.get('FACTOR_LAKE_RESULT_CACHE_DIR') or None)
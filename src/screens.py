@@ -0,0 +1,242 @@
+"""
+Universe screens evaluated once per dataset into bitmasks.
+
+A screen decides, row by row, whether a stock may be ranked at all (sector
+membership, an industry exclusion, a liquidity / size / price floor).
+`ScreenMasks` evaluates each distinct screen over a frame once and stores
+the result as one bit of a packed uint64 word per row, so any combination of
+screens is a bitwise AND of already-computed bits. Toggling screens in the UI
+therefore costs an array comparison instead of a rescan of the frame.
+
+Screens only restrict the *current* market that gets ranked; like the fossil
+fuel restriction, the next-year market used to price holdings is unscreened.
+"""
+import re
+import threading
+import weakref
+from abc import ABC, abstractmethod
+
+import numpy as np
+import pandas as pd
+
+from .diagnostics import WARNING, event
+
+SECTOR_COLUMN = "Scott's Sector (5)"
+INDUSTRY_COLUMN = 'FactSet Industry'
+VOLUME_COLUMN = 'Avg Daily 3-Mo Volume Mills $'
+MARKET_CAP_COLUMN = 'Market Capitalization'
+PRICE_COLUMN = 'Ending Price'
+
+# Keyword screen used for restrict_fossil_fuels (matched against the lower-cased industry)
+FOSSIL_KEYWORDS = ['oil', 'gas', 'coal', 'energy', 'fossil']
+_FOSSIL_PATTERN = re.compile('|'.join(FOSSIL_KEYWORDS))
+
+# Boolean column added by load_data: True where 'FactSet Industry' matches FOSSIL_KEYWORDS
+FOSSIL_FLAG_COLUMN = 'Fossil Fuel'
+
+
+def _keyword_flags(industry, pattern):
+    """True where the lower-cased industry matches `pattern` (missing industries are not flagged)."""
+    if isinstance(industry.dtype, pd.CategoricalDtype):
+        # Screen each category once and broadcast through the codes
+        category_hits = industry.cat.categories.astype(str).str.lower().str.contains(pattern)
+        codes = industry.cat.codes.to_numpy()
+        return np.where(codes >= 0, np.asarray(category_hits, dtype=bool)[np.maximum(codes, 0)], False)
+    hits = industry.astype(str).str.lower().str.contains(pattern, na=False)
+    return hits.to_numpy(dtype=bool)
+
+
+def fossil_fuel_flags(industry):
+    """
+    True where an industry matches FOSSIL_KEYWORDS (missing industries are not flagged).
+    Categorical industries are screened once per category and broadcast through the codes.
+    """
+    return _keyword_flags(industry, _FOSSIL_PATTERN)
+
+
+class Screen(ABC):
+    """
+    Base class for universe screens.
+
+    Subclasses implement `keep(frame)` (boolean ndarray, True for rows that pass)
+    and `key` (hashable description). Screens with equal keys are interchangeable,
+    which is what lets `ScreenMasks` and the normalization cache reuse results.
+    """
+
+    @property
+    @abstractmethod
+    def key(self):
+        """Hashable description; equal keys mean equal results."""
+
+    @abstractmethod
+    def keep(self, frame):
+        """Boolean ndarray over the rows of `frame`, True for rows that pass."""
+
+    def __eq__(self, other):
+        return isinstance(other, Screen) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return f"{type(self).__name__}{self.key[1:]!r}"
+
+
+class SectorScreen(Screen):
+    """Keep rows whose "Scott's Sector (5)" is one of `sectors`."""
+
+    def __init__(self, sectors, column=SECTOR_COLUMN):
+        self.sectors = tuple(sorted(set(sectors)))
+        self.column = column
+
+    @property
+    def key(self):
+        return ('sector', self.column, self.sectors)
+
+    def keep(self, frame):
+        if self.column not in frame.columns:
+            event(WARNING, 'screen_skipped', "Warning: '%s' column not found. Sector screen skipped.", self.column)
+            return np.ones(len(frame), dtype=bool)
+        return frame[self.column].isin(self.sectors).to_numpy(dtype=bool)
+
+
+class IndustryExclusionScreen(Screen):
+    """
+    Drop rows whose 'FactSet Industry' contains any of `keywords` (case-insensitive).
+    With the default FOSSIL_KEYWORDS the load-time FOSSIL_FLAG_COLUMN is used when present.
+    """
+
+    def __init__(self, keywords=FOSSIL_KEYWORDS, column=INDUSTRY_COLUMN):
+        self.keywords = tuple(sorted({k.lower() for k in keywords}))
+        self.column = column
+
+    @property
+    def key(self):
+        return ('industry', self.column, self.keywords)
+
+    def keep(self, frame):
+        if self.keywords == tuple(sorted(FOSSIL_KEYWORDS)) and FOSSIL_FLAG_COLUMN in frame.columns:
+            return ~frame[FOSSIL_FLAG_COLUMN].to_numpy(dtype=bool)
+        if self.column not in frame.columns:
+            event(WARNING, 'screen_skipped', "Warning: '%s' column not found. Industry screen skipped.", self.column)
+            return np.ones(len(frame), dtype=bool)
+        pattern = re.compile('|'.join(re.escape(k) for k in self.keywords))
+        return ~_keyword_flags(frame[self.column], pattern)
+
+
+class MinimumScreen(Screen):
+    """Keep rows where `column` >= `minimum`; missing or non-numeric values fail the screen."""
+
+    def __init__(self, column, minimum):
+        self.column = column
+        self.minimum = float(minimum)
+
+    @property
+    def key(self):
+        return ('minimum', self.column, self.minimum)
+
+    def keep(self, frame):
+        if self.column not in frame.columns:
+            event(WARNING, 'screen_skipped', "Warning: '%s' column not found. Minimum screen skipped.", self.column)
+            return np.ones(len(frame), dtype=bool)
+        values = pd.to_numeric(frame[self.column], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+        return values >= self.minimum
+
+
+def min_volume(millions):
+    """Liquidity floor on average daily 3-month dollar volume (in $ millions)."""
+    return MinimumScreen(VOLUME_COLUMN, millions)
+
+
+def min_market_cap(minimum):
+    """Size floor on 'Market Capitalization'."""
+    return MinimumScreen(MARKET_CAP_COLUMN, minimum)
+
+
+def min_price(minimum):
+    """Price floor on 'Ending Price'."""
+    return MinimumScreen(PRICE_COLUMN, minimum)
+
+
+FOSSIL_SCREEN = IndustryExclusionScreen()
+
+
+def screen_columns(screens):
+    """Frame columns the given screens read."""
+    columns = [s.column for s in screens or () if getattr(s, 'column', None)]
+    if any(isinstance(s, IndustryExclusionScreen) for s in screens or ()):
+        columns.append(FOSSIL_FLAG_COLUMN)
+    return list(dict.fromkeys(columns))
+
+
+def canonical_screens(screens):
+    """`screens` as a duplicate-free tuple in a stable order (usable in cache keys)."""
+    return tuple(sorted(set(screens or ()), key=lambda s: repr(s.key)))
+
+
+class ScreenMasks:
+    """
+    Packed per-row screen results for one frame.
+
+    Each distinct screen is evaluated once, on first use, and stored as one bit
+    of a uint64 word per row (64 screens per word, more words as needed).
+    `mask(screens)` ANDs the requested bits. Holds only a weak reference to the
+    frame, which must not be modified in place afterwards.
+    """
+
+    def __init__(self, frame):
+        self._frame = weakref.ref(frame)
+        self.n_rows = len(frame)
+        self._words = []
+        self._bits = {}
+        self._lock = threading.Lock()
+
+    def _bit(self, screen):
+        bit = self._bits.get(screen.key)
+        if bit is not None:
+            return bit
+        with self._lock:
+            bit = self._bits.get(screen.key)
+            if bit is None:
+                frame = self._frame()
+                if frame is None:
+                    raise ReferenceError('the frame behind these screen masks no longer exists')
+                keep = np.asarray(screen.keep(frame), dtype=bool)
+                bit = len(self._bits)
+                if bit % 64 == 0:
+                    self._words.append(np.zeros(self.n_rows, dtype=np.uint64))
+                self._words[bit // 64] |= keep.astype(np.uint64) << np.uint64(bit % 64)
+                self._bits[screen.key] = bit
+        return bit
+
+    def mask(self, screens):
+        """Boolean array of rows passing every screen in `screens` (all True for none)."""
+        required = {}
+        for screen in canonical_screens(screens):
+            bit = self._bit(screen)
+            required[bit // 64] = required.get(bit // 64, 0) | (1 << (bit % 64))
+        keep = np.ones(self.n_rows, dtype=bool)
+        for word, bits in required.items():
+            bits = np.uint64(bits)
+            keep &= (self._words[word] & bits) == bits
+        return keep
+
+    def info(self):
+        """Number of screens evaluated so far."""
+        return {'screens': len(self._bits), 'rows': self.n_rows}
+
+    @classmethod
+    def of(cls, frame):
+        """Shared masks for `frame`, reused for as long as the same frame object is alive."""
+        key = id(frame)
+        entry = _SCREEN_MASKS.get(key)
+        if entry is not None and entry[0]() is frame:
+            return entry[1]
+        masks = cls(frame)
+        _SCREEN_MASKS[key] = (weakref.ref(frame), masks)
+        weakref.finalize(frame, _SCREEN_MASKS.pop, key, None)
+        return masks
+
+
+# id(frame) -> (weakref to frame, ScreenMasks); entries are dropped when the frame is collected
+_SCREEN_MASKS = {}
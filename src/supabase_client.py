@@ -1,16 +1,20 @@
 import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 from supabase import create_client, Client
 
-def load_supabase_data(table_name='Full Precision Test', show_progress=True, sectors=None):
+from .diagnostics import INFO, WARNING, count, event
+
+# PostgREST caps a single response at 1,000 rows by default
+PAGE_SIZE = 1000
+
+
+def get_supabase_client():
     """
-    Loads data from a Supabase table and returns it as a pandas DataFrame.
-    Credentials are read from environment variables or Colab userdata.
-    Uses pagination to load all records.
-    
-    Args:
-        table_name (str): Name of the Supabase table to load
-        show_progress (bool): Whether to print loading progress messages
+    Create a Supabase client from SUPABASE_URL / SUPABASE_KEY (environment
+    variables or Colab userdata).
     """
     supabase_url = os.environ.get('SUPABASE_URL')
     supabase_key = os.environ.get('SUPABASE_KEY')
@@ -23,270 +27,267 @@ def load_supabase_data(table_name='Full Precision Test', show_progress=True, sec
             pass
     if not supabase_url or not supabase_key:
         raise RuntimeError('Supabase credentials not set. Please set SUPABASE_URL and SUPABASE_KEY.')
+    return create_client(supabase_url, supabase_key)
+
+
+def year_date_range(start_year=None, end_year=None):
+    """ISO date bounds ('YYYY-01-01', 'YYYY-12-31') covering start_year..end_year; either side may be None."""
+    start_date = f"{int(start_year)}-01-01" if start_year is not None else None
+    end_date = f"{int(end_year)}-12-31" if end_year is not None else None
+    return start_date, end_date
+
+
+def _quote_column(name):
+    """Double-quote column names PostgREST can't parse bare (e.g. containing '-' or '/')."""
+    return name if re.fullmatch(r'[A-Za-z_][A-Za-z0-9_]*', name) else f'"{name}"'
+
+
+def _execute_with_retry(build_request, max_retries=3, backoff=0.5):
+    """Execute a query built by `build_request()`, retrying with exponential backoff."""
+    for attempt in range(max_retries + 1):
+        try:
+            return build_request().execute()
+        except Exception:
+            if attempt == max_retries:
+                raise
+            time.sleep(backoff * (2 ** attempt))
+
+
+def load_supabase_data(table_name='Full Precision Test', show_progress=True, sectors=None, min_id=None,
+                       parallel=True, max_workers=8, max_retries=3, order_by='ID', columns=None,
+                       start_date=None, end_date=None):
+    """
+    Loads data from a Supabase table and returns it as a pandas DataFrame.
+    Credentials are read from environment variables or Colab userdata.
+    Uses pagination to load all records.
+
+    In parallel mode the matching row count is fetched first and the pages are
+    requested concurrently from a bounded thread pool, then reassembled in
+    order. Pages are ordered by `order_by` so they are deterministic.
     
-    supabase = create_client(supabase_url, supabase_key)
-    
-    # Paginate through all records
-    page_size = 1000
-    offset = 0
-    all_rows = []
-    
-    if show_progress:
-        print(f"Loading data from Supabase table '{table_name}'...")
-    
-    while True:
-        # Build base query
-        base_query = supabase.table(table_name).select('*')
+    Args:
+        table_name (str): Name of the Supabase table to load
+        show_progress (bool): Whether to print loading progress messages
+        sectors (list): Optional server-side filter on the sector column
+        min_id: If provided, only rows with ID strictly greater than this value are
+            fetched (incremental refresh of a local cache)
+        parallel (bool): Fetch pages concurrently (falls back to sequential if the count is unavailable)
+        max_workers (int): Maximum concurrent page requests
+        max_retries (int): Retries per page request (exponential backoff)
+        order_by (str): Column giving a stable page order; None disables ordering
+        columns (list): Supabase column names to select (server-side projection); None selects '*'
+        start_date (str): Only rows with Date >= start_date (ISO 'YYYY-MM-DD'), filtered server-side
+        end_date (str): Only rows with Date <= end_date (ISO 'YYYY-MM-DD'), filtered server-side
+    """
+    supabase = get_supabase_client()
+
+    def base_query(*columns, **select_kwargs):
+        query = supabase.table(table_name).select(*(columns or ('*',)), **select_kwargs)
         # Apply server-side sector filter if provided. Uses the exact DB column name.
         # Column is renamed later to "Scott's Sector (5)" by the loader.
         if sectors:
             try:
-                base_query = base_query.in_('Scotts_Sector_5', sectors)
+                query = query.in_('Scotts_Sector_5', sectors)
             except Exception:
                 # If server-side filter isn't supported, we'll filter client-side later
                 pass
+        # Incremental fetch: only rows past the cached high-water mark
+        if min_id is not None:
+            query = query.gt('ID', min_id)
+        # Date range predicate (column name uses exact case as in the DB schema)
+        if start_date is not None:
+            query = query.gte('Date', start_date)
+        if end_date is not None:
+            query = query.lte('Date', end_date)
+        return query
+
+    select_columns = tuple(_quote_column(c) for c in columns) if columns else ('*',)
 
+    def fetch_page(offset):
+        def build():
+            query = base_query(*select_columns)
+            if order_by:
+                query = query.order(order_by, desc=False)
+            return query.range(offset, offset + PAGE_SIZE - 1)
+        response = _execute_with_retry(build, max_retries=max_retries)
+        return response.data if hasattr(response, 'data') else response
+
+    if show_progress:
+        event(INFO, 'fetch_start', "Loading data from Supabase table '%s'...", table_name)
+
+    total = None
+    if parallel:
+        try:
+            response = _execute_with_retry(lambda: base_query('ID', count='exact', head=True), max_retries=max_retries)
+            total = getattr(response, 'count', None)
+        except Exception as e:
+            if show_progress:
+                event(INFO, 'fetch_sequential', "Row count unavailable (%s); falling back to sequential pagination.", e)
+
+    all_rows = []
+    offset = 0
+    if total is not None:
+        offsets = list(range(0, total, PAGE_SIZE))
+        workers = max(1, min(max_workers, len(offsets)))
+        if show_progress:
+            event(INFO, 'fetch_pages', "Fetching %s records in %s pages (%s concurrent requests)...", total, len(offsets), workers)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # map() yields results in submission order, so pages are reassembled in order
+            for batch in pool.map(fetch_page, offsets):
+                all_rows.extend(batch or [])
+        offset = len(offsets) * PAGE_SIZE
+        # Rows inserted after the count was taken: keep paging only if the last page was full
+        if not offsets or len(all_rows) < offset:
+            offset = None
+
+    while offset is not None:
         # Fetch a page of data
-        response = base_query.range(offset, offset + page_size - 1).execute()
-        
-        batch = response.data if hasattr(response, 'data') else response
+        batch = fetch_page(offset)
         
         if not batch:
             break
         
         all_rows.extend(batch)
         if show_progress:
-            print(f"Loaded {len(all_rows)} records so far...")
+            event(INFO, 'fetch_progress', "Loaded %s records so far...", len(all_rows))
         
         # If we got fewer records than page_size, we're done
-        if len(batch) < page_size:
+        if len(batch) < PAGE_SIZE:
             break
         
-        offset += page_size
+        offset += PAGE_SIZE
     
     if show_progress:
-        print(f"Total records loaded: {len(all_rows)}")
+        event(INFO, 'fetch_done', "Total records loaded: %s", len(all_rows))
     
     return pd.DataFrame(all_rows)
-    
-    def load_market_data(self, 
-                        table_name: str = 'market_data',
-                        year_filter: Optional[int] = None,
-                        restrict_fossil_fuels: bool = False) -> pd.DataFrame:
-        """
-        Load market data from Supabase table.
-        
-        Args:
-            table_name: Name of the table containing market data
-            year_filter: Optional year to filter data (if None, loads all years)
-            restrict_fossil_fuels: Whether to exclude fossil fuel companies
-            
-        Returns:
-            DataFrame with market data
-        """
-        try:
-            # Fetch all rows with pagination to avoid default page limits
-            page_size = 1000
-            offset = 0
-            rows = []
-
-            # If a year filter is provided, filter by Date range on the server if possible
-            # Note: Column name uses exact case as in the DB schema ("Date")
-            base_query = self.client.table(table_name).select("*")
-            if year_filter:
-                start_date = f"{year_filter}-01-01"
-                end_date = f"{year_filter}-12-31"
-                base_query = base_query.gte('Date', start_date).lte('Date', end_date)
-
-            # Use ID ordering for deterministic pagination if available
-            # If "ID" column doesn't exist, pagination will still work without ordering
-            try:
-                base_query = base_query.order('ID', desc=False)
-            except Exception:
-                pass
 
-            while True:
-                try:
-                    response = base_query.range(offset, offset + page_size - 1).execute()
-                except Exception as e:
-                    logger.error(f"Error during Supabase pagination (offset={offset}): {e}")
-                    raise
-
-                batch = response.data or []
-                if not batch:
-                    break
-                rows.extend(batch)
-                if len(batch) < page_size:
-                    break
-                offset += page_size
-
-            if not rows:
-                logger.warning(f"No data found in table '{table_name}' with the given filters")
-                return pd.DataFrame()
-
-            # Convert to DataFrame
-            df = pd.DataFrame(rows)
-            
-            # Apply fossil fuel restrictions if needed
-            if restrict_fossil_fuels:
-                df = self._apply_fossil_fuel_filter(df)
-            
-            # Clean and standardize column names
-            df = self._clean_dataframe(df)
-            
-            # Filter out rows with missing essential data
-            df = self._filter_incomplete_data(df)
-            
-            logger.info(f"Loaded {len(df)} records from Supabase after filtering")
-            return df
-            
-        except Exception as e:
-            logger.error(f"Error loading data from Supabase: {e}")
-            raise
-    
-    def _apply_fossil_fuel_filter(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Apply fossil fuel industry filter to dataframe."""
-        import re
-        possible_cols = ['FactSet_Industry', 'factset_industry', 'FactSet Industry']
-        industry_col = None
-        for col in possible_cols:
-            if col in df.columns:
-                industry_col = col
-                break
-        if industry_col is None:
-            logger.warning(f"Column 'FactSet_Industry' not found. Fossil fuel filtering skipped.")
-            return df
-        # Excluded industries (normalized)
-        excluded_industries = [
-            "integratedoil",
-            "oilfieldservicesequipment",
-            "oilgasproduction",
-            "coal",
-            "oilrefiningmarketing"
-        ]
-        # Normalize function: lowercase and remove non-alphanumeric
-        def normalize(s):
-            return re.sub(r'[^a-z0-9]', '', str(s).lower())
-        # Apply normalization to both data and excluded list
-        industry_norm = df[industry_col].apply(normalize)
-        excluded_norm = set(excluded_industries)
-        mask = ~industry_norm.isin(excluded_norm)
-        filtered_df = df[mask].copy()
-        removed_count = len(df) - len(filtered_df)
-        logger.info(f"Filtered out {removed_count} fossil fuel companies from {len(df)} total records")
-        return filtered_df
-    
-    def _clean_dataframe(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Clean and standardize DataFrame format."""
-        # Strip whitespace from column names
-        df.columns = df.columns.str.strip()
-        
-        # Remove duplicate columns
-        df = df.loc[:, ~df.columns.duplicated(keep='first')]
-        
-        # Replace common null representations
-        df.replace({'--': None, '': None, 'N/A': None, '#N/A': None, 'NULL': None, 'null': None}, inplace=True)
-        
-        # Ensure ticker column exists
-        if 'ticker' not in df.columns and 'ticker_region' in df.columns:
-            df['ticker'] = df['ticker_region'].str.split('-').str[0].str.strip()
-        
-        # Ensure year column exists
-        if 'year' not in df.columns and 'date' in df.columns:
-            df['year'] = pd.to_datetime(df['date']).dt.year
-        
+
+
+def load_market_data(table_name='Full Precision Test', start_year=None, end_year=None, year_filter=None,
+                     restrict_fossil_fuels=False, sectors=None, columns=None, show_progress=True):
+    """
+    Load market data from a Supabase table with the year range filtered server-side.
+
+    Args:
+        table_name (str): Name of the table containing market data
+        start_year (int): First year to load (None: no lower bound)
+        end_year (int): Last year to load, inclusive (None: no upper bound)
+        year_filter (int): Load a single year (overrides start_year/end_year)
+        restrict_fossil_fuels (bool): Whether to exclude fossil fuel companies
+        sectors (list): Optional server-side filter on the sector column
+        columns (list): Supabase column names to select; None selects all
+        show_progress (bool): Whether to print loading progress messages
+
+    Returns:
+        pandas.DataFrame: cleaned rows (Supabase column names plus derived Ticker/Year)
+    """
+    if year_filter is not None:
+        start_year = end_year = year_filter
+    start_date, end_date = year_date_range(start_year, end_year)
+
+    df = load_supabase_data(table_name, show_progress=show_progress, sectors=sectors, columns=columns,
+                            start_date=start_date, end_date=end_date)
+    if df.empty:
+        event(WARNING, 'load_empty', "Warning: No data found in table '%s' with the given filters", table_name)
         return df
-    
-    def _filter_incomplete_data(self, df: pd.DataFrame) -> pd.DataFrame:
-        """
-        Filter out rows with missing essential data after querying.
-        Removes rows where critical columns like price data are missing.
-        """
-        initial_count = len(df)
-        
-        # Define essential columns that must have valid data
-        essential_columns = []
-        
-        # Check for price columns (try multiple possible names)
-        price_columns = ['Ending Price', 'ending_price', 'Price']
-        for col in price_columns:
-            if col in df.columns:
-                essential_columns.append(col)
-                break
-        
-        # Check for ticker columns
-        ticker_columns = ['Ticker', 'ticker', 'Ticker-Region', 'ticker_region']
-        for col in ticker_columns:
+
+    # Apply fossil fuel restrictions if needed
+    if restrict_fossil_fuels:
+        df = _apply_fossil_fuel_filter(df, show_progress=show_progress)
+
+    # Clean and standardize column names
+    df = _clean_dataframe(df)
+
+    # Filter out rows with missing essential data
+    df = _filter_incomplete_data(df, show_progress=show_progress)
+
+    if show_progress:
+        event(INFO, 'load_done', "Loaded %s records from Supabase after filtering", len(df))
+    return df
+
+
+def _apply_fossil_fuel_filter(df, show_progress=True):
+    """Apply fossil fuel industry filter to dataframe."""
+    possible_cols = ['FactSet_Industry', 'factset_industry', 'FactSet Industry']
+    industry_col = next((col for col in possible_cols if col in df.columns), None)
+    if industry_col is None:
+        event(WARNING, 'fossil_filter_skipped', "Warning: Column 'FactSet_Industry' not found. Fossil fuel filtering skipped.")
+        return df
+    # Excluded industries (normalized: lowercase, alphanumeric only)
+    excluded_industries = {
+        "integratedoil",
+        "oilfieldservicesequipment",
+        "oilgasproduction",
+        "coal",
+        "oilrefiningmarketing",
+    }
+    industry_norm = df[industry_col].astype(str).str.lower().str.replace(r'[^a-z0-9]', '', regex=True)
+    filtered_df = df[~industry_norm.isin(excluded_industries)].copy()
+    count('fossil_rows_removed', len(df) - len(filtered_df))
+    if show_progress:
+        event(INFO, 'fossil_removed', "Filtered out %s fossil fuel companies from %s total records",
+              len(df) - len(filtered_df), len(df))
+    return filtered_df
+
+
+def _clean_dataframe(df):
+    """Clean and standardize DataFrame format."""
+    # Strip whitespace from column names
+    df.columns = df.columns.str.strip()
+
+    # Remove duplicate columns
+    df = df.loc[:, ~df.columns.duplicated(keep='first')].copy()
+
+    # Replace common null representations
+    df = df.replace({'--': None, '': None, 'N/A': None, '#N/A': None, 'NULL': None, 'null': None})
+
+    # Ensure ticker column exists
+    if 'Ticker' not in df.columns:
+        for col in ('Ticker-Region', 'ticker_region'):
             if col in df.columns:
-                essential_columns.append(col)
+                df['Ticker'] = df[col].str.split('-').str[0].str.strip()
                 break
-        
-        # Check for date/year columns
-        date_columns = ['Date', 'date', 'Year', 'year']
-        for col in date_columns:
+
+    # Ensure year column exists
+    if 'Year' not in df.columns:
+        for col in ('Date', 'date'):
             if col in df.columns:
-                essential_columns.append(col)
+                df['Year'] = pd.to_datetime(df[col]).dt.year
                 break
-        
-        if not essential_columns:
-            logger.warning("No essential columns found for filtering")
-            return df
-        
-        # Filter out rows where essential columns are null or invalid
-        for col in essential_columns:
-            if col in df.columns:
-                # Remove rows where the column is null, empty, or contains invalid values
-                if df[col].dtype in ['float64', 'int64']:
-                    # For numeric columns, remove null, inf, or zero values (for price)
-                    if 'price' in col.lower() or 'Price' in col:
-                        df = df[df[col].notna() & (df[col] > 0) & (df[col] != float('inf'))]
-                    else:
-                        df = df[df[col].notna() & (df[col] != float('inf'))]
-                else:
-                    # For text columns, remove null or empty strings
-                    df = df[df[col].notna() & (df[col] != '') & (df[col] != '--')]
-        
-        filtered_count = len(df)
-        removed_count = initial_count - filtered_count
-        
-        if removed_count > 0:
-            logger.info(f"Filtered out {removed_count} rows with missing essential data")
-            logger.info(f"Remaining records: {filtered_count}")
-        
+
+    return df
+
+
+def _filter_incomplete_data(df, show_progress=True):
+    """
+    Filter out rows with missing essential data after querying.
+    Removes rows where the price is missing/non-positive or the ticker/date is missing.
+    """
+    initial_count = len(df)
+
+    def first_present(candidates):
+        return next((col for col in candidates if col in df.columns), None)
+
+    price_col = first_present(['Ending_Price', 'Ending Price', 'ending_price', 'Price'])
+    ticker_col = first_present(['Ticker', 'ticker', 'Ticker-Region', 'ticker_region'])
+    date_col = first_present(['Date', 'date', 'Year', 'year'])
+
+    if not (price_col or ticker_col or date_col):
+        event(WARNING, 'essential_filter_skipped', "Warning: No essential columns found for filtering")
         return df
-    
-    def get_available_years(self, table_name: str = 'market_data') -> list:
-        """Get list of available years in the database."""
-        try:
-            response = self.client.table(table_name).select("year").execute()
-            years = sorted(set(row['year'] for row in response.data if row['year']))
-            logger.info(f"Available years: {years}")
-            return years
-        except Exception as e:
-            logger.error(f"Error getting available years: {e}")
-            return []
-    
-    def get_available_factors(self, table_name: str = 'market_data') -> list:
-        """Get list of available factor columns in the database."""
-        try:
-            # Get first row to examine columns
-            response = self.client.table(table_name).select("*").limit(1).execute()
-            
-            if not response.data:
-                return []
-            
-            # Filter for factor-related columns (adjust as needed based on your schema)
-            all_columns = list(response.data[0].keys())
-            factor_columns = [col for col in all_columns 
-                            if any(keyword in col.lower() for keyword in 
-                                 ['momentum', 'roe', 'roa', 'price', 'book', 'earns', 'vol', 
-                                  'accrual', 'growth', 'return'])]
-            
-            logger.info(f"Available factors: {factor_columns}")
-            return factor_columns
-            
-        except Exception as e:
-            logger.error(f"Error getting available factors: {e}")
-            return []
 
+    if price_col:
+        price = pd.to_numeric(df[price_col], errors='coerce')
+        df = df[price.notna() & (price > 0) & (price != float('inf'))]
+    for col in (ticker_col, date_col):
+        if col:
+            df = df[df[col].notna() & (df[col] != '') & (df[col] != '--')]
+
+    removed_count = initial_count - len(df)
+    count('rows_missing_essential', removed_count)
+    if removed_count > 0 and show_progress:
+        event(INFO, 'rows_missing_essential', "Filtered out %s rows with missing essential data", removed_count)
+        event(INFO, 'rows_remaining', "Remaining records: %s", len(df))
 
+    return df
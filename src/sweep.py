@@ -0,0 +1,226 @@
+"""
+Parameter sweeps over many backtest configurations.
+
+A sweep is a list of config dicts (see `make_grid`) run with the panel engine.
+Configs that share a factor set, year window and fossil screen share one
+`PanelData`, so they are grouped and each group runs as one task.
+
+With more than one worker the loaded frame is written once to an uncompressed
+Arrow IPC file that every worker process memory-maps at start-up, instead of
+pickling the frame into each task. Results stream back as groups finish and
+are collected into a tidy DataFrame (one row per config), optionally appended
+to a Parquet file as they arrive.
+"""
+import itertools
+import os
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .panel_engine import build_panel, rebalance_portfolio_panel
+
+CONFIG_COLUMNS = ['run_id', 'factors', 'n_factors', 'top_pct', 'which', 'use_market_cap_weight',
+                  'restrict_fossil_fuels', 'start_year', 'end_year']
+METRIC_COLUMNS = ['final_value', 'total_return', 'annualized_return', 'sharpe_portfolio',
+                  'max_drawdown_portfolio', 'information_ratio', 'win_rate']
+RESULT_SCHEMA = pa.schema(
+    [('run_id', pa.int64()), ('factors', pa.string()), ('n_factors', pa.int64()), ('top_pct', pa.float64()),
+     ('which', pa.string()), ('use_market_cap_weight', pa.bool_()), ('restrict_fossil_fuels', pa.bool_()),
+     ('start_year', pa.int64()), ('end_year', pa.int64())]
+    + [(col, pa.float64()) for col in METRIC_COLUMNS]
+    + [('error', pa.string())]
+)
+
+# Per-process state for pool workers: the memory-mapped shared frame
+_WORKER = {}
+
+
+def factor_combinations(factor_names, size):
+    """All `size`-factor combinations of `factor_names` (e.g. 13 factors, size 2 -> 78 sets)."""
+    return list(itertools.combinations(factor_names, size))
+
+
+def make_grid(factor_sets, top_pcts=(10,), which=('top',), use_market_cap_weight=(False,),
+              restrict_fossil_fuels=(False,), year_windows=((2002, 2023),)):
+    """
+    Cartesian product of sweep parameters as a list of config dicts.
+
+    Args:
+        factor_sets: iterable of factor-name sequences (see `factor_combinations`)
+        top_pcts, which, use_market_cap_weight, restrict_fossil_fuels: values to sweep
+        year_windows: (start_year, end_year) pairs
+
+    Returns:
+        list of dicts with the `rebalance_portfolio` keyword arguments plus 'factors'
+    """
+    grid = itertools.product(factor_sets, year_windows, restrict_fossil_fuels, top_pcts, which, use_market_cap_weight)
+    return [
+        {
+            'factors': tuple(factors),
+            'start_year': int(start_year),
+            'end_year': int(end_year),
+            'restrict_fossil_fuels': bool(restrict),
+            'top_pct': top_pct,
+            'which': side,
+            'use_market_cap_weight': bool(cap),
+        }
+        for factors, (start_year, end_year), restrict, top_pct, side, cap in grid
+    ]
+
+
+def _panel_key(config):
+    return (tuple(config['factors']), config['start_year'], config['end_year'], config['restrict_fossil_fuels'])
+
+
+def _result_row(run_id, config, result=None, error=None):
+    row = {
+        'run_id': run_id,
+        'factors': ', '.join(config['factors']),
+        'n_factors': len(config['factors']),
+        'top_pct': float(config['top_pct']),
+        'which': config['which'],
+        'use_market_cap_weight': config['use_market_cap_weight'],
+        'restrict_fossil_fuels': config['restrict_fossil_fuels'],
+        'start_year': config['start_year'],
+        'end_year': config['end_year'],
+    }
+    row.update(dict.fromkeys(METRIC_COLUMNS, np.nan))
+    row['error'] = error
+    if result is not None:
+        initial_value = result['portfolio_values'][0]
+        returns = np.asarray(result['yearly_returns'], dtype=float)
+        row.update({
+            'final_value': result['final_value'],
+            'total_return': result['final_value'] / initial_value - 1 if initial_value else np.nan,
+            'annualized_return': np.prod(1 + returns) ** (1 / len(returns)) - 1 if len(returns) else np.nan,
+            'sharpe_portfolio': result['sharpe_portfolio'],
+            'max_drawdown_portfolio': result['max_drawdown_portfolio'],
+            'information_ratio': np.nan if result['information_ratio'] is None else result['information_ratio'],
+            'win_rate': result['win_rate'],
+        })
+    return row
+
+
+def _run_group(data, key, runs, initial_aum):
+    """Run every (run_id, config) sharing panel `key`; returns result rows (errors are recorded, not raised)."""
+    factors, start_year, end_year, restrict = key
+    try:
+        panel = build_panel(data, list(factors), start_year, end_year, restrict_fossil_fuels=restrict)
+    except Exception as e:
+        return [_result_row(run_id, config, error=f"{type(e).__name__}: {e}") for run_id, config in runs]
+
+    rows = []
+    for run_id, config in runs:
+        try:
+            result = rebalance_portfolio_panel(
+                data, list(factors), start_year, end_year, initial_aum,
+                verbosity=0,
+                restrict_fossil_fuels=restrict,
+                top_pct=config['top_pct'],
+                which=config['which'],
+                use_market_cap_weight=config['use_market_cap_weight'],
+                panel=panel
+            )
+            rows.append(_result_row(run_id, config, result))
+        except Exception as e:
+            rows.append(_result_row(run_id, config, error=f"{type(e).__name__}: {e}"))
+    return rows
+
+
+def write_shared_frame(data, path):
+    """Write `data` as an uncompressed Arrow IPC file that workers can memory-map."""
+    table = pa.Table.from_pandas(data, preserve_index=False)
+    with pa.OSFile(path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def read_shared_frame(path):
+    """Memory-map an Arrow IPC file written by `write_shared_frame` back into a DataFrame."""
+    with pa.memory_map(path, 'r') as source:
+        table = pa.ipc.open_file(source).read_all()
+    return table.to_pandas(split_blocks=True)
+
+
+def _init_worker(path):
+    _WORKER['data'] = read_shared_frame(path)
+
+
+def _run_shared_group(key, runs, initial_aum):
+    return _run_group(_WORKER['data'], key, runs, initial_aum)
+
+
+def _grouped_runs(configs):
+    groups = OrderedDict()
+    for run_id, config in enumerate(configs):
+        groups.setdefault(_panel_key(config), []).append((run_id, config))
+    return groups
+
+
+def iter_sweep(data, configs, initial_aum=1.0, max_workers=None):
+    """
+    Run `configs` and yield lists of result rows as each panel group finishes.
+
+    Args:
+        data (DataFrame): loaded market data (as for `rebalance_portfolio`)
+        configs (list): config dicts from `make_grid`
+        initial_aum (float): starting AUM of every run
+        max_workers (int): worker processes (default: all cores); 1 runs in this process
+    """
+    groups = _grouped_runs(configs)
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers == 1 or len(groups) <= 1:
+        for key, runs in groups.items():
+            yield _run_group(data, key, runs, initial_aum)
+        return
+
+    with tempfile.TemporaryDirectory(prefix='factor_lake_sweep_') as tmp:
+        path = os.path.join(tmp, 'rdata.arrow')
+        write_shared_frame(data, path)
+        workers = min(max_workers, len(groups))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(path,)) as pool:
+            futures = [pool.submit(_run_shared_group, key, runs, initial_aum) for key, runs in groups.items()]
+            for future in as_completed(futures):
+                yield future.result()
+
+
+def run_sweep(data, configs, initial_aum=1.0, max_workers=None, output_path=None, show_progress=True):
+    """
+    Run a parameter sweep and collect one tidy row per config.
+
+    Args:
+        data (DataFrame): loaded market data
+        configs (list): config dicts from `make_grid`
+        initial_aum (float): starting AUM of every run
+        max_workers (int): worker processes (default: all cores); 1 runs in this process
+        output_path (str): optional Parquet file; each finished group is appended as a row group
+        show_progress (bool): print progress as groups finish
+
+    Returns:
+        pandas.DataFrame: CONFIG_COLUMNS + METRIC_COLUMNS + 'error', ordered by run_id
+    """
+    rows = []
+    writer = pq.ParquetWriter(output_path, RESULT_SCHEMA) if output_path else None
+    try:
+        for group_rows in iter_sweep(data, configs, initial_aum=initial_aum, max_workers=max_workers):
+            rows.extend(group_rows)
+            if writer is not None:
+                writer.write_table(pa.Table.from_pylist(group_rows, schema=RESULT_SCHEMA))
+            if show_progress:
+                print(f"Sweep: {len(rows)}/{len(configs)} runs complete")
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return _rows_to_frame(rows).sort_values('run_id', ignore_index=True)
+
+
+def _rows_to_frame(rows):
+    # Through Arrow so the DataFrame dtypes match the Parquet output
+    frame = pd.DataFrame(rows, columns=RESULT_SCHEMA.names)
+    return pa.Table.from_pandas(frame, schema=RESULT_SCHEMA, preserve_index=False).to_pandas()
@@ -0,0 +1,87 @@
+"""
+Command-line parameter sweep.
+
+    python -m src.sweep_main --combo-size 2 --top-pct 5 10 20 --weighting equal cap --output sweep.parquet
+
+Loads the data once (only the columns the swept factors need), runs every
+configuration of the grid across all cores (see `src/sweep.py`) and writes
+one row per configuration to Parquet.
+"""
+import argparse
+
+from .factor_function import FACTOR_CLASSES
+from .market_object import load_data
+from .sweep import factor_combinations, make_grid, run_sweep
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run a Factor-Lake backtest parameter sweep.")
+    parser.add_argument('--factors', nargs='+', default=list(FACTOR_CLASSES),
+                        help="Factor column names to combine (default: all 13 factors)")
+    parser.add_argument('--combo-size', type=int, nargs='+', default=[1],
+                        help="Number of factors per portfolio (one or more sizes)")
+    parser.add_argument('--top-pct', type=float, nargs='+', default=[10.0], help="Cohort percentages to sweep")
+    parser.add_argument('--which', nargs='+', choices=['top', 'bottom'], default=['top'])
+    parser.add_argument('--weighting', nargs='+', choices=['equal', 'cap'], default=['equal'])
+    parser.add_argument('--fossil', choices=['no', 'yes', 'both'], default='no',
+                        help="Apply the fossil fuel restriction ('both' sweeps with and without)")
+    parser.add_argument('--start-year', type=int, default=2002)
+    parser.add_argument('--end-year', type=int, default=2023)
+    parser.add_argument('--window', type=int, default=None,
+                        help="Also sweep rolling windows of this many years inside [start-year, end-year]")
+    parser.add_argument('--initial-aum', type=float, default=1.0)
+    parser.add_argument('--data-path', default=None, help="CSV/Excel file instead of Supabase")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument('--output', default='sweep_results.parquet', help="Parquet output path")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    unknown = [name for name in args.factors if name not in FACTOR_CLASSES]
+    if unknown:
+        raise SystemExit(f"Unknown factors: {unknown}. Available: {list(FACTOR_CLASSES)}")
+
+    factor_sets = [combo for size in args.combo_size for combo in factor_combinations(args.factors, size)]
+    if args.window:
+        year_windows = [(y, y + args.window) for y in range(args.start_year, args.end_year - args.window + 1)]
+    else:
+        year_windows = [(args.start_year, args.end_year)]
+    restrict = {'no': (False,), 'yes': (True,), 'both': (False, True)}[args.fossil]
+
+    configs = make_grid(
+        factor_sets,
+        top_pcts=args.top_pct,
+        which=args.which,
+        use_market_cap_weight=[w == 'cap' for w in args.weighting],
+        restrict_fossil_fuels=restrict,
+        year_windows=year_windows
+    )
+    print(f"Sweeping {len(configs)} configurations ({len(factor_sets)} factor sets)")
+
+    # Load once: every swept factor, plus the industry column when any run is screened
+    rdata = load_data(
+        restrict_fossil_fuels=False,
+        use_supabase=args.data_path is None,
+        data_path=args.data_path,
+        factors=sorted({name for combo in factor_sets for name in combo}),
+        columns=['FactSet Industry'] if True in restrict else None,
+        start_year=min(start for start, _ in year_windows),
+        end_year=max(end for _, end in year_windows)
+    )
+
+    results = run_sweep(rdata, configs, initial_aum=args.initial_aum, max_workers=args.workers,
+                        output_path=args.output)
+    print(f"Wrote {len(results)} results to {args.output}")
+    ok = results[results['error'].isna()]
+    if not ok.empty:
+        print("\nTop configurations by final value:")
+        print(ok.nlargest(10, 'final_value')[['factors', 'top_pct', 'which', 'use_market_cap_weight',
+                                              'restrict_fossil_fuels', 'start_year', 'end_year', 'final_value']]
+              .to_string(index=False))
+    return results
+
+
+if __name__ == "__main__":
+    main()